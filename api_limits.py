@@ -0,0 +1,21 @@
+from contextlib import contextmanager
+
+# Caps on concurrent requests per API, shared across processes when tenants.py installs
+# multiprocessing semaphores in its workers. A plain single-account run has no caps.
+_slots = {}
+
+
+def install(slots):
+    """Use these semaphores ({"pubplus": sem, "google": sem}) to gate requests"""
+    _slots.update(slots)
+
+
+@contextmanager
+def slot(api):
+    """Hold one of the API's request slots while the block runs"""
+    semaphore = _slots.get(api)
+    if semaphore is None:
+        yield
+        return
+    with semaphore:
+        yield
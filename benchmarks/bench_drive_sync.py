@@ -0,0 +1,173 @@
+"""
+Benchmark: end-to-end upload_df_to_drive against the offline Drive/Sheets stand-in.
+
+For each sheet size the same scenarios run through the real sync code:
+  initial     - first upload into an empty spreadsheet
+  daily       - refresh of the last few days into a populated sheet, warm local caches
+  daily-cold  - the same refresh with the local caches and snapshot wiped
+  daily-full  - the same refresh forced through SHEETS_SYNC_MODE=full
+Network time (round-trip latency + upload/download bandwidth + quota waits + backoff) runs on a
+simulated clock, so numbers are reproducible and nothing talks to Google. Writes go out
+one at a time so the simulated clock models a single connection.
+
+Usage: python benchmarks/bench_drive_sync.py [--rows 10000 100000] [--error-rate 0.05]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Keep the benchmark's local caches away from campaign_data/ before the modules read them
+STATE_DIR = tempfile.mkdtemp(prefix="bench_drive_sync_")
+os.environ.update({
+    "DRIVE_METADATA_CACHE": os.path.join(STATE_DIR, "drive_cache.json"),
+    "SHEET_SNAPSHOT_DIR": STATE_DIR,
+    "SHEETS_JOURNAL_DIR": STATE_DIR,
+    "SHEETS_SHARD_MANIFEST": os.path.join(STATE_DIR, "manifest.json"),
+    "SHEETS_SHARD_BY": "none",
+    "SHEETS_WRITE_CONCURRENCY": "1",
+})
+
+import drive_cache  # noqa: E402
+import drive_handler  # noqa: E402
+import sheets_writer  # noqa: E402
+from offline_google import FOLDER_MIME_TYPE, WRITE_ENDPOINTS, OfflineGoogle, SimulatedClock  # noqa: E402
+
+ROUND_TRIP_SECONDS = 0.35
+UPLOAD_BYTES_PER_SECOND = 4 * 1024 * 1024
+DOWNLOAD_BYTES_PER_SECOND = 8 * 1024 * 1024
+DAYS = 90
+REFRESH_DAYS = 3
+
+HEADER = [
+    "date", "feed", "campaign_id", "status", "daily_budget", "activation_date", "revenue",
+    "page_views", "visits", "clicks", "roi", "cost_per_click", "profit", "bid_strategy",
+    "learning_stage_info", "site_name", "results", "results_rate", "ads_status",
+    "keyword_impressions", "searches", "visit_roi", "fetched_timestamp",
+]
+
+
+def make_df(rows, days, end="2025-08-19", salt=0):
+    """Campaign rows spread evenly over the last `days` days, newest first"""
+    dates = pd.date_range(end=end, periods=days).strftime("%Y-%m-%d")[::-1]
+    per_day = max(1, rows // days)
+    records = []
+    for d, date in enumerate(dates):
+        for i in range(per_day):
+            n = d * per_day + i + salt
+            records.append([
+                date, "pubplus", str(120000 + i), "ACTIVE", "150", "2025-07-01",
+                f"{(n % 997) * 0.37:.4f}", str(8000 + n % 500), str(7000 + n % 400), str(n % 600),
+                f"{(n % 89) / 100:.4f}", "0.0412", f"{(n % 311) * 0.11:.2f}", "MAX_CONVERSIONS",
+                "", "example-site.com", str(n % 90), "0.0105", "ACTIVE", str(19000 + n % 700),
+                str(1400 + n % 60), "0.1874", f"{date} 06:00:01",
+            ])
+    return pd.DataFrame(records, columns=HEADER)
+
+
+def reset_local_state():
+    shutil.rmtree(STATE_DIR, ignore_errors=True)
+    os.makedirs(STATE_DIR, exist_ok=True)
+    drive_cache._cache = None
+    drive_handler._folder_listings.clear()
+
+
+def new_backend(error_rate):
+    clock = SimulatedClock()
+    backend = OfflineGoogle(
+        latency=ROUND_TRIP_SECONDS,
+        upload_bytes_per_second=UPLOAD_BYTES_PER_SECOND,
+        download_bytes_per_second=DOWNLOAD_BYTES_PER_SECOND,
+        write_quota_per_minute=sheets_writer.WRITE_REQUESTS_PER_MINUTE,
+        error_rate=error_rate,
+        error_endpoints=WRITE_ENDPOINTS,
+        clock=clock,
+        sleep=clock.sleep,
+    )
+    # Pace our writes on the same simulated clock the stand-in enforces its quota with
+    sheets_writer.write_quota = sheets_writer.WriteQuota(clock=clock, sleep=clock.sleep)
+    folder = backend.add_file("campaign_data", FOLDER_MIME_TYPE)
+    backend.ensure_spreadsheet(drive_handler.SPREADSHEET_ID, "pubplus_campaign_data", parents=[folder["id"]])
+    return backend, clock, folder["id"]
+
+
+def timed_upload(backend, clock, df, folder_id, sync_mode):
+    drive_service, sheets_service = drive_handler.get_google_drive_service(backend)
+    backend.reset_stats()
+    started_sim, started_cpu = clock.now, time.perf_counter()
+    result = drive_handler.upload_df_to_drive(drive_service, sheets_service, df, folder_id, sync_mode)
+    return {
+        "ok": result is not None,
+        "simulated_wall_seconds": round(clock.now - started_sim, 2),
+        "local_cpu_seconds": round(time.perf_counter() - started_cpu, 2),
+        "round_trips": backend.round_trips,
+        "bytes_sent": backend.bytes_sent,
+        "bytes_received": backend.bytes_received,
+        "requests": dict(backend.requests),
+        "injected_errors": sum(backend.errors.values()),
+    }
+
+
+def run(rows, scenario, error_rate):
+    reset_local_state()
+    backend, clock, folder_id = new_backend(error_rate)
+    history = make_df(rows, DAYS)
+    if scenario == "initial":
+        return timed_upload(backend, clock, history, folder_id, "incremental")
+
+    # Populate the sheet (and the warm caches) with a first upload, then refresh recent days
+    timed_upload(backend, clock, history, folder_id, "incremental")
+    refresh = make_df(rows // DAYS * REFRESH_DAYS, REFRESH_DAYS, salt=1)
+    if scenario == "daily-cold":
+        reset_local_state()
+    return timed_upload(backend, clock, refresh, folder_id, "full" if scenario == "daily-full" else "incremental")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--scenarios", nargs="+", default=["initial", "daily", "daily-cold", "daily-full"])
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of Sheets writes answered with 429")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    try:
+        for count in args.rows:
+            for scenario in args.scenarios:
+                # Silence the sync's progress output while measuring
+                stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+                try:
+                    result = run(count, scenario, args.error_rate)
+                finally:
+                    sys.stdout.close()
+                    sys.stdout = stdout
+                result.update({"rows": count, "scenario": scenario})
+                results.append(result)
+                print(
+                    f"{count:>8} rows  {scenario:<10} {'ok' if result['ok'] else 'FAILED':<6} "
+                    f"round trips: {result['round_trips']:>4}  "
+                    f"sent: {result['bytes_sent'] / 1e6:7.2f} MB  "
+                    f"received: {result['bytes_received'] / 1e6:7.2f} MB  "
+                    f"wall: {result['simulated_wall_seconds']:>7.1f}s  "
+                    f"cpu: {result['local_cpu_seconds']:>5.2f}s  "
+                    f"429s: {result['injected_errors']}"
+                )
+    finally:
+        shutil.rmtree(STATE_DIR, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark: cold-start import cost of each CLI command, measured with `python -X importtime`.
+
+Each target imports what one command loads before doing any work, in a fresh interpreter:
+  cli        - `python cli.py ...` before a command runs
+  preflight  - cli plus the preflight checks (token expiry) and the runner
+  fetch      - the same modules, which is all `cli.py fetch` needs
+  query      - cli plus the in-memory query service behind `cli.py query`
+  run        - cli plus main, i.e. everything a full run or `cli.py sync` loads
+Light commands must not load any of the heavy packages listed in HEAVY; the script exits
+with status 1 when they do or when a target is slower than its --max-ms budget.
+
+Usage: python benchmarks/bench_import_time.py [--repeat 5] [--max-ms preflight=150]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+HEAVY = ["pandas", "numpy", "googleapiclient", "google_auth_oauthlib", "twilio", "requests"]
+
+TARGETS = {
+    "cli": ("import cli", True),
+    "preflight": ("import cli, preflight, runner", True),
+    "fetch": ("import cli, get, runner, metrics", True),
+    "query": ("import cli, query_service", True),
+    "run": ("import cli, main, runner", False),
+}
+
+
+def measure(code):
+    """Total import time in ms and cumulative ms per top-level module for one fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = {}
+    loaded = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, _, cumulative_us, name = line.replace("import time:", "|", 1).split("|")
+        loaded.add(name.strip().split(".")[0])
+        # Top-level imports are indented by a single space; nested ones by more
+        if not name.startswith("  "):
+            modules[name.strip()] = int(cumulative_us) / 1000
+    return sum(modules.values()), modules, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per target (median is reported)")
+    parser.add_argument("--targets", nargs="+", default=list(TARGETS), choices=list(TARGETS))
+    parser.add_argument("--max-ms", nargs="+", default=[], metavar="TARGET=MS", help="fail when a target is slower")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+    budgets = {target: float(ms) for target, ms in (item.split("=", 1) for item in args.max_ms)}
+
+    results = []
+    failed = False
+    for target in args.targets:
+        code, light = TARGETS[target]
+        runs = [measure(code) for _ in range(args.repeat)]
+        total_ms = statistics.median(total for total, _, _ in runs)
+        modules, loaded = runs[-1][1], runs[-1][2]
+        heavy = sorted(name for name in HEAVY if name in loaded)
+        slowest = sorted(modules.items(), key=lambda item: item[1], reverse=True)[:5]
+
+        problems = []
+        if light and heavy:
+            problems.append(f"loads {', '.join(heavy)}")
+        if target in budgets and total_ms > budgets[target]:
+            problems.append(f"over the {budgets[target]:g} ms budget")
+        failed = failed or bool(problems)
+
+        results.append({"target": target, "import_ms": round(total_ms, 1), "heavy_modules": heavy,
+                        "slowest": [{"module": name, "ms": round(ms, 1)} for name, ms in slowest],
+                        "problems": problems})
+        print(
+            f"{target:<10} {total_ms:>8.1f} ms  {'FAILED: ' + '; '.join(problems) if problems else 'ok':<28} "
+            f"slowest: {', '.join(f'{name} {ms:.0f}ms' for name, ms in slowest[:3])}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+"""
+Benchmark suite: the local processing path at scale, on synthetic campaigns_report payloads.
+
+For each --campaigns count and --days of history the suite times:
+  process    - csv_handler.process_campaigns_data on one day's payload
+  save_csv   - save_to_csv merging a normal run (the last FETCH_DAYS_BACK + 1 days, refreshed)
+               into a CSV holding the history (the CSV keeps 30 days, like production)
+  align      - drive_handler.align_to_header of the run's rows to the sheet header
+  serialize  - drive_handler.dataframe_to_values of the history
+  upload     - upload_df_to_drive of the run into a sheet holding the history, against the
+               offline stand-in with no simulated latency, i.e. read, merge and serialization CPU
+Wall time is the median of --repeat runs; peak memory comes from one extra run under
+tracemalloc. Payloads are deterministic (benchmarks/synthetic_report.py), so --json files
+from different revisions can be compared with --compare, which exits with 1 when a case got
+slower or bigger than --tolerance allows.
+
+Usage: python benchmarks/bench_processing.py [--campaigns 1000 5000] [--days 1 7 30]
+                                             [--json results.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+# Keep the suite's CSV, caches and snapshots away from campaign_data/ before the modules read them
+STATE_DIR = tempfile.mkdtemp(prefix="bench_processing_")
+os.environ.update({
+    "PUBPLUS_DATA_DIR": STATE_DIR,
+    "DRIVE_METADATA_CACHE": os.path.join(STATE_DIR, "drive_cache.json"),
+    "SHEET_SNAPSHOT_DIR": STATE_DIR,
+    "SHEETS_JOURNAL_DIR": STATE_DIR,
+    "SHEETS_SHARD_MANIFEST": os.path.join(STATE_DIR, "manifest.json"),
+    "SHEETS_SHARD_BY": "none",
+    "GOOGLE_BACKEND": "offline",
+    "METRICS": "off",
+    "NOTIFY_ASYNC": "off",
+})
+
+import pandas as pd  # noqa: E402
+
+import config  # noqa: E402
+import csv_handler  # noqa: E402
+import drive_cache  # noqa: E402
+import drive_handler  # noqa: E402
+from offline_google import FOLDER_MIME_TYPE, OfflineGoogle  # noqa: E402
+from synthetic_report import ReportGenerator, day_range  # noqa: E402
+
+CASES = ["process", "save_csv", "align", "serialize", "upload"]
+
+
+def processed_rows(generator, dates, variant=0):
+    """What main.py collects for these dates: flattened campaigns with their date"""
+    rows = []
+    for date in dates:
+        campaigns = csv_handler.process_campaigns_data(generator.report(date, variant))
+        for campaign in campaigns:
+            campaign["date"] = date
+        rows.extend(campaigns)
+    return rows
+
+
+def quiet(fn, *args):
+    """Run fn with the pipeline's progress output silenced"""
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        return fn(*args)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def measure(setup, fn, repeat, memory):
+    """Median wall seconds of fn(*setup()) over repeat runs, plus peak traced MB of one more"""
+    times = []
+    for _ in range(repeat):
+        args = quiet(setup)
+        started = time.perf_counter()
+        quiet(fn, *args)
+        times.append(time.perf_counter() - started)
+
+    peak_mb = None
+    if memory:
+        args = quiet(setup)
+        tracemalloc.start()
+        try:
+            quiet(fn, *args)
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+        finally:
+            tracemalloc.stop()
+    return statistics.median(times), peak_mb
+
+
+def reset_state():
+    shutil.rmtree(STATE_DIR, ignore_errors=True)
+    os.makedirs(STATE_DIR, exist_ok=True)
+    drive_cache._cache = None
+    drive_handler._folder_listings.clear()
+
+
+def run_scale(campaigns, days, cases, repeat, memory):
+    generator = ReportGenerator(campaigns)
+    dates = day_range(days)
+    run_dates = dates[-(config.FETCH_DAYS_BACK + 1):]
+    results = []
+
+    def record(case, rows, setup, fn):
+        seconds, peak_mb = measure(setup, fn, repeat, memory)
+        results.append({
+            "case": case,
+            "campaigns": campaigns,
+            "days": days,
+            "rows": rows,
+            "seconds": round(seconds, 4),
+            "peak_mb": round(peak_mb, 2) if peak_mb is not None else None,
+        })
+        memory_text = f"{peak_mb:9.1f} MB" if peak_mb is not None else ""
+        print(f"{case:<10} {campaigns:>8} campaigns {days:>3} days {rows:>9} rows  {seconds:9.3f}s {memory_text}")
+
+    if "process" in cases:
+        record("process", campaigns, lambda: (generator.report(dates[-1]),), csv_handler.process_campaigns_data)
+
+    needs_history = any(case in cases for case in ("save_csv", "align", "serialize", "upload"))
+    if not needs_history:
+        return results
+
+    reset_state()
+    history = processed_rows(generator, dates)
+    refreshed = processed_rows(generator, run_dates, variant=1)
+    quiet(csv_handler.save_to_csv, history, config.CSV_PATH)
+    history_df = pd.read_csv(config.CSV_PATH, dtype={"date": str, "campaign_id": str})
+    header = [column for column in history_df.columns if column not in ("feed", "fetched_timestamp")]
+    del history
+
+    if "save_csv" in cases:
+        with open(config.CSV_PATH, "rb") as f:
+            saved_csv = f.read()
+
+        def restore_csv():
+            with open(config.CSV_PATH, "wb") as f:
+                f.write(saved_csv)
+            return ([dict(row) for row in refreshed], config.CSV_PATH)
+
+        record("save_csv", len(refreshed), restore_csv, csv_handler.save_to_csv)
+
+    if "align" in cases:
+        record("align", len(refreshed), lambda: (pd.DataFrame(refreshed), header), drive_handler.align_to_header)
+
+    if "serialize" in cases:
+        record("serialize", len(history_df), lambda: (history_df, header), drive_handler.dataframe_to_values)
+
+    if "upload" in cases:
+        values = [header] + drive_handler.dataframe_to_values(history_df.sort_values("date", ascending=False), header)
+
+        def populated_sheet():
+            reset_state()
+            backend = OfflineGoogle()
+            folder = backend.add_file("campaign_data", FOLDER_MIME_TYPE)
+            backend.ensure_spreadsheet(drive_handler.SPREADSHEET_ID, "pubplus_campaign_data", values, [folder["id"]])
+            drive_service, sheets_service = drive_handler.get_google_drive_service(backend)
+            return drive_service, sheets_service, pd.DataFrame(refreshed), folder["id"], "incremental"
+
+        record("upload", len(refreshed), populated_sheet, drive_handler.upload_df_to_drive)
+
+    return results
+
+
+def revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, tolerance):
+    """Print each case against the baseline; returns the cases that regressed"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {(r["case"], r["campaigns"], r["days"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"\nCompared with {baseline.get('revision') or baseline_path}:")
+    for result in results:
+        old = before.get((result["case"], result["campaigns"], result["days"]))
+        if old is None:
+            continue
+        notes = []
+        for key in ("seconds", "peak_mb"):
+            if old.get(key) and result.get(key) is not None:
+                ratio = result[key] / old[key]
+                notes.append(f"{key} x{ratio:.2f}")
+                if ratio > 1 + tolerance:
+                    regressions.append(f"{result['case']} {result['campaigns']}x{result['days']} {key} x{ratio:.2f}")
+        print(f"  {result['case']:<10} {result['campaigns']:>8} x {result['days']:>3}  {', '.join(notes)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--campaigns", type=int, nargs="+", default=[1000, 5000], help="1k to 500k")
+    parser.add_argument("--days", type=int, nargs="+", default=[1, 7, 30], help="days of history, 1 to 90")
+    parser.add_argument("--cases", nargs="+", default=CASES, choices=CASES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", metavar="BASELINE_JSON", help="compare with an earlier --json file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown/growth (default 25%%)")
+    args = parser.parse_args()
+
+    results = []
+    try:
+        for campaigns in args.campaigns:
+            cases = args.cases
+            for days in args.days:
+                results += run_scale(campaigns, days, cases, args.repeat, not args.no_memory)
+                # One day's payload does not depend on the history length
+                cases = [case for case in cases if case != "process"]
+    finally:
+        shutil.rmtree(STATE_DIR, ignore_errors=True)
+
+    report = {
+        "revision": revision(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%}: {'; '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Microbenchmark: DataFrame -> Sheets row lists, per-row iterrows loop vs vectorized.
+
+Usage: python benchmarks/bench_row_serialization.py [--rows 10000 100000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from drive_handler import dataframe_to_values  # noqa: E402
+
+
+def legacy_to_values(df, header):
+    """The original per-row serialization loop from upload_df_to_drive"""
+    values = []
+    for _, row in df.iterrows():
+        row_values = [str(val) if val != "" else "" for val in row.tolist()]
+        while len(row_values) < len(header):
+            row_values.append("")
+        values.append(row_values[:len(header)])
+    return values
+
+
+def make_frame(count):
+    """Mixed-dtype frame shaped like the merged campaign data, already fillna('')"""
+    df = pd.DataFrame({
+        "date": [f"2025-08-{(i % 28) + 1:02d}" for i in range(count)],
+        "feed": "pubplus",
+        "campaign_id": [120000 + i for i in range(count)],
+        "status": ["ACTIVE" if i % 3 else "PAUSED" for i in range(count)],
+        "daily_budget": [float(50 + i % 200) for i in range(count)],
+        "revenue": [round(i * 0.731 % 500, 4) for i in range(count)],
+        "visits": [i % 9000 for i in range(count)],
+        "clicks": [i % 700 for i in range(count)],
+        "roi": [round((i % 97) / 97 - 0.3, 6) for i in range(count)],
+        "profit": [round(i * 0.113 % 90 - 20, 4) for i in range(count)],
+        "bid_strategy": ["" if i % 4 else "MAX_CONVERSIONS" for i in range(count)],
+        "site_name": [f"site-{i % 40}.com" for i in range(count)],
+        "fetched_timestamp": "2025-08-19 06:00:01",
+    })
+    return df
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for count in args.rows:
+        df = make_frame(count)
+        header = list(df.columns)
+        legacy, legacy_seconds = timed(legacy_to_values, df, header)
+        vectorized, vectorized_seconds = timed(dataframe_to_values, df, header)
+        if legacy != vectorized:
+            raise SystemExit(f"❌ Output mismatch at {count} rows")
+        results.append({
+            "rows": count,
+            "legacy_seconds": round(legacy_seconds, 3),
+            "vectorized_seconds": round(vectorized_seconds, 3),
+            "speedup": round(legacy_seconds / vectorized_seconds, 1),
+        })
+        print(
+            f"{count:>8} rows  iterrows: {legacy_seconds:7.3f}s  "
+            f"vectorized: {vectorized_seconds:7.3f}s  ({legacy_seconds / vectorized_seconds:.1f}x)"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
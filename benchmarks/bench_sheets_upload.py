@@ -0,0 +1,161 @@
+"""
+Benchmark: round trips and wall time of a full sheet upload, legacy vs batched.
+
+The legacy path sends one values().update per 1000-row chunk plus a header update
+with a fixed 0.5s sleep in between. The batched path packs ranges into byte-budgeted
+values.batchUpdate requests paced by the write quota. Requests go to a simulated
+Sheets endpoint on a simulated clock, so the numbers model network time
+(round-trip latency + upload bandwidth + quota waits) without touching Google.
+
+Usage: python benchmarks/bench_sheets_upload.py [--rows 10000 100000 500000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from sheets_writer import WriteQuota, write_value_ranges, WRITE_REQUESTS_PER_MINUTE  # noqa: E402
+
+ROUND_TRIP_SECONDS = 0.35
+UPLOAD_BYTES_PER_SECOND = 4 * 1024 * 1024
+
+HEADER = [
+    "date", "feed", "campaign_id", "status", "daily_budget", "activation_date", "revenue",
+    "page_views", "visits", "clicks", "roi", "cost_per_click", "profit", "bid_strategy",
+    "learning_stage_info", "site_name", "results", "results_rate", "ads_status",
+    "keyword_impressions", "searches", "visit_roi", "fetched_timestamp",
+]
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 0)
+
+
+class _Request:
+    def __init__(self, endpoint, body):
+        self.endpoint = endpoint
+        self.body = body
+
+    def execute(self, **kwargs):
+        payload = len(json.dumps(self.body))
+        self.endpoint.requests += 1
+        self.endpoint.bytes_sent += payload
+        self.endpoint.clock.sleep(ROUND_TRIP_SECONDS + payload / UPLOAD_BYTES_PER_SECOND)
+        return {}
+
+
+class SimulatedSheets:
+    """Records requests and advances the simulated clock per round trip"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.requests = 0
+        self.bytes_sent = 0
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def update(self, spreadsheetId, range, valueInputOption, body):
+        return _Request(self, body)
+
+    def batchUpdate(self, spreadsheetId, body):
+        return _Request(self, body)
+
+
+def make_rows(count):
+    """Realistic-looking string rows; cell strings are shared to keep memory flat"""
+    templates = [
+        [
+            f"2025-08-{(i % 28) + 1:02d}", "pubplus", f"{120000 + i}", "ACTIVE", "150", "2025-07-01",
+            "123.4567", "8421", "7310", "512", "0.2345", "0.0412", "28.91", "MAX_CONVERSIONS",
+            "", "example-site.com", "77", "0.0105", "ACTIVE", "19234", "1431", "0.1874",
+            "2025-08-19 06:00:01",
+        ]
+        for i in range(50)
+    ]
+    return [templates[i % len(templates)] for i in range(count)]
+
+
+def legacy_upload(sheets, clock, rows, quota):
+    quota.acquire()
+    sheets.update(spreadsheetId="bench", range="Sheet1!A1", valueInputOption="RAW", body={"values": [HEADER]}).execute()
+    chunk_size = 1000
+    for i in range(0, len(rows), chunk_size):
+        quota.acquire()
+        sheets.update(
+            spreadsheetId="bench",
+            range=f"Sheet1!A{i + 2}",
+            valueInputOption="RAW",
+            body={"values": rows[i:i + chunk_size]},
+        ).execute()
+        clock.sleep(0.5)
+
+
+def batched_upload(sheets, clock, rows, quota):
+    # One request at a time: the simulated clock models a single connection
+    write_value_ranges(sheets, "bench", "Sheet1", [(1, [HEADER]), (2, rows)], quota=quota, concurrency=1)
+
+
+def run(mode, rows):
+    clock = SimulatedClock()
+    sheets = SimulatedSheets(clock)
+    quota = WriteQuota(WRITE_REQUESTS_PER_MINUTE, clock=clock, sleep=clock.sleep)
+    started = time.perf_counter()
+    if mode == "legacy":
+        legacy_upload(sheets, clock, rows, quota)
+    else:
+        batched_upload(sheets, clock, rows, quota)
+    return {
+        "mode": mode,
+        "rows": len(rows),
+        "round_trips": sheets.requests,
+        "bytes_sent": sheets.bytes_sent,
+        "simulated_wall_seconds": round(clock.now, 2),
+        "local_cpu_seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 500_000])
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for count in args.rows:
+        rows = make_rows(count)
+        for mode in ("legacy", "batched"):
+            # Silence the per-batch progress output while measuring
+            stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+            try:
+                result = run(mode, rows)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            results.append(result)
+            print(
+                f"{count:>8} rows  {mode:<8} round trips: {result['round_trips']:>5}  "
+                f"sent: {result['bytes_sent'] / 1e6:8.1f} MB  "
+                f"wall: {result['simulated_wall_seconds']:>8.1f}s"
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
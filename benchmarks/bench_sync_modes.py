@@ -0,0 +1,149 @@
+"""
+Benchmark: full sheet rewrite through the values API vs one resumable CSV media upload.
+
+Local work (serialization, batch packing, CSV export) is measured for real. Network
+time is modeled from the measured payload sizes: round-trip latency, upload bandwidth,
+the per-minute write quota with parallel batches for the values API, and Drive's
+CSV-to-Sheets conversion time for the media upload. Each row also shows which mode
+drive_handler's cost model expects to be faster with the same constants, so the
+estimator the "auto" sync mode reports from can be checked against the more detailed
+simulation.
+
+Usage: python benchmarks/bench_sync_modes.py [--rows 10000 100000 500000] [--rtt 0.35]
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import drive_handler  # noqa: E402
+from drive_handler import MEDIA_CHUNK_SIZE, dataframe_to_values, media_upload_faster  # noqa: E402
+from sheets_writer import (  # noqa: E402
+    MAX_BATCH_BYTES,
+    WRITE_CONCURRENCY,
+    WRITE_REQUESTS_PER_MINUTE,
+    estimate_row_bytes,
+    pack_value_ranges,
+)
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+from bench_sheets_upload import HEADER, make_rows  # noqa: E402
+
+
+def simulate_values_api(batch_bytes, rtt, bandwidth, concurrency, per_minute):
+    """Wall time of parallel batch writes under the per-minute quota, sharing one uplink"""
+    lane_bandwidth = bandwidth / concurrency
+    lanes = [0.0] * concurrency
+    starts = []
+    for payload in batch_bytes:
+        lane = min(range(concurrency), key=lanes.__getitem__)
+        start = lanes[lane]
+        if len(starts) >= per_minute:
+            start = max(start, starts[-per_minute] + 60)
+        starts.append(start)
+        lanes[lane] = start + rtt + payload / lane_bandwidth
+    return max(lanes)
+
+
+def run(rows, args):
+    df = pd.DataFrame(make_rows(rows), columns=HEADER)
+    cells = rows * len(HEADER)
+
+    # Values API: serialize, pack, then one clear plus the batches
+    started = time.perf_counter()
+    values = dataframe_to_values(df, HEADER)
+    batches = pack_value_ranges("Sheet1", [(1, [HEADER]), (2, values)], MAX_BATCH_BYTES)
+    values_local = time.perf_counter() - started
+    batch_bytes = [
+        sum(estimate_row_bytes(row) for value_range in batch for row in value_range["values"])
+        for batch in batches
+    ]
+    values_network = args.rtt + simulate_values_api(
+        batch_bytes, args.rtt, args.bandwidth, WRITE_CONCURRENCY, WRITE_REQUESTS_PER_MINUTE
+    )
+
+    # Media upload: export CSV, then session start, chunks and server-side conversion
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "sheet.csv")
+        started = time.perf_counter()
+        df.to_csv(csv_path, index=False)
+        media_local = time.perf_counter() - started
+        csv_bytes = os.path.getsize(csv_path)
+    chunks = max(1, math.ceil(csv_bytes / MEDIA_CHUNK_SIZE))
+    media_network = (
+        args.rtt
+        + chunks * args.rtt
+        + csv_bytes / args.bandwidth
+        + cells / 1e6 * args.convert_seconds_per_million_cells
+    )
+
+    # Point the estimator at the same constants and ask for its pick
+    drive_handler.SYNC_RTT_SECONDS = args.rtt
+    drive_handler.SYNC_UPLOAD_BYTES_PER_SECOND = args.bandwidth
+    drive_handler.SHEETS_IMPORT_SECONDS_PER_MILLION_CELLS = args.convert_seconds_per_million_cells
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        model_pick = "media" if media_upload_faster(df, HEADER) else "values"
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    return {
+        "rows": rows,
+        "model_pick": model_pick,
+        "cells": cells,
+        "values_api": {
+            "round_trips": len(batches) + 1,
+            "bytes_sent": sum(batch_bytes),
+            "local_seconds": round(values_local, 2),
+            "wall_seconds": round(values_local + values_network, 2),
+        },
+        "media": {
+            "round_trips": chunks + 1,
+            "bytes_sent": csv_bytes,
+            "local_seconds": round(media_local, 2),
+            "wall_seconds": round(media_local + media_network, 2),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 50_000, 100_000, 250_000, 500_000])
+    parser.add_argument("--rtt", type=float, default=0.35, help="Round-trip latency in seconds")
+    parser.add_argument("--bandwidth", type=float, default=4 * 1024 * 1024, help="Upload bytes per second")
+    parser.add_argument(
+        "--convert-seconds-per-million-cells", type=float, default=6.0,
+        help="Drive CSV import time per million cells",
+    )
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for rows in args.rows:
+        result = run(rows, args)
+        values_api, media = result["values_api"], result["media"]
+        result["faster"] = "media" if media["wall_seconds"] < values_api["wall_seconds"] else "values"
+        results.append(result)
+        print(
+            f"{rows:>8} rows  values API: {values_api['round_trips']:>4} trips "
+            f"{values_api['bytes_sent'] / 1e6:7.1f} MB {values_api['wall_seconds']:7.1f}s   "
+            f"media: {media['round_trips']:>3} trips {media['bytes_sent'] / 1e6:7.1f} MB "
+            f"{media['wall_seconds']:7.1f}s   faster: {result['faster']:<6} model picks: {result['model_pick']}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Deterministic synthetic campaigns_report payloads, shaped like the PubPlus API response.
+
+Each campaign keeps the same ID, site, bid strategy, URL parameters and targeting on every
+day; its daily metrics, status and last action come from a generator seeded with
+(seed, date, variant). The same arguments always give the same payload, on any machine
+and across revisions, so benchmark inputs stay comparable.
+
+Usage: python benchmarks/synthetic_report.py --campaigns 10000 --days 7 --out /tmp/raw
+       (writes one <date>.json per day, the layout `cli.py fetch` saves raw responses in)
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+STATUSES = ["ACTIVE", "ACTIVE", "ACTIVE", "PAUSED", "LEARNING"]
+BID_STRATEGIES = ["MAX_CONVERSIONS", "TARGET_ROAS", "COST_CAP", "LOWEST_COST"]
+COUNTRIES = ["US", "CA", "GB", "AU", "DE", "FR", "NL", "SE"]
+PLATFORMS = ["DESKTOP", "MOBILE", "TABLET"]
+ACTIONS = ["bid_change", "budget_change", "status_change", "creative_update"]
+USERS = ["rule-engine", "ops@example.com", "bidder", "api"]
+
+
+def day_range(days, end=None):
+    """The last `days` dates up to end (default today) as YYYY-MM-DD, oldest first"""
+    end = datetime.strptime(end, "%Y-%m-%d") if end else datetime.now()
+    return [(end - timedelta(days=n)).strftime("%Y-%m-%d") for n in range(days - 1, -1, -1)]
+
+
+class ReportGenerator:
+    """Payloads for a fixed set of `campaigns` campaigns, one report per date"""
+
+    def __init__(self, campaigns, seed=0, sites=200):
+        rng = random.Random(f"campaigns-{seed}")
+        self.seed = seed
+        self.campaigns = []
+        for i in range(campaigns):
+            site = f"site-{rng.randrange(sites)}.com"
+            self.campaigns.append({
+                "id": str(23800000000 + i * 7 + rng.randrange(7)),
+                "site_name": site,
+                "daily_budget": rng.choice([50, 100, 150, 250, 500, 1000]),
+                "bid_strategy": rng.choice(BID_STRATEGIES),
+                "activation_date": f"2025-{rng.randrange(1, 8):02d}-{rng.randrange(1, 29):02d}",
+                "url_params": {
+                    "utm_source": rng.choice(["facebook", "taboola", "outbrain"]),
+                    "utm_campaign": f"c{i}",
+                    "utm_content": f"ad-{rng.randrange(10000)}",
+                    "kw": f"keyword {rng.randrange(5000)}",
+                },
+                "targeting": {
+                    "countries": rng.sample(COUNTRIES, rng.randrange(1, 4)),
+                    "platform": rng.choice(PLATFORMS),
+                    "age_min": rng.choice([18, 21, 25]),
+                    "age_max": rng.choice([45, 55, 65]),
+                    "audiences": {"include": [f"aud-{rng.randrange(300)}"], "exclude": []},
+                    "broad": rng.random() < 0.3,
+                },
+            })
+
+    def report(self, date, variant=0):
+        """The campaigns_report response for one day; variant gives a refreshed copy of it"""
+        rng = random.Random(f"report-{self.seed}-{date}-{variant}")
+        report = {}
+        for campaign in self.campaigns:
+            visits = rng.randrange(0, 9000)
+            clicks = rng.randrange(0, max(1, visits // 8))
+            revenue = round(clicks * rng.uniform(0.02, 0.9), 4)
+            cost = round(clicks * rng.uniform(0.02, 0.7), 4)
+            profit = round(revenue - cost, 4)
+            results = rng.randrange(0, max(1, clicks // 10))
+            status = rng.choice(STATUSES)
+            report[campaign["id"]] = {
+                "status": status,
+                "daily_budget": campaign["daily_budget"],
+                "activation_date": campaign["activation_date"],
+                "revenue": revenue,
+                "page_views": visits + rng.randrange(0, 3000),
+                "visits": visits,
+                "clicks": clicks,
+                "roi": round(profit / cost, 6) if cost else 0,
+                "cost_per_click": round(cost / clicks, 4) if clicks else 0,
+                "profit": profit,
+                "bid_strategy": campaign["bid_strategy"],
+                "learning_stage_info": "LEARNING" if status == "LEARNING" else "",
+                "site_name": campaign["site_name"],
+                "results": results,
+                "results_rate": round(results / clicks, 4) if clicks else 0,
+                "keyword_impressions": rng.randrange(0, 40000),
+                "searches": rng.randrange(0, 3000),
+                "visit_roi": round(profit / visits, 6) if visits else 0,
+                "url_params": dict(campaign["url_params"]),
+                "targeting": {
+                    key: (dict(value) if isinstance(value, dict) else list(value) if isinstance(value, list) else value)
+                    for key, value in campaign["targeting"].items()
+                },
+                "ads_status": {
+                    "active": rng.randrange(0, 12),
+                    "paused": rng.randrange(0, 5),
+                    "rejected": rng.randrange(0, 2),
+                },
+                "last_modified_action": {
+                    "action": rng.choice(ACTIONS),
+                    "user": rng.choice(USERS),
+                    "timestamp": f"{date} {rng.randrange(24):02d}:{rng.randrange(60):02d}:00",
+                },
+            }
+        return {"report": report}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--campaigns", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=1)
+    parser.add_argument("--end", help="last date YYYY-MM-DD (default today)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="directory for the <date>.json files")
+    args = parser.parse_args()
+
+    generator = ReportGenerator(args.campaigns, args.seed)
+    os.makedirs(args.out, exist_ok=True)
+    for date in day_range(args.days, args.end):
+        with open(os.path.join(args.out, f"{date}.json"), "w") as f:
+            json.dump(generator.report(date), f)
+    print(f"Wrote {args.days} day(s) of {args.campaigns} campaigns to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timedelta
+import config  # Load environment variables
+
+# Subcommands import what they need when they run, so `preflight` and `fetch` start
+# without loading pandas, the Google clients or the Twilio SDK
+
+# Raw campaigns_report responses written by `fetch`, one JSON file per day
+RAW_DATA_DIR = os.getenv("RAW_DATA_DIR", os.path.join(config.DATA_DIR, "raw"))
+
+# Same exit codes as main.py
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_NO_DATA = 2
+
+
+def selected_dates(args):
+    """Dates chosen with --date or --days, oldest first"""
+    if args.date:
+        return sorted(datetime.strptime(d, "%Y-%m-%d") for d in args.date)
+    today = datetime.now()
+    return [today - timedelta(days=n) for n in range(args.days, -1, -1)]
+
+
+def cmd_run(args):
+    """Full run: fetch, save the CSV and sync the sheet"""
+    from runner import run
+
+    if args.profile:
+        import metrics
+        metrics.PROFILE_DIR = args.profile
+
+    def _pipeline():
+        import main
+        return main.main(selected_dates(args))
+
+    return run(_pipeline)
+
+
+def fetch_raw(dates):
+    """Write each day's raw campaigns_report response to RAW_DATA_DIR"""
+    from get import fetch_day
+
+    os.makedirs(RAW_DATA_DIR, exist_ok=True)
+    saved = 0
+    for i, current_date in enumerate(dates):
+        date_str = current_date.strftime("%Y-%m-%d")
+        print(f"\nℹ️ Fetching data for {date_str}...")
+        response_data = fetch_day(date_str)
+        if response_data:
+            path = os.path.join(RAW_DATA_DIR, f"{date_str}.json")
+            with open(path, "w") as f:
+                json.dump(response_data, f)
+            print(f"✅ Saved raw response to {path}")
+            saved += 1
+        else:
+            print(f"❌ Failed to fetch data for {date_str}")
+
+        if i < len(dates) - 1:
+            time.sleep(config.FETCH_DELAY_SECONDS)
+
+    print(f"\n📊 Saved {saved} of {len(dates)} days")
+    return EXIT_OK if saved == len(dates) else EXIT_NO_DATA if saved == 0 else EXIT_FAILED
+
+
+def cmd_fetch(args):
+    """Fetch raw JSON to disk without touching the CSV or Google"""
+    from runner import run
+
+    return run(lambda: fetch_raw(selected_dates(args)))
+
+
+def sync_csv(dates):
+    """Push the selected dates from the local CSV to the sheet"""
+    import pandas as pd
+    import main
+    from csv_handler import projected_columns
+    from drive_handler import SPREADSHEET_ID, upload_df_to_drive
+    from sheet_index import remembered_header
+
+    if not os.path.exists(config.CSV_PATH):
+        print(f"❌ No local data at {config.CSV_PATH}, run a fetch first")
+        return EXIT_NO_DATA
+
+    # Columns the sheet will not take are not read at all
+    columns = projected_columns(remembered_header(SPREADSHEET_ID))
+    df = pd.read_csv(
+        config.CSV_PATH,
+        dtype={"date": str, "campaign_id": str},
+        usecols=None if columns is None else columns.__contains__,
+    )
+    date_strs = {d.strftime("%Y-%m-%d") for d in dates}
+    df = df[df["date"].isin(date_strs)].drop(columns=["feed", "fetched_timestamp"], errors="ignore")
+    if df.empty:
+        print("⚠️ No rows for the selected dates in the local CSV")
+        return EXIT_NO_DATA
+    print(f"ℹ️ Syncing {len(df)} rows for {df['date'].nunique()} day(s) from {config.CSV_PATH}")
+
+    services = main.connect_google()
+    if services is None:
+        return EXIT_FAILED
+    drive_service, sheets_service, drive_folder_id = services
+    if not upload_df_to_drive(drive_service, sheets_service, df, drive_folder_id):
+        print("❌ Failed to update Google Drive spreadsheet")
+        return EXIT_FAILED
+    print("✅ Data successfully updated in Google Drive spreadsheet")
+    return EXIT_OK
+
+
+def cmd_sync(args):
+    """Sync the local CSV to the sheet without calling PubPlus"""
+    from runner import run
+
+    return run(lambda: sync_csv(selected_dates(args)))
+
+
+def cmd_tenants(args):
+    """Full run for every account in the tenants file, side by side"""
+    import tenants
+
+    return tenants.run_configured(args.tenants_file or tenants.TENANTS_FILE, args.only, selected_dates(args))
+
+
+def cmd_query(args):
+    """Look up rows or group-by totals in the local CSV, or serve them over HTTP"""
+    import query_service
+
+    return query_service.main(args)
+
+
+def cmd_preflight(args):
+    """Local configuration checks; with --online also the PubPlus endpoint and Google, side by side"""
+    import preflight
+
+    checks = preflight.LOCAL_CHECKS
+    if args.online:
+        # preflight.run checks the token itself, before the network checks
+        checks = [check for check in checks if check is not preflight.check_token]
+
+    failures = 0
+    for check in checks:
+        status, message = check()
+        preflight.show(status, message)
+        failures += status == preflight.FAIL
+
+    if args.online:
+        import main
+
+        ok, _ = preflight.run(main.connect_google)
+        failures += not ok
+
+    return EXIT_FAILED if failures else EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="PubPlus campaign data pipeline")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_dates(command):
+        command.add_argument(
+            "--days", type=int, default=config.FETCH_DAYS_BACK, help="days before today to include (default %(default)s)"
+        )
+        command.add_argument("--date", action="append", help="specific day YYYY-MM-DD (repeatable)")
+
+    run_parser = commands.add_parser("run", help="fetch, save and sync (the full pipeline)")
+    add_dates(run_parser)
+    run_parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=os.path.join(config.DATA_DIR, "profiles"),
+        help="write cProfile and tracemalloc dumps per stage to this directory",
+    )
+    run_parser.set_defaults(handler=cmd_run)
+
+    fetch_parser = commands.add_parser("fetch", help=f"save raw API responses to {RAW_DATA_DIR}")
+    add_dates(fetch_parser)
+    fetch_parser.set_defaults(handler=cmd_fetch)
+
+    sync_parser = commands.add_parser("sync", help="sync the local CSV to the sheet without calling PubPlus")
+    add_dates(sync_parser)
+    sync_parser.set_defaults(handler=cmd_sync)
+
+    tenants_parser = commands.add_parser("tenants", help="full run for every account in the tenants file")
+    add_dates(tenants_parser)
+    tenants_parser.add_argument("--tenants-file", default=os.getenv("TENANTS_FILE"))
+    tenants_parser.add_argument("--only", nargs="+", help="run just these tenants")
+    tenants_parser.set_defaults(handler=cmd_tenants)
+
+    query_parser = commands.add_parser("query", help="look up campaigns in the local CSV (or --serve them over HTTP)")
+    import query_service  # light: no pandas or API clients
+    query_service.add_arguments(query_parser)
+    query_parser.set_defaults(handler=cmd_query)
+
+    preflight_parser = commands.add_parser("preflight", help="check token expiry and local configuration")
+    preflight_parser.add_argument(
+        "--online", action="store_true", help="also check the PubPlus endpoint and connect to Google"
+    )
+    preflight_parser.set_defaults(handler=cmd_preflight)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,29 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables once per process. Every module imports config before it
+# reads its settings, so .env is parsed a single time however many modules are loaded.
+load_dotenv()
+
+# Local output directory and the merged CSV kept in it; caches, logs and metrics live here too
+DATA_DIR = os.getenv(
+    "PUBPLUS_DATA_DIR", os.path.join(os.path.dirname(os.path.realpath(__file__)), "campaign_data")
+)
+CSV_PATH = os.path.join(DATA_DIR, "pubplus_campaign_data.csv")
+
+# Drive folder holding the spreadsheet (and the shards when SHEETS_SHARD_BY is set)
+DRIVE_FOLDER_NAME = os.getenv("DRIVE_FOLDER_NAME", "campaign_data")
+
+# Days fetched by a normal run: today and the FETCH_DAYS_BACK days before it
+FETCH_DAYS_BACK = int(os.getenv("FETCH_DAYS_BACK", 7))
+
+# Pause between daily PubPlus requests to stay under its rate limits
+FETCH_DELAY_SECONDS = float(os.getenv("FETCH_DELAY_SECONDS", 5))
+
+# Google OAuth client secrets and the token saved after the first login
+GOOGLE_CREDENTIALS_PATH = os.getenv(
+    "GOOGLE_CREDENTIALS_PATH", os.path.join(os.path.dirname(os.path.realpath(__file__)), "credentials.json")
+)
+GOOGLE_TOKEN_PATH = os.getenv(
+    "GOOGLE_TOKEN_PATH", os.path.join(os.path.dirname(os.path.realpath(__file__)), "token.pickle")
+)
@@ -1,17 +1,69 @@
 import os
 import pandas as pd
 import json
+import csv
+import hashlib
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
+import config  # Load environment variables
 from twilio_utils import send_notification_with_fallback
+from log_utils import get_logger, debug_enabled
 
-# Load environment variables
-load_dotenv()
+log = get_logger("csv_handler")
 
+# Which campaign fields are kept while flattening (see projected_columns):
+#   "schema" - the report fields below plus every flattened url_param_/targeting_/
+#              ads_status_/last_modified_action_ field
+#   "sheet"  - the columns of the target sheet as of our last upload (schema until known)
+#   "off"    - every field the API returns
+COLUMN_PROJECTION = os.getenv("COLUMN_PROJECTION", "schema")
+# Fields kept whatever the projection, e.g. a new API field that should reach the CSV
+COLUMN_PROJECTION_EXTRA = [c.strip() for c in os.getenv("COLUMN_PROJECTION_EXTRA", "").split(",") if c.strip()]
+# Always kept: row keys, plus what the rollups and the query service read
+REQUIRED_COLUMNS = ["date", "campaign_id", "site_name", "status", "revenue", "profit", "clicks", "visits"]
+# Scalar fields of the campaigns report kept by the "schema" projection
+REPORT_COLUMNS = [
+    "date",
+    "campaign_id",
+    "status",
+    "daily_budget",
+    "activation_date",
+    "revenue",
+    "page_views",
+    "visits",
+    "clicks",
+    "roi",
+    "cost_per_click",
+    "profit",
+    "bid_strategy",
+    "learning_stage_info",
+    "site_name",
+    "results",
+    "results_rate",
+    "keyword_impressions",
+    "searches",
+    "visit_roi",
+]
+# Nested report objects and the prefix of the fields they are flattened into; the
+# objects themselves are dropped once flattened
+FLATTENED_FIELDS = {
+    "url_params": "url_param_",
+    "targeting": "targeting_",
+    "ads_status": "ads_status_",
+    "last_modified_action": "last_modified_action_",
+}
+# Columns save_to_csv adds to every row
+CSV_BOOKKEEPING_COLUMNS = ["feed", "fetched_timestamp"]
 
-def process_campaigns_data(data):
+# Row counts and SHA-256 checksums (whole file and per date) of the last CSV written,
+# kept next to it as <csv>.sha256.json
+CSV_MANIFEST_SUFFIX = ".sha256.json"
+
+
+def process_campaigns_data(data, columns=None):
     """
-    Process the nested campaigns data structure into a flat list of dictionaries
+    Process the nested campaigns data structure into a flat list of dictionaries.
+    columns, when given, is the set of fields to keep (see projected_columns); anything
+    else is dropped while flattening instead of being carried through to the upload.
     """
     campaigns_list = []
 
@@ -25,35 +77,46 @@ def process_campaigns_data(data):
         report = data["report"]
 
         for campaign_id, campaign_data in report.items():
-            campaign_data["campaign_id"] = campaign_id
-
-            if "url_params" in campaign_data and isinstance(
-                campaign_data["url_params"], dict
-            ):
-                for key, value in campaign_data["url_params"].items():
-                    campaign_data[f"url_param_{key}"] = value
-
-            if "targeting" in campaign_data and isinstance(
-                campaign_data["targeting"], dict
-            ):
-                for key, value in campaign_data["targeting"].items():
+            if columns is None:
+                row = campaign_data
+            else:
+                row = {key: value for key, value in campaign_data.items() if key in columns}
+            row["campaign_id"] = campaign_id
+
+            url_params = campaign_data.get("url_params")
+            if isinstance(url_params, dict):
+                for key, value in url_params.items():
+                    name = f"url_param_{key}"
+                    if columns is None or name in columns:
+                        row[name] = value
+
+            targeting = campaign_data.get("targeting")
+            if isinstance(targeting, dict):
+                for key, value in targeting.items():
+                    name = f"targeting_{key}"
+                    if columns is not None and name not in columns:
+                        continue
                     if isinstance(value, (str, int, float, bool)):
-                        campaign_data[f"targeting_{key}"] = value
+                        row[name] = value
                     elif isinstance(value, list):
-                        campaign_data[f"targeting_{key}"] = ", ".join(
-                            str(v) for v in value
-                        )
+                        row[name] = ", ".join(str(v) for v in value)
                     else:
-                        campaign_data[f"targeting_{key}"] = json.dumps(value)
+                        row[name] = json.dumps(value)
 
             for nested_key in ["ads_status", "last_modified_action"]:
-                if nested_key in campaign_data and isinstance(
-                    campaign_data[nested_key], dict
-                ):
-                    for key, value in campaign_data[nested_key].items():
-                        campaign_data[f"{nested_key}_{key}"] = value
+                nested = campaign_data.get(nested_key)
+                if isinstance(nested, dict):
+                    for key, value in nested.items():
+                        name = f"{nested_key}_{key}"
+                        if columns is None or name in columns:
+                            row[name] = value
+
+            # The flattened fields carry the same data as the nested objects
+            for nested_key in FLATTENED_FIELDS:
+                if isinstance(row.get(nested_key), dict):
+                    del row[nested_key]
 
-            campaigns_list.append(campaign_data)
+            campaigns_list.append(row)
 
         return campaigns_list
     except Exception as e:
@@ -63,16 +126,77 @@ def process_campaigns_data(data):
         return []
 
 
-def load_existing_csv(filename):
+def csv_header(filename):
+    """Column names of an existing CSV from its first line, or None"""
+    try:
+        with open(filename, newline="", encoding="utf-8") as f:
+            return next(csv.reader(f), None)
+    except FileNotFoundError:
+        return None
+
+
+class ColumnSet:
+    """Column names plus name prefixes kept by a projection; supports `name in columns`"""
+
+    def __init__(self, names, prefixes=()):
+        self.names = frozenset(names)
+        self.prefixes = tuple(prefixes)
+
+    def __contains__(self, name):
+        return name in self.names or name.startswith(self.prefixes)
+
+    def __or__(self, other):
+        return ColumnSet(self.names | other.names, self.prefixes + other.prefixes)
+
+    def __str__(self):
+        flattened = f" and the {', '.join(p + '*' for p in self.prefixes)} fields" if self.prefixes else ""
+        return f"{len(self.names)} campaign fields{flattened}"
+
+
+def schema_columns():
+    """The fixed schema: report fields, flattened fields, required and extra columns"""
+    return ColumnSet(
+        REPORT_COLUMNS + REQUIRED_COLUMNS + COLUMN_PROJECTION_EXTRA, FLATTENED_FIELDS.values()
+    )
+
+
+def projected_columns(sheet_header=None, mode=None):
     """
-    Load existing CSV file into a pandas DataFrame
+    Fields worth keeping from each campaign, or None to keep everything. "schema" keeps the
+    fixed schema, "sheet" the sheet's columns (the schema until the sheet header is known),
+    and "off" every field the API returns.
+    """
+    mode = (mode or COLUMN_PROJECTION).lower()
+    if mode == "off":
+        return None
+    if mode == "sheet" and sheet_header:
+        return ColumnSet(list(sheet_header) + REQUIRED_COLUMNS + COLUMN_PROJECTION_EXTRA)
+    return schema_columns()
+
+
+def retained_columns(columns):
+    """Columns the local CSV keeps for a projection: never fewer than the schema's"""
+    return None if columns is None else columns | schema_columns()
+
+
+def load_existing_csv(filename, columns=None):
+    """
+    Load existing CSV file into a pandas DataFrame, reading only the given columns (plus
+    the ones save_to_csv adds) when a projection is set.
     If file doesn't exist, return empty DataFrame with the exact required header columns
     """
+    keep = None if columns is None else columns | ColumnSet(CSV_BOOKKEEPING_COLUMNS)
     try:
-        return pd.read_csv(filename)
+        # IDs stay strings, as in freshly fetched rows, so each date's rows sort (and hash)
+        # the same way on every run
+        return pd.read_csv(
+            filename,
+            dtype={"date": str, "campaign_id": str},
+            usecols=None if keep is None else keep.__contains__,
+        )
     except FileNotFoundError:
         return pd.DataFrame(
-            columns=[
+            columns=[column for column in [
                 "date",
                 "feed",
                 "campaign_id",
@@ -96,7 +220,7 @@ def load_existing_csv(filename):
                 "searches",
                 "visit_roi",
                 "fetched_timestamp",
-            ]
+            ] if keep is None or column in keep]
         )
     except Exception as e:
         error_message = f"Error loading CSV file {filename}: {e}"
@@ -106,9 +230,74 @@ def load_existing_csv(filename):
         return pd.DataFrame(columns=["date", "campaign_id", "fetched_timestamp"])
 
 
-def save_to_csv(data, filename):
+def write_csv_with_checksums(df, filename):
+    """
+    Write df as CSV, hashing the bytes on their way to disk. Returns a manifest with the
+    row count, line count and SHA-256 of the whole file, plus rows, SHA-256 and byte spans
+    ([offset, length]) per date, so readers can load single dates without parsing the rest.
+    """
+    file_hash = hashlib.sha256()
+    totals = {"bytes": 0, "lines": 0}
+    dates = {}
+
+    with open(filename, "wb") as f:
+
+        def write(text):
+            data = text.encode("utf-8")
+            f.write(data)
+            file_hash.update(data)
+            totals["bytes"] += len(data)
+            totals["lines"] += data.count(b"\n")
+            return data
+
+        write(df.iloc[:0].to_csv(index=False))
+        if len(df) and "date" in df.columns:
+            # Rows are sorted by date, so each date is normally one contiguous run of rows
+            date_values = df["date"].astype(str)
+            starts = (date_values != date_values.shift()).to_numpy().nonzero()[0].tolist()
+            for start, stop in zip(starts, starts[1:] + [len(df)]):
+                offset = totals["bytes"]
+                data = write(df.iloc[start:stop].to_csv(index=False, header=False))
+                entry = dates.setdefault(
+                    date_values.iat[start], {"rows": 0, "sha256": hashlib.sha256(), "spans": []}
+                )
+                entry["rows"] += stop - start
+                entry["sha256"].update(data)
+                entry["spans"].append([offset, len(data)])
+        elif len(df):
+            write(df.to_csv(index=False, header=False))
+
+        # The checksums describe these bytes, so they have to reach the disk before the rename
+        f.flush()
+        os.fsync(f.fileno())
+
+    return {
+        "columns": [str(column) for column in df.columns],
+        "rows": len(df),
+        "lines": totals["lines"],
+        "bytes": totals["bytes"],
+        "sha256": file_hash.hexdigest(),
+        "dates": {
+            date: {"rows": e["rows"], "sha256": e["sha256"].hexdigest(), "spans": e["spans"]}
+            for date, e in dates.items()
+        },
+    }
+
+
+def save_manifest(filename, manifest):
+    """Write the checksum manifest next to filename atomically"""
+    path = f"{filename}{CSV_MANIFEST_SUFFIX}"
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def save_to_csv(data, filename, columns=None):
     """
-    Function to save or update data in a CSV file
+    Function to save or update data in a CSV file. columns (see retained_columns) limits
+    which existing columns are read back; others, such as nested objects older runs kept
+    next to their flattened fields, are left out of the rewritten file.
     """
     try:
         # Ensure directory exists
@@ -126,7 +315,7 @@ def save_to_csv(data, filename):
         new_df["feed"] = "pubplus"  # Add feed column with default value
 
         # Load existing data (will have proper header if file exists)
-        existing_df = load_existing_csv(filename)
+        existing_df = load_existing_csv(filename, columns)
 
         # Create a unique key from date and campaign_id for update detection.
         if "campaign_id" in new_df.columns:
@@ -184,9 +373,19 @@ def save_to_csv(data, filename):
         except Exception as e:
             print(f"Warning: Error filtering by date: {e}")
 
-        # Save the combined data with the exact header columns as required.
-        combined_df.to_csv(filename, index=False)
+        # Save the combined data with the exact header columns as required. The new file is
+        # written and synced under a temporary name, then swapped in ahead of its manifest;
+        # readers treat a manifest older than the CSV as stale.
+        tmp_filename = f"{filename}.tmp"
+        manifest = write_csv_with_checksums(combined_df, tmp_filename)
+        os.replace(tmp_filename, filename)
+        save_manifest(filename, manifest)
+
         print(f"Saved {len(combined_df)} rows to {filename}")
+        print(f"✅ Checksummed {manifest['rows']} rows across {len(manifest['dates'])} dates (sha256 {manifest['sha256'][:12]})")
+        if debug_enabled(log):
+            for date, entry in manifest["dates"].items():
+                log.debug("  %s: %d rows (sha256 %s)", date, entry["rows"], entry["sha256"][:12])
 
     except Exception as e:
         error_message = f"Error saving data to CSV {filename}: {e}"
@@ -0,0 +1,86 @@
+import os
+import json
+import threading
+import config  # Load environment variables
+
+# Resolved Drive/Sheets IDs persisted between runs
+CACHE_PATH = os.getenv(
+    "DRIVE_METADATA_CACHE",
+    os.path.join(config.DATA_DIR, ".drive_metadata_cache.json"),
+)
+
+_lock = threading.Lock()
+_cache = None
+
+
+def _load():
+    global _cache
+    if _cache is None:
+        try:
+            with open(CACHE_PATH) as f:
+                _cache = json.load(f)
+        except FileNotFoundError:
+            _cache = {}
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable metadata cache: {e}")
+            _cache = {}
+    return _cache
+
+
+def _save():
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    tmp_path = f"{CACHE_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(_cache, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, CACHE_PATH)
+
+
+def folder_key(folder_name, parent_id=None):
+    return f"folder:{parent_id or 'root'}/{folder_name}"
+
+
+def spreadsheet_key(folder_id, file_name):
+    return f"spreadsheet:{folder_id}/{file_name}"
+
+
+def sheet_key(spreadsheet_id):
+    return f"sheet:{spreadsheet_id}"
+
+
+def index_key(spreadsheet_id):
+    return f"index:{spreadsheet_id}"
+
+
+def summary_key(spreadsheet_id, sheet_title):
+    return f"summary:{spreadsheet_id}/{sheet_title}"
+
+
+def get_cached(key):
+    """Cached value for a key, or None"""
+    with _lock:
+        return _load().get(key)
+
+
+def set_cached(key, value):
+    """Store a value and persist the cache"""
+    with _lock:
+        _load()[key] = value
+        _save()
+
+
+def drop_cached(key):
+    """Forget a value that turned out to be stale"""
+    with _lock:
+        if _load().pop(key, None) is not None:
+            _save()
+
+
+def forget_folder(folder_id):
+    """Drop every cached folder lookup that resolved to folder_id"""
+    with _lock:
+        cache = _load()
+        stale = [key for key, value in cache.items() if key.startswith("folder:") and value == folder_id]
+        for key in stale:
+            del cache[key]
+        if stale:
+            _save()
@@ -1,21 +1,78 @@
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import HttpRequest, MediaFileUpload
 from googleapiclient.errors import HttpError
 import os
+import gzip
+import math
 import pickle
+import random
+import shutil
+import tempfile
 import pandas as pd
 import time
 import threading
 import subprocess
 import platform
-from dotenv import load_dotenv
+import config  # Load environment variables
 from twilio_utils import send_notification_with_fallback
+from log_utils import get_logger, debug_enabled
+import offline_google
+import metrics
+import api_limits
+from query_service import NUMERIC_COLUMNS
+from sheets_writer import (
+    BACKOFF_BASE,
+    BACKOFF_CAP,
+    MAX_BATCH_BYTES,
+    MAX_WRITE_RETRIES,
+    RETRYABLE_STATUSES,
+    WRITE_CONCURRENCY,
+    WRITE_REQUESTS_PER_MINUTE,
+    estimate_row_bytes,
+    execute_with_backoff,
+    resume_pending_writes,
+    write_value_ranges,
+)
+from sheet_snapshot import (
+    content_hash,
+    discard_snapshot,
+    get_file_version,
+    load_snapshot,
+    restamp_snapshot,
+    save_snapshot,
+)
+from drive_cache import (
+    drop_cached,
+    folder_key,
+    forget_folder,
+    get_cached,
+    set_cached,
+    sheet_key,
+    spreadsheet_key,
+    summary_key,
+)
+from sheet_index import (
+    DATE_INDEX_ENABLED,
+    build_date_index,
+    expected_column,
+    fetch_date_index,
+    index_requests,
+    plan_from_index,
+    remember_index,
+    splice_index,
+)
+from sheet_shards import (
+    SHEETS_SHARD_BY,
+    load_manifest,
+    record_shard_dates,
+    resolve_shard,
+    save_manifest,
+    shard_keys,
+)
 
-# Load environment variables
-load_dotenv()
+log = get_logger("drive_handler")
 
 # Update scopes to include both Drive and Sheets APIs
 SCOPES = [
@@ -27,6 +84,48 @@ SCOPES = [
 SOCKET_TIMEOUT = 120  # seconds
 API_TIMEOUT = 300  # seconds
 
+# "google" talks to the real APIs, "offline" to the in-memory stand-in in offline_google.py
+GOOGLE_BACKEND = os.getenv("GOOGLE_BACKEND", "google").lower()
+
+# OAuth credentials shared by every service and worker thread in the process
+_credentials = None
+_credentials_lock = threading.Lock()
+
+# Spreadsheet the data is synced into when sharding is off
+SPREADSHEET_ID = os.getenv("PUBPLUS_SPREADSHEET_ID", "1ji8TqRxYScW_OzK0T1Z39WOHkFMrAOqIC6Td46Ojt04")
+
+SPREADSHEET_MIME_TYPE = "application/vnd.google-apps.spreadsheet"
+
+# Drive folder listings: largest page Drive allows, only the fields we read
+FOLDER_PAGE_SIZE = 1000
+FOLDER_LIST_FIELDS = "id, name, mimeType, modifiedTime, size"
+
+# Folder listings already fetched during this run, by folder ID
+_folder_listings = {}
+
+# How upload_df_to_drive writes to the sheet:
+#   "incremental" - replace only the rows of the refreshed dates, leave the rest untouched
+#   "full"        - clear the whole tab and rewrite every row
+#   "media"       - rewrite the sheet by importing a CSV through one resumable Drive upload
+#   "auto"        - incremental when possible, otherwise full; notes when media would be faster
+#                   (media is never picked on its own: the import replaces every tab and
+#                   Drive's CSV conversion retypes cells, e.g. drops leading zeros)
+SHEETS_SYNC_MODE = os.getenv("SHEETS_SYNC_MODE", "incremental")
+
+# How sync_sheet reads the existing rows: numbers unformatted (no thousands separators or
+# currency), dates as the text we wrote, parsed with this format
+SHEET_READ_OPTIONS = {"valueRenderOption": "UNFORMATTED_VALUE", "dateTimeRenderOption": "FORMATTED_STRING"}
+SHEET_DATE_FORMAT = "%Y-%m-%d"
+
+# Cost model "auto" uses to tell whether a media upload would be the faster full rewrite
+# (calibrate against benchmarks/bench_sync_modes.py)
+SYNC_RTT_SECONDS = float(os.getenv("SYNC_RTT_SECONDS", 0.35))
+SYNC_UPLOAD_BYTES_PER_SECOND = float(os.getenv("SYNC_UPLOAD_BYTES_PER_SECOND", 4 * 1024 * 1024))
+SHEETS_IMPORT_SECONDS_PER_MILLION_CELLS = float(os.getenv("SHEETS_IMPORT_SECONDS_PER_MILLION_CELLS", 6.0))
+
+# Resumable upload chunk size, must be a multiple of 256KB
+MEDIA_CHUNK_SIZE = 8 * 1024 * 1024
+
 
 def close_browser_tab():
     """Function to close the browser tab after authentication"""
@@ -57,94 +156,178 @@ def close_browser_tab():
     thread.start()
 
 
-def get_google_drive_service():
-    """Gets authenticated Drive and Sheets services"""
-    creds = None
-    # Use os.path.join for file paths
-    token_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "token.pickle")
-    credentials_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "credentials.json")
+def get_credentials():
+    """
+    Load the OAuth credentials once per process, refreshing them when expired.
+    Guarded by a lock so worker threads never refresh the same token concurrently.
+    """
+    global _credentials
 
-    if os.path.exists(token_path):
-        with open(token_path, "rb") as token:
-            creds = pickle.load(token)
+    with _credentials_lock:
+        if _credentials is not None and _credentials.valid:
+            return _credentials
 
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            try:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    credentials_path, SCOPES, redirect_uri="http://localhost:8080/"
-                )
+        creds = _credentials
+        token_path = config.GOOGLE_TOKEN_PATH
+        credentials_path = config.GOOGLE_CREDENTIALS_PATH
 
-                # Start the thread to close the browser tab
-                close_browser_tab()
+        if creds is None and os.path.exists(token_path):
+            with open(token_path, "rb") as token:
+                creds = pickle.load(token)
 
-                creds = flow.run_local_server(
-                    port=8080,
-                    success_message="Authentication successful! You can close this window.",
-                    open_browser=True,
-                    timeout_seconds=180,  # Increase timeout for slow VMs
-                )
-            except Exception as e:
-                error_message = f"Authentication error: {e}"
-                print(error_message)
-                print(
-                    "Please make sure you've added http://localhost:8080/ to your OAuth 2.0 Client authorized redirect URIs"
-                )
-                send_notification_with_fallback(f"ERROR: {error_message}")
-                raise
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                try:
+                    # Only needed for the interactive first login
+                    from google_auth_oauthlib.flow import InstalledAppFlow
 
-        with open(token_path, "wb") as token:
-            pickle.dump(creds, token)
+                    flow = InstalledAppFlow.from_client_secrets_file(
+                        credentials_path, SCOPES, redirect_uri="http://localhost:8080/"
+                    )
 
-    # Add retry logic for Sheets API
-    sheets_service = None
-    max_retries = 3
-    retry_delay = 20  # seconds
+                    # Start the thread to close the browser tab
+                    close_browser_tab()
 
-    for attempt in range(max_retries):
-        try:
-            sheets_service = build("sheets", "v4", credentials=creds)
-            # Test the service with a simple call
-            try:
-                sheets_service.spreadsheets().get(spreadsheetId="dummy").execute()
-            except:
-                # Expected to fail with 404, but confirms API is working
-                pass
-            break
-        except HttpError as e:
-            if "SERVICE_DISABLED" in str(e):
-                if attempt < max_retries - 1:
+                    creds = flow.run_local_server(
+                        port=8080,
+                        success_message="Authentication successful! You can close this window.",
+                        open_browser=True,
+                        timeout_seconds=180,  # Increase timeout for slow VMs
+                    )
+                except Exception as e:
+                    error_message = f"Authentication error: {e}"
+                    print(error_message)
                     print(
-                        f"\nWARNING: Google Sheets API not ready (attempt {attempt + 1}/{max_retries})"
+                        "Please make sure you've added http://localhost:8080/ to your OAuth 2.0 Client authorized redirect URIs"
                     )
-                    print("If you just enabled the API, please wait...")
-                    print(f"Retrying in {retry_delay} seconds...\n")
-                    time.sleep(retry_delay)
-                    continue
-                print("\nERROR: Google Sheets API is not enabled!")
-                print("Please follow these steps:")
-                print(
-                    "1. Go to: https://console.developers.google.com/apis/api/sheets.googleapis.com"
-                )
-                print("2. Click 'Enable API'")
-                print("3. Wait a few minutes for the changes to take effect")
-                print("4. Run this script again\n")
-                send_notification_with_fallback(
-                    "ERROR: Google Sheets API is not enabled!"
-                )
-            break
-        except Exception as e:
-            print(f"Warning: Unexpected error with Sheets API: {e}")
-            break
+                    send_notification_with_fallback(f"ERROR: {error_message}")
+                    raise
+
+            with open(token_path, "wb") as token:
+                pickle.dump(creds, token)
+
+        _credentials = creds
+        return creds
+
+
+class InstrumentedHttpRequest(HttpRequest):
+    """HttpRequest that reports each call and its payload sizes to the metrics module"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        postproc = self.postproc
+
+        def _postproc(resp, content):
+            metrics.add_bytes("google", "in", len(content or b""))
+            return postproc(resp, content)
+
+        # Batch responses go through postproc too, so they are counted as well
+        self.postproc = _postproc
+
+    def execute(self, http=None, num_retries=0):
+        metrics.count_call("google", self.methodId)
+        metrics.add_bytes("google", "out", len(self.body or ""))
+        with api_limits.slot("google"):
+            return super().execute(http=http, num_retries=num_retries)
+
+    def next_chunk(self, http=None, num_retries=0):
+        with api_limits.slot("google"):
+            return super().next_chunk(http=http, num_retries=num_retries)
+
+
+class LazyService:
+    """Google API client that is built on first use from the bundled discovery document"""
+
+    def __init__(self, api, version):
+        self._api = api
+        self._version = version
+        self._service = None
+        self._lock = threading.Lock()
+
+    def _get_service(self):
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    # static_discovery reads the discovery document shipped with
+                    # google-api-python-client instead of fetching it over the network
+                    self._service = build(
+                        self._api,
+                        self._version,
+                        credentials=get_credentials(),
+                        static_discovery=True,
+                        cache_discovery=False,
+                        requestBuilder=InstrumentedHttpRequest,
+                    )
+        return self._service
+
+    def __getattr__(self, name):
+        return getattr(self._get_service(), name)
+
+
+def explain_api_error(error):
+    """Print setup instructions when a Google API is not enabled for the project"""
+    if "SERVICE_DISABLED" not in str(error):
+        return
+    api = "sheets" if "sheets.googleapis.com" in str(error) else "drive"
+    print(f"\nERROR: Google {api.capitalize()} API is not enabled!")
+    print("Please follow these steps:")
+    print(f"1. Go to: https://console.developers.google.com/apis/api/{api}.googleapis.com")
+    print("2. Click 'Enable API'")
+    print("3. Wait a few minutes for the changes to take effect")
+    print("4. Run this script again\n")
+
+
+def get_google_drive_service(backend=None):
+    """
+    Gets Drive and Sheets services.
+    Nothing touches the network here - credentials are loaded and each client is
+    built the first time it is used. Pass an OfflineGoogle backend (or set
+    GOOGLE_BACKEND=offline) to use the in-process stand-in instead.
+    """
+    if backend is None and GOOGLE_BACKEND == "offline":
+        backend = offline_google.default_backend()
+        backend.ensure_spreadsheet(SPREADSHEET_ID, "pubplus_campaign_data")
+    if backend is not None:
+        return backend.services()
+    return LazyService("drive", "v3"), LazyService("sheets", "v4")
+
+
+def batch_execute(service, requests):
+    """
+    Run several requests against one API in a single HTTP batch round trip.
+    Returns a dict of request name -> response, or the exception that request raised.
+    """
+    results = {}
+    if not hasattr(service, "new_batch_http_request"):
+        for name, request in requests.items():
+            try:
+                results[name] = request.execute()
+            except Exception as e:
+                results[name] = e
+        return results
+
+    def _callback(request_id, response, exception):
+        results[request_id] = exception if exception is not None else response
 
-    drive_service = build("drive", "v3", credentials=creds)
-    return drive_service, sheets_service
+    batch = service.new_batch_http_request(callback=_callback)
+    for name, request in requests.items():
+        batch.add(request, request_id=name)
+    metrics.count_call("google", "batch")
+    with api_limits.slot("google"):
+        batch.execute()
+    return results
 
 
 def create_folder_if_not_exists(service, folder_name, parent_id=None):
     """Creates a folder in Google Drive if it doesn't exist already"""
+    # The cached ID is validated later together with the spreadsheet lookup
+    cached_id = get_cached(folder_key(folder_name, parent_id))
+    if cached_id:
+        print(f"Using cached folder: {folder_name} (ID: {cached_id})")
+        return cached_id
+
     query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
     if parent_id:
         query += f" and '{parent_id}' in parents"
@@ -167,67 +350,127 @@ def create_folder_if_not_exists(service, folder_name, parent_id=None):
 
         folder = service.files().create(body=file_metadata, fields="id, name").execute()
         print(f"Created new folder: {folder['name']} (ID: {folder['id']})")
+        set_cached(folder_key(folder_name, parent_id), folder["id"])
         return folder.get("id")
 
     print(f"Found existing folder: {items[0]['name']} (ID: {items[0]['id']})")
+    set_cached(folder_key(folder_name, parent_id), items[0]["id"])
     return items[0]["id"]
 
 
 def find_spreadsheet(drive_service, file_name, folder_id):
-    """Find existing spreadsheet by name in a specific folder with improved robustness"""
-    # Normalize the file name - remove .csv extension and trim spaces
-    original_file_name = file_name
-    file_name = file_name.replace(".csv", "").strip()
-    print(f"ℹ️ Searching for file '{file_name}' in Google Drive folder")
-
-    try:
-        # First: List ALL files in the folder (not just spreadsheets) for debugging
-        debug_query = f"'{folder_id}' in parents and trashed=false"
-        
-        debug_results = (
-            drive_service.files()
-            .list(
-                q=debug_query,
-                spaces="drive",
-                fields="files(id, name, mimeType)",
-                orderBy="modifiedTime desc",
-                pageSize=100,
+    """Find existing spreadsheet by name, using the cached ID when it is still valid"""
+    key = spreadsheet_key(folder_id, file_name)
+    cached = get_cached(key)
+    if cached:
+        try:
+            found = (
+                drive_service.files()
+                .get(fileId=cached["id"], fields="id, name, trashed")
+                .execute(num_retries=5)
             )
-            .execute(num_retries=5)
-        )
-        
-        debug_files = debug_results.get("files", [])
-        print(f"🔍 DEBUG - Found {len(debug_files)} total files in folder:")
-        for f in debug_files[:10]:  # Show first 10 files
-            print(f"  - {f['name']} (Type: {f['mimeType']})")
-        if len(debug_files) > 10:
-            print(f"  ... and {len(debug_files) - 10} more files")
+            if not found.get("trashed"):
+                print(f"✅ Using cached spreadsheet: {found['name']} (ID: {found['id']})")
+                return {"id": found["id"], "name": found["name"]}
+        except HttpError as e:
+            print(f"ℹ️ Cached spreadsheet ID is no longer valid: {e}")
+        drop_cached(key)
+
+    match = search_spreadsheet(drive_service, file_name, folder_id)
+    if match:
+        set_cached(key, {"id": match["id"], "name": match["name"]})
+    return match
+
 
-        # Now search specifically for spreadsheets
-        all_files_query = f"'{folder_id}' in parents and mimeType='application/vnd.google-apps.spreadsheet' and trashed=false"
+def iter_folder_files(drive_service, folder_id, fields=FOLDER_LIST_FIELDS, mime_type=None):
+    """Yield every file in a Drive folder, following nextPageToken across all pages"""
+    query = f"'{folder_id}' in parents and trashed=false"
+    if mime_type:
+        query += f" and mimeType='{mime_type}'"
 
+    page_token = None
+    while True:
         results = (
             drive_service.files()
             .list(
-                q=all_files_query,
+                q=query,
                 spaces="drive",
-                fields="files(id, name)",
+                fields=f"nextPageToken, files({fields})",
                 orderBy="modifiedTime desc",
-                pageSize=100,
+                pageSize=FOLDER_PAGE_SIZE,
+                pageToken=page_token,
             )
             .execute(num_retries=5)
         )
+        yield from results.get("files", [])
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            break
+
+
+def list_folder(drive_service, folder_id, refresh=False):
+    """
+    List a Drive folder once per run, indexed for lookups.
+    Returns {"files": [...newest first], "by_name": {lowercase name: [...]}, "by_mime": {mimeType: [...]}}.
+    """
+    if not refresh and folder_id in _folder_listings:
+        return _folder_listings[folder_id]
+
+    files = list(iter_folder_files(drive_service, folder_id))
+    listing = {"files": files, "by_name": {}, "by_mime": {}}
+    for f in files:
+        listing["by_name"].setdefault(f["name"].lower(), []).append(f)
+        listing["by_mime"].setdefault(f["mimeType"], []).append(f)
+
+    _folder_listings[folder_id] = listing
+    return listing
+
+
+def remember_listed_file(folder_id, file):
+    """Add a file we just created to the folder's listing, if it has been listed this run"""
+    listing = _folder_listings.get(folder_id)
+    if listing is None:
+        return
+    listing["files"].insert(0, file)
+    listing["by_name"].setdefault(file["name"].lower(), []).insert(0, file)
+    listing["by_mime"].setdefault(file["mimeType"], []).insert(0, file)
+
+
+def reset_folder_listings():
+    """Forget the listings of the previous run; long-running callers start each run afresh"""
+    _folder_listings.clear()
 
-        all_files = results.get("files", [])
+
+def search_spreadsheet(drive_service, file_name, folder_id):
+    """Find existing spreadsheet by name in a specific folder with improved robustness"""
+    # Normalize the file name - remove .csv extension and trim spaces
+    original_file_name = file_name
+    file_name = file_name.replace(".csv", "").strip()
+    print(f"ℹ️ Searching for file '{file_name}' in Google Drive folder")
+
+    try:
+        listing = list_folder(drive_service, folder_id)
+
+        if debug_enabled(log):
+            debug_files = listing["files"]
+            log.debug("🔍 DEBUG - Found %d total files in folder:", len(debug_files))
+            for f in debug_files[:10]:  # Show first 10 files
+                log.debug("  - %s (Type: %s)", f['name'], f['mimeType'])
+            if len(debug_files) > 10:
+                log.debug("  ... and %d more files", len(debug_files) - 10)
+
+        all_files = listing["by_mime"].get(SPREADSHEET_MIME_TYPE, [])
 
         if all_files:
             print(f"ℹ️ Found {len(all_files)} spreadsheets in the folder:")
-            for f in all_files:
+            for f in all_files[:10]:
                 print(f"  - {f['name']} (ID: {f['id']})")
+            if len(all_files) > 10:
+                print(f"  ... and {len(all_files) - 10} more spreadsheets")
 
             # First try: Look for exact filename match
-            for f in all_files:
-                if f["name"].lower() == file_name.lower():
+            for f in listing["by_name"].get(file_name.lower(), []):
+                if f["mimeType"] == SPREADSHEET_MIME_TYPE:
                     print(f"✅ Found exact match: {f['name']} (ID: {f['id']})")
                     return f
 
@@ -287,20 +530,9 @@ def find_spreadsheet(drive_service, file_name, folder_id):
         # Attempt a basic recovery with a simpler query
         try:
             print("ℹ️ Attempting recovery with basic folder query...")
-            basic_query = f"'{folder_id}' in parents and mimeType='application/vnd.google-apps.spreadsheet' and trashed=false"
-
-            results = (
-                drive_service.files()
-                .list(
-                    q=basic_query,
-                    spaces="drive",
-                    fields="files(id, name)",
-                    pageSize=100,
-                )
-                .execute(num_retries=5)
+            all_files = list(
+                iter_folder_files(drive_service, folder_id, fields="id, name", mime_type=SPREADSHEET_MIME_TYPE)
             )
-
-            all_files = results.get("files", [])
             if all_files:
                 print(f"🔍 Recovery found {len(all_files)} spreadsheets:")
                 for f in all_files:
@@ -322,11 +554,654 @@ def find_spreadsheet(drive_service, file_name, folder_id):
         return None
 
 
-def upload_df_to_drive(drive_service, sheets_service, df, folder_id):
+def dataframe_to_values(df, header):
+    """Convert a DataFrame into the list of row lists sent to the Sheets API"""
+    # Align to the header in one step - missing columns are filled empty, extras dropped
+    aligned = df.reindex(columns=header, fill_value="")
+    # Missing values (NaN/None/NaT) upload as empty cells, everything else as str(value)
+    aligned = aligned.astype(object).where(aligned.notna(), "")
+    return aligned.astype(str).values.tolist()
+
+
+def parse_sheet_dates(dates):
+    """Sheet date cells as datetimes, parsed with SHEET_DATE_FORMAT unless someone typed another format"""
+    try:
+        return pd.to_datetime(dates, format=SHEET_DATE_FORMAT, cache=True)
+    except (TypeError, ValueError):
+        print(f"  ⚠️ Dates in the sheet are not all {SHEET_DATE_FORMAT}, inferring their format")
+        return pd.to_datetime(dates, cache=True)
+
+
+def sheet_metric_column(values):
+    """
+    A metric column read from the sheet as numbers: integers when every cell was written as
+    one, floats otherwise. Columns holding any non-numeric text are returned unchanged.
+    """
+    blank = values.isna() | (values == "")
+    numbers = pd.to_numeric(values.where(~blank), errors="coerce")
+    if (numbers.isna() & ~blank).any():
+        return values
+    if (numbers % 1 > 0).any() or values.str.contains(".", regex=False, na=False).any():
+        return numbers.astype(float)
+    return numbers.astype("Int64")
+
+
+def sheet_values_to_frame(values, header):
+    """
+    Data rows read from the sheet as a DataFrame with the header's columns and parsed dates.
+    Sheets drops trailing empty cells, so rows can be shorter than the header (every row,
+    when the last columns are blank); they are padded with None and rows longer than the
+    header are cut to it, all in one reindex.
+    """
+    existing_df = pd.DataFrame(values)
+    extra = len(existing_df.columns) - len(header)
+    if extra > 0:
+        print(f"  ⚠️ Some rows have {extra} cell(s) beyond the header, ignoring them")
+    existing_df = existing_df.reindex(columns=range(len(header)))
+    existing_df.columns = header
+
+    # UNFORMATTED_VALUE returns hand-typed numbers as numbers, while our RAW writes read back
+    # as text. Metric columns become numbers and other numeric cells the text we would write,
+    # so 3, "3" and "3.0" compare equal and kept rows are rewritten the same way as new ones.
+    for column in existing_df.columns:
+        if column in NUMERIC_COLUMNS:
+            existing_df[column] = sheet_metric_column(existing_df[column])
+        elif column != 'date' and pd.api.types.infer_dtype(existing_df[column], skipna=True) not in ("string", "empty"):
+            existing_df[column] = existing_df[column].map(
+                lambda value: value if isinstance(value, str) else str(value), na_action="ignore"
+            )
+
+    existing_df['date'] = parse_sheet_dates(existing_df['date'])
+    return existing_df
+
+
+def align_to_header(df, header):
+    """New data with exactly the sheet's columns, in its order; missing ones are filled empty"""
+    log.debug("\n🔍 Debug - Aligning new data to existing sheet structure...")
+    aligned = pd.DataFrame()
+    for col in header:
+        if col in df.columns:
+            aligned[col] = df[col]
+        else:
+            aligned[col] = ""  # Fill missing columns with empty strings
+            print(f"  ⚠️ Column '{col}' missing in new data, filling with empty values")
+
+    # Check for extra columns in new data that don't exist in sheet
+    extra_columns = [col for col in df.columns if col not in header]
+    if extra_columns:
+        print(f"  ⚠️ Extra columns in new data (will be ignored): {extra_columns}")
+
+    if debug_enabled(log):
+        log.debug(
+            "\n🔍 Debug - After alignment:\n  Existing sheet columns: %d\n"
+            "  Aligned new data columns: %d\n  Column match: %s",
+            len(header),
+            len(aligned.columns),
+            list(header) == list(aligned.columns),
+        )
+
+    print(f"  ✅ New data successfully aligned to {len(aligned.columns)} columns")
+    return aligned
+
+
+def plan_incremental_edits(existing_dates, new_row_count, min_new_date, max_new_date):
+    """
+    Work out the minimal row edits that swap the refreshed dates for the new rows.
+
+    existing_dates holds the date of every data row in sheet order (the sheet is kept
+    sorted newest first). Returns a dict with the 0-based data row where the new block
+    starts, how many old rows it replaces and how many new rows go in, or None when the
+    refreshed dates are not a single contiguous block and the sheet needs a full rewrite.
+    """
+    existing_dates = existing_dates.reset_index(drop=True)
+    in_range = (existing_dates >= min_new_date) & (existing_dates <= max_new_date)
+    positions = in_range.to_numpy().nonzero()[0]
+
+    if len(positions) > 0:
+        start = int(positions[0])
+        removed = len(positions)
+        if int(positions[-1]) - start + 1 != removed:
+            return None
+    else:
+        # Nothing to replace - insert in front of the first row older than the new data
+        older = (existing_dates < min_new_date).to_numpy().nonzero()[0]
+        start = int(older[0]) if len(older) > 0 else len(existing_dates)
+        removed = 0
+
+    # The rows around the block must keep the newest-first layout
+    before = existing_dates.iloc[:start]
+    after = existing_dates.iloc[start + removed:]
+    if (before <= max_new_date).any() or (after >= min_new_date).any():
+        return None
+
+    return {"start": start, "removed": removed, "inserted": new_row_count}
+
+
+def build_row_edit_requests(sheet_id, plan):
+    """Translate an incremental edit plan into spreadsheets.batchUpdate requests"""
+    # Sheet row 0 is the header, so data row N lives at sheet row N + 1
+    first_row = plan["start"] + 1
+    removed = plan["removed"]
+    inserted = plan["inserted"]
+
+    if inserted > removed:
+        start_index = first_row + removed
+        return [{
+            "insertDimension": {
+                "range": {
+                    "sheetId": sheet_id,
+                    "dimension": "ROWS",
+                    "startIndex": start_index,
+                    "endIndex": first_row + inserted,
+                },
+                # Rows inserted right under the header take the data rows' formatting, not its
+                "inheritFromBefore": start_index > 1,
+            }
+        }]
+    if removed > inserted:
+        return [{
+            "deleteDimension": {
+                "range": {
+                    "sheetId": sheet_id,
+                    "dimension": "ROWS",
+                    "startIndex": first_row + inserted,
+                    "endIndex": first_row + removed,
+                }
+            }
+        }]
+    return []
+
+
+def sync_incremental(sheets_service, spreadsheet_id, sheet_title, sheet_id, existing_df, new_data_df, header):
+    """
+    Replace only the rows of the refreshed dates in the sheet.
+    Returns the applied plan with the written rows under "values", or None when the
+    sheet layout does not allow an in-place update.
+    """
+    min_new_date = new_data_df['date'].min()
+    max_new_date = new_data_df['date'].max()
+
+    plan = plan_incremental_edits(existing_df['date'], len(new_data_df), min_new_date, max_new_date)
+    if plan is None:
+        print("⚠️ Refreshed dates are not one contiguous block in the sheet, falling back to full rewrite")
+        return None
+
+    log_plan("Incremental sync plan", plan, len(existing_df))
+
+    index = build_date_index(existing_df['date'].dt.strftime('%Y-%m-%d'), header)
+    return apply_incremental_plan(sheets_service, spreadsheet_id, sheet_title, sheet_id, plan, new_data_df, header, index)
+
+
+def log_plan(title, plan, existing_rows):
+    log.debug(
+        "\n🔍 Debug - %s:\n  Block starts at sheet row: %d\n  Rows replaced: %d\n"
+        "  Rows written: %d\n  Rows left untouched: %d",
+        title,
+        plan['start'] + 2,
+        plan['removed'],
+        plan['inserted'],
+        existing_rows - plan['removed'],
+    )
+
+
+def apply_incremental_plan(sheets_service, spreadsheet_id, sheet_title, sheet_id, plan, new_data_df, header, index):
+    """Resize the plan's row block, write the new rows into it and update the date index"""
+    new_block = new_data_df.sort_values('date', ascending=False).copy()
+    new_block['date'] = new_block['date'].dt.strftime('%Y-%m-%d')
+    block_values = dataframe_to_values(new_block, header)
+    new_index = splice_index(index, plan, new_block['date'].tolist())
+
+    # Grow or shrink the block first so the untouched rows keep their contents;
+    # the index update rides along in the same request
+    row_requests = build_row_edit_requests(sheet_id, plan)
+    requests = row_requests + index_requests(spreadsheet_id, new_index)
+    writes = 0
+    if requests:
+        execute_with_backoff(
+            sheets_service.spreadsheets().batchUpdate(
+                spreadsheetId=spreadsheet_id,
+                body={"requests": requests},
+            )
+        )
+        remember_index(spreadsheet_id, new_index)
+        writes += 1
+        print(f"ℹ️ Applied {len(row_requests)} row edit(s)")
+
+    # Overwrite the block with the new rows
+    if block_values:
+        writes += write_value_ranges(sheets_service, spreadsheet_id, sheet_title, [(plan["start"] + 2, block_values)])
+
+    print(f"✅ Incrementally updated {len(block_values)} rows ({plan['removed']} replaced)")
+    plan["values"] = block_values
+    plan["writes"] = writes
+    return plan
+
+
+def column_letter(index):
+    """A1 column letter of a 0-based column index"""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+def sync_from_index(sheets_service, spreadsheet_id, sheet_title, sheet_id, new_data_df):
+    """
+    Incremental update without downloading the sheet.
+
+    The plan comes from the date index in the sheet's developer metadata. One batchGet
+    of the header, the date cells around the refreshed block and the last row checks
+    that the index still describes the sheet. Returns the applied plan, or None when
+    there is no usable index and the sheet has to be read in full.
+    """
+    with metrics.stage("sheets.read_index"):
+        index = fetch_date_index(sheets_service, spreadsheet_id)
+    if not index or "date" not in index.get("header", []):
+        print("ℹ️ No date index in the sheet yet")
+        return None
+
+    header = index["header"]
+    plan = plan_from_index(
+        index,
+        len(new_data_df),
+        new_data_df['date'].min().strftime('%Y-%m-%d'),
+        new_data_df['date'].max().strftime('%Y-%m-%d'),
+    )
+    if plan is None:
+        print("ℹ️ Date index shows the sheet is not sorted newest first")
+        return None
+
+    # Sheet rows (1-based) from just above the block to just below it, and the last data row
+    column = column_letter(header.index("date"))
+    first_row = plan["start"] + 1
+    last_row = plan["start"] + plan["removed"] + 2
+    tail_row = index["rows"] + 1
+    with metrics.stage("sheets.read_index"):
+        response = sheets_service.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=[
+                f"{sheet_title}!1:1",
+                f"{sheet_title}!{column}{first_row}:{column}{last_row}",
+                f"{sheet_title}!{column}{tail_row}:{column}{tail_row + 1}",
+            ],
+        ).execute()
+    value_ranges = response.get("valueRanges", [])
+    found = [[row[0] if row else "" for row in value_range.get("values", [])] for value_range in value_ranges]
+    found_header = (value_ranges[0].get("values") or [[]])[0] if value_ranges else []
+
+    if (
+        found_header != header
+        or found[1:] != [expected_column(index, first_row, last_row), expected_column(index, tail_row, tail_row + 1)]
+    ):
+        print("⚠️ Date index does not match the sheet, reading the full sheet instead")
+        return None
+
+    log_plan("Incremental sync plan (from date index)", plan, index['rows'])
+
+    return apply_incremental_plan(sheets_service, spreadsheet_id, sheet_title, sheet_id, plan, new_data_df, header, index)
+
+
+def store_date_index(sheets_service, spreadsheet_id, index, force=False):
+    """
+    Write the date index after a full rewrite; failures only cost the next run a full read.
+    Returns the number of write requests that went through.
+    """
+    try:
+        requests = index_requests(spreadsheet_id, index, force)
+        if requests:
+            execute_with_backoff(
+                sheets_service.spreadsheets().batchUpdate(
+                    spreadsheetId=spreadsheet_id,
+                    body={"requests": requests},
+                )
+            )
+            remember_index(spreadsheet_id, index)
+            return 1
+    except Exception as e:
+        print(f"⚠️ Could not store the date index: {e}")
+    return 0
+
+
+def resolve_sheet_metadata(drive_service, sheets_service, spreadsheet_id, folder_id=None):
+    """
+    Resolve the first tab of a spreadsheet and its current Drive version.
+
+    One batched Drive round trip fetches the spreadsheet's version stamp and validates
+    the cached folder ID. The tab title and ID come from the local cache while the
+    version matches our last write; otherwise spreadsheets.get is called with a field mask.
+    Returns (sheet_title, sheet_id, file_info), or None when the spreadsheet has no tabs.
+    """
+    requests = {
+        "spreadsheet": drive_service.files().get(
+            fileId=spreadsheet_id, fields="id, trashed, modifiedTime, version"
+        )
+    }
+    if folder_id:
+        requests["folder"] = drive_service.files().get(fileId=folder_id, fields="id, trashed")
+    results = batch_execute(drive_service, requests)
+
+    folder = results.get("folder")
+    if folder is not None and (isinstance(folder, Exception) or folder.get("trashed")):
+        print(f"⚠️ Drive folder {folder_id} is no longer available, it will be looked up again next run")
+        forget_folder(folder_id)
+
+    file_info = results["spreadsheet"]
+    if isinstance(file_info, Exception):
+        raise file_info
+    if file_info.get("trashed"):
+        raise ValueError(f"Spreadsheet {spreadsheet_id} is in the trash")
+
+    cached = get_cached(sheet_key(spreadsheet_id))
+    if cached and cached.get("version") == file_info.get("version"):
+        print(f"ℹ️ Using cached sheet name: {cached['sheet_title']}")
+        return cached["sheet_title"], cached["sheet_id"], file_info
+
+    sheet_metadata = sheets_service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id,
+        fields="sheets.properties(sheetId,title)",
+    ).execute()
+    if not sheet_metadata.get("sheets"):
+        return None
+
+    properties = sheet_metadata["sheets"][0]["properties"]
+    sheet_title = properties["title"]
+    sheet_id = properties.get("sheetId", 0)
+    set_cached(
+        sheet_key(spreadsheet_id),
+        {
+            "sheet_title": sheet_title,
+            "sheet_id": sheet_id,
+            "sheet_count": len(sheet_metadata["sheets"]),
+            "version": file_info.get("version"),
+        },
+    )
+    return sheet_title, sheet_id, file_info
+
+
+def version_number(file_info):
+    """Drive's version counter as an int (the offline stand-in's carry an "offline-" prefix)"""
+    return int(str(file_info.get("version")).rsplit("-", 1)[-1])
+
+
+def record_upload(drive_service, spreadsheet_id, sheet_title, sheet_id, values, before, writes):
+    """
+    Stamp the uploaded values and cached sheet metadata with the sheet's new Drive version.
+    before is the file info the sync started from and writes the number of write requests
+    we sent since. Each request is one revision, so when the version moved by any other
+    amount someone else edited the sheet meanwhile, and the snapshot is discarded instead.
+    values is None when only part of the sheet was seen; no snapshot is saved then.
+    """
+    try:
+        file_info = get_file_version(drive_service, spreadsheet_id)
+        if version_number(file_info) - version_number(before) != writes:
+            print("ℹ️ Sheet was also changed by someone else during the upload, not keeping a snapshot")
+            discard_snapshot(spreadsheet_id, sheet_title)
+            return
+        cached = get_cached(sheet_key(spreadsheet_id)) or {}
+        set_cached(
+            sheet_key(spreadsheet_id),
+            {**cached, "sheet_title": sheet_title, "sheet_id": sheet_id, "version": file_info.get("version")},
+        )
+        if values is not None:
+            save_snapshot(spreadsheet_id, sheet_title, file_info, values)
+    except Exception as e:
+        print(f"⚠️ Could not save local sheet snapshot: {e}")
+        discard_snapshot(spreadsheet_id, sheet_title)
+
+
+def estimate_values_api_seconds(payload_bytes):
+    """Modeled wall time of a clear plus byte-budgeted batch writes"""
+    batches = max(1, math.ceil(payload_bytes / MAX_BATCH_BYTES))
+    # Batches overlap up to the concurrency limit but never exceed the per-minute quota
+    request_seconds = max(
+        batches * SYNC_RTT_SECONDS / WRITE_CONCURRENCY,
+        (batches - 1) // WRITE_REQUESTS_PER_MINUTE * 60,
+    )
+    return SYNC_RTT_SECONDS + request_seconds + payload_bytes / SYNC_UPLOAD_BYTES_PER_SECOND
+
+
+def estimate_media_seconds(csv_bytes, cell_count):
+    """Modeled wall time of a resumable CSV upload including Drive's conversion"""
+    chunks = max(1, math.ceil(csv_bytes / MEDIA_CHUNK_SIZE))
+    return (
+        SYNC_RTT_SECONDS * (chunks + 1)
+        + csv_bytes / SYNC_UPLOAD_BYTES_PER_SECOND
+        + cell_count / 1e6 * SHEETS_IMPORT_SECONDS_PER_MILLION_CELLS
+    )
+
+
+def estimate_payload_bytes(df, header, sample_rows=1000):
+    """Extrapolate the values API payload size from a sample of serialized rows"""
+    if len(df) == 0:
+        return 0
+    sample = dataframe_to_values(df.sample(min(sample_rows, len(df)), random_state=0), header)
+    sample_bytes = sum(estimate_row_bytes(row) for row in sample)
+    return int(sample_bytes / len(sample) * len(df))
+
+
+def media_upload_faster(combined_df, header):
+    """Whether the cost model expects the resumable CSV import to beat a values-API rewrite"""
+    cell_count = len(combined_df) * len(header)
+    payload_bytes = estimate_payload_bytes(combined_df, header)
+    # CSV carries the same text without the JSON quotes
+    csv_bytes = max(payload_bytes - 2 * cell_count, 0)
+    values_seconds = estimate_values_api_seconds(payload_bytes)
+    media_seconds = estimate_media_seconds(csv_bytes, cell_count)
+    print(
+        f"ℹ️ Full rewrite estimate: values API {values_seconds:.1f}s, "
+        f"media upload {media_seconds:.1f}s ({cell_count:,} cells)"
+    )
+    return media_seconds < values_seconds
+
+
+def media_import_safe(spreadsheet_id, from_snapshot, combined_df):
+    """
+    Whether a CSV import can replace the spreadsheet without losing anything: it has only
+    the data tab, and its cells are still our RAW write (so there are no formulas to lose)
+    with no value the import would turn into a formula.
+    """
+    sheet_count = (get_cached(sheet_key(spreadsheet_id)) or {}).get("sheet_count")
+    if sheet_count is None:
+        return False, "the spreadsheet's tabs are not known yet"
+    if sheet_count != 1:
+        return False, "the spreadsheet has other tabs"
+    if not from_snapshot:
+        return False, "the sheet was edited since our last upload and may hold formulas"
+    for column in combined_df.columns:
+        values = combined_df[column]
+        if values.dtype == object and values.astype(str).str.startswith("=").any():
+            return False, f"column {column} has values starting with '='"
+    return True, None
+
+
+def use_media_upload(sync_mode, combined_df, header, spreadsheet_id=None, from_snapshot=False):
+    """
+    Whether a full rewrite should go through the resumable CSV import. Always with "media";
+    with "auto" only when the cost model expects it to be faster and media_import_safe
+    finds nothing the import would replace. Drive's CSV conversion still retypes cells
+    where the RAW values writes keep our text.
+    """
+    if sync_mode == "media":
+        return True
+    if sync_mode != "auto" or not media_upload_faster(combined_df, header):
+        return False
+    safe, reason = media_import_safe(spreadsheet_id, from_snapshot, combined_df)
+    if not safe:
+        print(f"ℹ️ A media upload would be faster, but {reason}; using the values API")
+    return safe
+
+
+def upload_file_resumable(drive_service, path, mimetype, file_id=None, metadata=None):
+    """
+    Upload a file through one resumable Drive media upload.
+
+    Creates a new file, or replaces the content of file_id. When metadata asks for a
+    Google Sheets mimeType (or file_id is a spreadsheet), Drive converts CSV content.
+    A failed chunk is retried from the last byte Drive confirmed rather than from the start.
+    """
+    media = MediaFileUpload(path, mimetype=mimetype, chunksize=MEDIA_CHUNK_SIZE, resumable=True)
+    if file_id:
+        request = drive_service.files().update(
+            fileId=file_id, body=metadata or {}, media_body=media, fields="id, version, modifiedTime"
+        )
+    else:
+        request = drive_service.files().create(
+            body=metadata or {}, media_body=media, fields="id, version, modifiedTime"
+        )
+
+    size = os.path.getsize(path)
+    metrics.count_call("google", "drive.files.upload")
+    metrics.add_bytes("google", "out", size)
+    response = None
+    attempt = 0
+    while response is None:
+        try:
+            status, response = request.next_chunk(num_retries=3)
+            attempt = 0
+            if status:
+                print(f"ℹ️ Uploaded {status.resumable_progress / 1e6:.1f} of {size / 1e6:.1f} MB")
+        except HttpError as e:
+            if int(e.resp.status) not in RETRYABLE_STATUSES or attempt >= MAX_WRITE_RETRIES:
+                raise
+            delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt) + random.uniform(0, 1)
+            attempt += 1
+            print(f"⚠️ Upload chunk failed with {e.resp.status}, resuming in {delay:.1f}s")
+            time.sleep(delay)
+
+    print(f"✅ Uploaded {size / 1e6:.1f} MB in one resumable upload")
+    return response
+
+
+def upload_sheet_as_csv(drive_service, spreadsheet_id, combined_df, header):
+    """Replace the spreadsheet content by importing the merged data as CSV"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "sheet.csv")
+        combined_df.reindex(columns=header, fill_value="").to_csv(csv_path, index=False)
+        return upload_file_resumable(drive_service, csv_path, "text/csv", file_id=spreadsheet_id)
+
+
+def upload_csv_artifact(drive_service, csv_path, folder_id, compress=True):
+    """Upload the local CSV export to the Drive folder as a (gzip-compressed) file, without conversion"""
+    name = os.path.basename(csv_path)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        upload_path, mimetype = csv_path, "text/csv"
+        if compress:
+            name += ".gz"
+            upload_path, mimetype = os.path.join(tmp_dir, name), "application/gzip"
+            with open(csv_path, "rb") as src, gzip.open(upload_path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+
+        existing = list_folder(drive_service, folder_id)["by_name"].get(name.lower(), [])
+        if existing:
+            return upload_file_resumable(drive_service, upload_path, mimetype, file_id=existing[0]["id"])
+        created = upload_file_resumable(
+            drive_service, upload_path, mimetype, metadata={"name": name, "parents": [folder_id]}
+        )
+        # So later uploads in the same run update this file instead of adding another
+        remember_listed_file(folder_id, {"id": created["id"], "name": name, "mimeType": mimetype})
+        return created
+
+
+def write_summary_tab(drive_service, sheets_service, spreadsheet_id, sheet_title, values):
+    """
+    Replace the contents of a secondary tab, adding the tab first if it is missing.
+    Skipped when the values are the same as our last write. Meant to run after the data
+    upload: the data tab's cached metadata and snapshot are moved to the Drive version this
+    write produces, so the next run can still use them. Returns True when the tab was written.
+    """
+    key = summary_key(spreadsheet_id, sheet_title)
+    digest = content_hash(values)
+    written = get_cached(key)
+    if written == digest:
+        return False
+
+    before = get_file_version(drive_service, spreadsheet_id)
+    added = 0
+    writes = 0
+    try:
+        # The tab is only looked up until we have written it once
+        if written is None:
+            metadata = sheets_service.spreadsheets().get(
+                spreadsheetId=spreadsheet_id,
+                fields="sheets.properties(sheetId,title)",
+            ).execute()
+            titles = {sheet["properties"]["title"] for sheet in metadata.get("sheets", [])}
+            if sheet_title not in titles:
+                execute_with_backoff(
+                    sheets_service.spreadsheets().batchUpdate(
+                        spreadsheetId=spreadsheet_id,
+                        body={"requests": [{"addSheet": {"properties": {"title": sheet_title}}}]},
+                    )
+                )
+                added = writes = 1
+                print(f"ℹ️ Added tab {sheet_title}")
+
+        execute_with_backoff(
+            sheets_service.spreadsheets().values().clear(spreadsheetId=spreadsheet_id, range=sheet_title)
+        )
+        writes += 1 + write_value_ranges(sheets_service, spreadsheet_id, sheet_title, [(1, values)])
+    except Exception:
+        # Look the tab up again next time, someone may have removed it
+        drop_cached(key)
+        raise
+    set_cached(key, digest)
+
+    # Only carried over when this write accounts for every revision since before (see record_upload)
+    after = get_file_version(drive_service, spreadsheet_id)
+    cached = get_cached(sheet_key(spreadsheet_id))
+    if (
+        cached
+        and cached.get("version") == before.get("version")
+        and version_number(after) - version_number(before) == writes
+    ):
+        cached = {**cached, "version": after.get("version")}
+        if "sheet_count" in cached:
+            cached["sheet_count"] += added
+        set_cached(sheet_key(spreadsheet_id), cached)
+        restamp_snapshot(spreadsheet_id, cached["sheet_title"], before.get("version"), after)
+    return True
+
+
+def upload_df_to_drive(drive_service, sheets_service, df, folder_id, sync_mode=None):
     """Upload DataFrame directly to Google Drive as a spreadsheet, merging with existing data"""
-    # Use the specific spreadsheet ID provided by the user
-    spreadsheet_id = "1ji8TqRxYScW_OzK0T1Z39WOHkFMrAOqIC6Td46Ojt04"
-    
+    if SHEETS_SHARD_BY != "none":
+        return upload_sharded(drive_service, sheets_service, df, folder_id, SHEETS_SHARD_BY, sync_mode)
+
+    return sync_sheet(drive_service, sheets_service, df, SPREADSHEET_ID, sync_mode, folder_id)
+
+
+def upload_sharded(drive_service, sheets_service, df, folder_id, shard_by, sync_mode=None):
+    """Split the data into shards and sync each one into its own spreadsheet"""
+    manifest = load_manifest(shard_by)
+    keys = shard_keys(df, shard_by)
+    print(f"ℹ️ Sharding upload by {shard_by}: {keys.nunique()} shard(s) touched")
+
+    synced = []
+    for key, shard_df in df.groupby(keys, sort=True):
+        shard = resolve_shard(drive_service, manifest, folder_id, key)
+        print(f"\nℹ️ Syncing shard {key} ({len(shard_df)} rows) into {shard['name']}")
+
+        if not sync_sheet(
+            drive_service, sheets_service, shard_df, shard["spreadsheet_id"], sync_mode, folder_id
+        ):
+            # Keep what already succeeded; the failed shard is retried on the next run
+            save_manifest(manifest)
+            return None
+
+        record_shard_dates(manifest, key, shard_df["date"])
+        save_manifest(manifest)
+        synced.append(shard["spreadsheet_id"])
+
+    print(f"✅ Synced {len(synced)} shard(s)")
+    return synced[0] if len(synced) == 1 else synced
+
+
+def sync_sheet(drive_service, sheets_service, df, spreadsheet_id, sync_mode=None, folder_id=None):
+    """Merge a DataFrame into the first tab of a spreadsheet"""
+    sync_mode = sync_mode or SHEETS_SYNC_MODE
+
     # Make a copy of the dataframe to avoid modifying the original
     new_data_df = df.copy()
     
@@ -338,21 +1213,22 @@ def upload_df_to_drive(drive_service, sheets_service, df, folder_id):
     min_new_date = new_data_df['date'].min()
     max_new_date = new_data_df['date'].max()
     
-    print(f"\n🔍 Debug - New data date range:")
-    print(f"  Min date: {min_new_date}")
-    print(f"  Max date: {max_new_date}")
-    print(f"  Total rows: {len(new_data_df)}")
+    log.debug(
+        "\n🔍 Debug - New data date range:\n  Min date: %s\n  Max date: %s\n  Total rows: %d",
+        min_new_date,
+        max_new_date,
+        len(new_data_df),
+    )
 
-    print(f"ℹ️ Using specific spreadsheet ID: {spreadsheet_id}")
+    print(f"ℹ️ Using spreadsheet ID: {spreadsheet_id}")
 
+    sheet_title = None
     try:
         # Get the sheet
-        sheet_metadata = sheets_service.spreadsheets().get(
-            spreadsheetId=spreadsheet_id
-        ).execute()
+        sheet_info = resolve_sheet_metadata(drive_service, sheets_service, spreadsheet_id, folder_id)
         
-        if "sheets" in sheet_metadata and len(sheet_metadata["sheets"]) > 0:
-            sheet_title = sheet_metadata["sheets"][0]["properties"]["title"]
+        if sheet_info:
+            sheet_title, sheet_id, file_info = sheet_info
             print(f"ℹ️ Found sheet with name: {sheet_title}")
         else:
             error_message = "❌ No sheets found in the spreadsheet"
@@ -360,105 +1236,122 @@ def upload_df_to_drive(drive_service, sheets_service, df, folder_id):
             send_notification_with_fallback(f"ERROR: {error_message}")
             return None
 
-        # Get existing data
-        existing_data = sheets_service.spreadsheets().values().get(
-            spreadsheetId=spreadsheet_id,
-            range=f"{sheet_title}"
-        ).execute()
+        # Finish any writes a previous run could not confirm before reading the sheet
+        if not resume_pending_writes(sheets_service, spreadsheet_id, sheet_title):
+            error_message = "❌ Sheet still has unconfirmed writes from a previous upload, skipping this update"
+            print(error_message)
+            send_notification_with_fallback(f"ERROR: {error_message}")
+            return None
+
+        # Use the local snapshot of our last upload unless someone else has edited the sheet since
+        snapshot_values = load_snapshot(spreadsheet_id, sheet_title, file_info)
+        index_plan = None
+        if snapshot_values is None and DATE_INDEX_ENABLED and sync_mode in ("incremental", "auto"):
+            index_plan = sync_from_index(sheets_service, spreadsheet_id, sheet_title, sheet_id, new_data_df)
+
+        if snapshot_values is not None:
+            existing_data = {"values": snapshot_values}
+            print(f"✅ Sheet unchanged since our last upload, using local snapshot ({len(snapshot_values)} rows)")
+        elif index_plan:
+            # Only the refreshed block was read, so there is no full snapshot to keep
+            record_upload(drive_service, spreadsheet_id, sheet_title, sheet_id, None, file_info, index_plan["writes"])
+            return spreadsheet_id
+        else:
+            # Get existing data
+            with metrics.stage("sheets.read"):
+                existing_data = sheets_service.spreadsheets().values().get(
+                    spreadsheetId=spreadsheet_id,
+                    range=f"{sheet_title}",
+                    **SHEET_READ_OPTIONS,
+                ).execute()
 
         # Get the existing column headers from the sheet first
         existing_headers = None
         if 'values' in existing_data and len(existing_data['values']) > 0:
             existing_headers = existing_data['values'][0]
-            print(f"\n🔍 Debug - Existing sheet headers ({len(existing_headers)} columns):")
-            print(f"  Headers: {existing_headers}")
-        
-        print(f"\n🔍 Debug - New data headers ({len(new_data_df.columns)} columns):")
-        print(f"  Headers: {list(new_data_df.columns)}")
-        
+            log.debug(
+                "\n🔍 Debug - Existing sheet headers (%d columns):\n  Headers: %s", len(existing_headers), existing_headers
+            )
+
+        if debug_enabled(log):
+            log.debug(
+                "\n🔍 Debug - New data headers (%d columns):\n  Headers: %s",
+                len(new_data_df.columns),
+                list(new_data_df.columns),
+            )
+
         # Align new data to match existing sheet structure FIRST
         if existing_headers:
-            print(f"\n🔍 Debug - Aligning new data to existing sheet structure...")
-            new_data_aligned = pd.DataFrame()
-            for col in existing_headers:
-                if col in new_data_df.columns:
-                    new_data_aligned[col] = new_data_df[col]
-                else:
-                    new_data_aligned[col] = ""  # Fill missing columns with empty strings
-                    print(f"  ⚠️ Column '{col}' missing in new data, filling with empty values")
-            
-            # Check for extra columns in new data that don't exist in sheet
-            extra_columns = [col for col in new_data_df.columns if col not in existing_headers]
-            if extra_columns:
-                print(f"  ⚠️ Extra columns in new data (will be ignored): {extra_columns}")
-            
-            print(f"\n🔍 Debug - After alignment:")
-            print(f"  Existing sheet columns: {len(existing_headers)}")
-            print(f"  Aligned new data columns: {len(new_data_aligned.columns)}")
-            print(f"  Column match: {list(existing_headers) == list(new_data_aligned.columns)}")
-            
-            # Use the aligned data
-            new_data_df = new_data_aligned
-            print(f"  ✅ New data successfully aligned to {len(new_data_df.columns)} columns")
+            new_data_df = align_to_header(new_data_df, existing_headers)
 
         try:
-            print(f"\n🔍 Debug - Starting data processing...")
-            print(f"  New data columns before processing: {len(new_data_df.columns)}")
-            
+            log.debug(
+                "\n🔍 Debug - Starting data processing...\n  New data columns before processing: %d",
+                len(new_data_df.columns),
+            )
+
             if 'values' in existing_data and len(existing_data['values']) > 1:
                 # Debug the raw data structure from Google Sheets
-                print(f"\n🔍 Debug - Raw Google Sheets data structure:")
-                print(f"  Total rows in existing_data: {len(existing_data['values'])}")
-                print(f"  Header row length: {len(existing_data['values'][0])}")
-                
-                # Check the length of the first few data rows
-                for i in range(1, min(6, len(existing_data['values']))):
-                    row_length = len(existing_data['values'][i])
-                    print(f"  Row {i} length: {row_length}")
-                    if row_length != len(existing_data['values'][0]):
-                        print(f"    ⚠️ Row {i} has different length than header!")
-                        print(f"    Header: {len(existing_data['values'][0])} columns")
-                        print(f"    Row {i}: {row_length} columns")
-                        # Show the extra data
-                        if row_length > len(existing_data['values'][0]):
-                            extra_data = existing_data['values'][i][len(existing_data['values'][0]):]
-                            print(f"    Extra data in row {i}: {extra_data}")
-                
-                # Try to create DataFrame with error handling
-                try:
-                    existing_df = pd.DataFrame(existing_data['values'][1:], columns=existing_headers)
-                    print(f"  ✅ Successfully created existing_df with {len(existing_df.columns)} columns")
-                except Exception as df_error:
-                    print(f"  ❌ Error creating DataFrame: {df_error}")
-                    
-                    # Try to fix by truncating rows to match header length
-                    print(f"  🔧 Attempting to fix by truncating rows to header length...")
-                    fixed_data = []
-                    header_length = len(existing_headers)
-                    
-                    for row in existing_data['values'][1:]:
-                        if len(row) > header_length:
-                            fixed_row = row[:header_length]  # Truncate to header length
-                            fixed_data.append(fixed_row)
-                        elif len(row) < header_length:
-                            # Pad with empty strings if row is shorter
-                            fixed_row = row + [''] * (header_length - len(row))
-                            fixed_data.append(fixed_row)
-                        else:
-                            fixed_data.append(row)
-                    
-                    existing_df = pd.DataFrame(fixed_data, columns=existing_headers)
-                    print(f"  ✅ Fixed and created existing_df with {len(existing_df.columns)} columns")
-                
-                print(f"  Created existing_df with {len(existing_df.columns)} columns")
-                
-                existing_df['date'] = pd.to_datetime(existing_df['date'])
-                print(f"  After date conversion, existing_df has {len(existing_df.columns)} columns")
-                
-                print(f"\n🔍 Debug - Existing sheet data:")
-                print(f"  Total existing rows: {len(existing_df)}")
-                print(f"  Existing date range: {existing_df['date'].min()} to {existing_df['date'].max()}")
-                print(f"  Existing data columns: {len(existing_df.columns)}")
+                if debug_enabled(log):
+                    log.debug(
+                        "\n🔍 Debug - Raw Google Sheets data structure:\n  Total rows in existing_data: %d\n"
+                        "  Header row length: %d",
+                        len(existing_data['values']),
+                        len(existing_data['values'][0]),
+                    )
+
+                    # Check the length of the first few data rows
+                    for i in range(1, min(6, len(existing_data['values']))):
+                        row_length = len(existing_data['values'][i])
+                        log.debug("  Row %d length: %d", i, row_length)
+                        if row_length != len(existing_data['values'][0]):
+                            log.debug("    ⚠️ Row %d has different length than header!", i)
+                            log.debug("    Header: %d columns", len(existing_data['values'][0]))
+                            log.debug("    Row %d: %d columns", i, row_length)
+                            # Show the extra data
+                            if row_length > len(existing_data['values'][0]):
+                                extra_data = existing_data['values'][i][len(existing_data['values'][0]):]
+                                log.debug("    Extra data in row %d: %s", i, extra_data)
+
+                existing_df = sheet_values_to_frame(existing_data['values'][1:], existing_headers)
+                log.debug("  ✅ Successfully created existing_df with %d columns", len(existing_df.columns))
+
+                if debug_enabled(log):
+                    log.debug(
+                        "\n🔍 Debug - Existing sheet data:\n  Total existing rows: %d\n"
+                        "  Existing date range: %s to %s\n  Existing data columns: %d",
+                        len(existing_df),
+                        existing_df['date'].min(),
+                        existing_df['date'].max(),
+                        len(existing_df.columns),
+                    )
+
+                plan = None
+                if sync_mode in ("incremental", "auto"):
+                    plan = sync_incremental(
+                        sheets_service,
+                        spreadsheet_id,
+                        sheet_title,
+                        sheet_id,
+                        existing_df,
+                        new_data_df,
+                        existing_headers,
+                    )
+                if plan:
+                    # Splice the written block into the rows we already had (row 0 is the header)
+                    sheet_values = existing_data['values']
+                    record_upload(
+                        drive_service,
+                        spreadsheet_id,
+                        sheet_title,
+                        sheet_id,
+                        sheet_values[:plan["start"] + 1]
+                        + plan["values"]
+                        + sheet_values[plan["start"] + 1 + plan["removed"]:],
+                        file_info,
+                        plan["writes"],
+                    )
+                    return spreadsheet_id
 
                 # Remove ALL existing data that falls within the new data date range
                 # This prevents duplication when re-running for the same dates
@@ -466,19 +1359,22 @@ def upload_df_to_drive(drive_service, sheets_service, df, folder_id):
                     (existing_df['date'] < min_new_date) | 
                     (existing_df['date'] > max_new_date)
                 ]
-                print(f"  After filtering, old_data_df has {len(old_data_df.columns)} columns")
-                
-                # Count how many rows we're removing
-                removed_rows = len(existing_df) - len(old_data_df)
-                
-                print(f"\n🔍 Debug - Data filtering:")
-                print(f"  Rows being removed (overlapping dates): {removed_rows}")
-                print(f"  Rows kept from existing data: {len(old_data_df)}")
-                print(f"  Old data columns: {len(old_data_df.columns)}")
-                print(f"  New data columns before concat: {len(new_data_df.columns)}")
-                if len(old_data_df) > 0:
-                    print(f"  Kept data date range: {old_data_df['date'].min()} to {old_data_df['date'].max()}")
-                
+
+                if debug_enabled(log):
+                    log.debug(
+                        "\n🔍 Debug - Data filtering:\n  Rows being removed (overlapping dates): %d\n"
+                        "  Rows kept from existing data: %d\n  Old data columns: %d\n"
+                        "  New data columns before concat: %d",
+                        len(existing_df) - len(old_data_df),
+                        len(old_data_df),
+                        len(old_data_df.columns),
+                        len(new_data_df.columns),
+                    )
+                    if len(old_data_df) > 0:
+                        log.debug(
+                            "  Kept data date range: %s to %s", old_data_df['date'].min(), old_data_df['date'].max()
+                        )
+
                 # Ensure both dataframes have exactly the same columns before concatenation
                 if len(old_data_df.columns) != len(new_data_df.columns):
                     print(f"  ⚠️ Column mismatch before concat: old={len(old_data_df.columns)}, new={len(new_data_df.columns)}")
@@ -486,33 +1382,40 @@ def upload_df_to_drive(drive_service, sheets_service, df, folder_id):
                     old_data_df = old_data_df.reindex(columns=existing_headers, fill_value="")
                     new_data_df = new_data_df.reindex(columns=existing_headers, fill_value="")
                     print(f"  ✅ Forced both to {len(existing_headers)} columns")
-                    print(f"  After reindex - old_data_df: {len(old_data_df.columns)}, new_data_df: {len(new_data_df.columns)}")
-                
-                # Combine old and new data
-                print(f"  About to concat - old_data_df: {len(old_data_df.columns)}, new_data_df: {len(new_data_df.columns)}")
-                combined_df = pd.concat([old_data_df, new_data_df], ignore_index=True)
-                print(f"  Combined data columns after concat: {len(combined_df.columns)}")
-                
+
+                # Combine old and new data, newest first. The sheet is normally in that order
+                # already, so only the new rows are sorted and then placed between the kept ones
+                new_data_df = new_data_df.sort_values('date', ascending=False)
+                if old_data_df['date'].is_monotonic_decreasing:
+                    combined_df = pd.concat(
+                        [
+                            old_data_df[old_data_df['date'] > max_new_date],
+                            new_data_df,
+                            old_data_df[old_data_df['date'] < min_new_date],
+                        ],
+                        ignore_index=True,
+                    )
+                else:
+                    combined_df = pd.concat([old_data_df, new_data_df], ignore_index=True)
+                    combined_df = combined_df.sort_values('date', ascending=False)
+                log.debug("  Combined data columns after concat: %d", len(combined_df.columns))
+
             else:
-                # No existing data, just use new data
-                print(f"\n🔍 Debug - No existing data found, using new data only")
-                combined_df = new_data_df.copy()
-                print(f"  Combined data columns (new only): {len(combined_df.columns)}")
-            
-            # Sort by date in descending order (newest first)
-            print(f"  Before sorting: {len(combined_df.columns)} columns")
-            combined_df = combined_df.sort_values('date', ascending=False)
-            print(f"  After sorting: {len(combined_df.columns)} columns")
-            
-            print(f"\n🔍 Debug - Final combined data:")
-            print(f"  Total rows: {len(combined_df)}")
-            print(f"  Date range: {combined_df['date'].min()} to {combined_df['date'].max()}")
-            print(f"  Columns after sorting: {len(combined_df.columns)}")
-            
+                # No existing data, just use new data sorted by date (newest first)
+                log.debug("\n🔍 Debug - No existing data found, using new data only")
+                combined_df = new_data_df.sort_values('date', ascending=False)
+
+            if debug_enabled(log):
+                log.debug(
+                    "\n🔍 Debug - Final combined data:\n  Total rows: %d\n  Date range: %s to %s\n  Columns: %d",
+                    len(combined_df),
+                    combined_df['date'].min(),
+                    combined_df['date'].max(),
+                    len(combined_df.columns),
+                )
+
             # Convert back to string format for upload
-            print(f"  Before date string conversion: {len(combined_df.columns)} columns")
             combined_df['date'] = combined_df['date'].dt.strftime('%Y-%m-%d')
-            print(f"  Columns after date conversion: {len(combined_df.columns)}")
             
         except Exception as e:
             print(f"❌ Error in data processing section: {e}")
@@ -528,9 +1431,12 @@ def upload_df_to_drive(drive_service, sheets_service, df, folder_id):
             expected_columns = len(existing_headers)
             actual_columns = len(combined_df.columns)
             
-            print(f"\n🔍 Debug - Final column verification:")
-            print(f"  Expected columns (from sheet): {expected_columns}")
-            print(f"  Actual columns (combined data): {actual_columns}")
+            log.debug(
+                "\n🔍 Debug - Final column verification:\n  Expected columns (from sheet): %d\n"
+                "  Actual columns (combined data): %d",
+                expected_columns,
+                actual_columns,
+            )
             
             if expected_columns != actual_columns:
                 print(f"  ❌ Column count mismatch detected!")
@@ -549,62 +1455,51 @@ def upload_df_to_drive(drive_service, sheets_service, df, folder_id):
                 combined_df = aligned_df
                 print(f"  ✅ Forced alignment complete. New column count: {len(combined_df.columns)}")
             else:
-                print(f"  ✅ Column count matches perfectly!")
+                log.debug("  ✅ Column count matches perfectly!")
         
-        # Clear the entire sheet and upload all data
-        sheets_service.spreadsheets().values().clear(
-            spreadsheetId=spreadsheet_id, range=f"{sheet_title}"
-        ).execute()
-        print(f"ℹ️ Cleared sheet for complete update")
-        
-        # Prepare data for upload in chunks
-        chunk_size = 1000
-        
-        # Upload header first - use existing headers to maintain consistency
+        # Header for the rewrite - use existing headers to maintain consistency
         if existing_headers:
             header_values = [existing_headers]
         else:
             header_values = [combined_df.columns.tolist()]
-            
+
+        if use_media_upload(
+            sync_mode, combined_df, header_values[0], spreadsheet_id, snapshot_values is not None
+        ):
+            upload_sheet_as_csv(drive_service, spreadsheet_id, combined_df, header_values[0])
+            # The import replaces the tab, so its cached ID and snapshot no longer apply
+            drop_cached(sheet_key(spreadsheet_id))
+            store_date_index(
+                sheets_service, spreadsheet_id, build_date_index(combined_df['date'], header_values[0]), force=True
+            )
+            print(f"✅ Successfully replaced spreadsheet with {len(combined_df)} total rows")
+            return spreadsheet_id
+
+        # Clear the entire sheet and upload all data
+        execute_with_backoff(
+            sheets_service.spreadsheets().values().clear(
+                spreadsheetId=spreadsheet_id, range=f"{sheet_title}"
+            )
+        )
+        print(f"ℹ️ Cleared sheet for complete update")
+        
         print(f"ℹ️ About to upload headers: {len(header_values[0])} columns")
         print(f"ℹ️ Combined data has: {len(combined_df.columns)} columns")
         
-        sheets_service.spreadsheets().values().update(
-            spreadsheetId=spreadsheet_id,
-            range=f"{sheet_title}!A1",
-            valueInputOption="RAW",
-            body={"values": header_values},
-        ).execute()
-        
-        print(f"ℹ️ Uploaded headers: {len(header_values[0])} columns")
-        
-        # Upload data in chunks
-        for i in range(0, len(combined_df), chunk_size):
-            chunk = combined_df.iloc[i:i+chunk_size]
-            chunk_values = []
-            for _, row in chunk.iterrows():
-                row_values = [str(val) if val != "" else "" for val in row.tolist()]
-                if len(row_values) != len(header_values[0]):
-                    print(f"  ⚠️ Row {i} has {len(row_values)} values but header has {len(header_values[0])} columns")
-                    # Pad or trim to match header length
-                    while len(row_values) < len(header_values[0]):
-                        row_values.append("")
-                    row_values = row_values[:len(header_values[0])]
-                chunk_values.append(row_values)
-            
-            # Calculate the starting row (A2 for first chunk, then continue)
-            start_row = i + 2  # +2 because row 1 is header and we're 0-indexed
-            range_name = f"{sheet_title}!A{start_row}"
-            
-            sheets_service.spreadsheets().values().update(
-                spreadsheetId=spreadsheet_id,
-                range=range_name,
-                valueInputOption="RAW",
-                body={"values": chunk_values},
-            ).execute()
-            
-            print(f"✅ Uploaded chunk {i//chunk_size + 1} of {(len(combined_df) + chunk_size - 1)//chunk_size}")
-            time.sleep(0.5)  # Small delay between chunks
+        # Header and rows go out together, packed into byte-budgeted batchUpdate requests
+        data_values = dataframe_to_values(combined_df, header_values[0])
+        writes = 1 + write_value_ranges(
+            sheets_service,
+            spreadsheet_id,
+            sheet_title,
+            [(1, header_values), (2, data_values)],
+        )
+        writes += store_date_index(
+            sheets_service, spreadsheet_id, build_date_index(combined_df['date'], header_values[0])
+        )
+        record_upload(
+            drive_service, spreadsheet_id, sheet_title, sheet_id, header_values + data_values, file_info, writes
+        )
 
         print(f"✅ Successfully updated spreadsheet with {len(combined_df)} total rows")
         return spreadsheet_id
@@ -612,7 +1507,11 @@ def upload_df_to_drive(drive_service, sheets_service, df, folder_id):
     except Exception as e:
         error_message = f"❌ Error updating spreadsheet: {e}"
         print(error_message)
+        explain_api_error(e)
         send_notification_with_fallback(f"ERROR: {error_message}")
+        # A failed or partial write leaves the sheet unlike our snapshot of it
+        if sheet_title is not None:
+            discard_snapshot(spreadsheet_id, sheet_title)
         return None
 
 
@@ -622,21 +1521,7 @@ def list_drive_folder_contents(drive_service, folder_id):
         print(f"\n🔍 DEBUGGING - Listing all contents of folder ID: {folder_id}")
         
         # Get all files in the folder
-        query = f"'{folder_id}' in parents and trashed=false"
-        
-        results = (
-            drive_service.files()
-            .list(
-                q=query,
-                spaces="drive",
-                fields="files(id, name, mimeType, modifiedTime, size)",
-                orderBy="modifiedTime desc",
-                pageSize=100,
-            )
-            .execute(num_retries=5)
-        )
-        
-        all_files = results.get("files", [])
+        all_files = list_folder(drive_service, folder_id)["files"]
         
         if all_files:
             print(f"📁 Found {len(all_files)} files in the folder:")
@@ -654,7 +1539,7 @@ def list_drive_folder_contents(drive_service, folder_id):
                     'size': f.get('size', 'N/A')
                 }
                 
-                if f['mimeType'] == 'application/vnd.google-apps.spreadsheet':
+                if f['mimeType'] == SPREADSHEET_MIME_TYPE:
                     spreadsheets.append(file_info)
                 else:
                     other_files.append(file_info)
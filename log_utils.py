@@ -0,0 +1,37 @@
+import os
+import sys
+import logging
+import config  # Load environment variables
+
+# LOG_LEVEL=debug shows the 🔍 diagnostics; at the default info level they are skipped
+# before any message is formatted
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info").upper()
+
+
+class ConsoleHandler(logging.Handler):
+    """Writes records to whatever sys.stdout is at the time, so runner.py's run log sees them"""
+
+    def emit(self, record):
+        try:
+            sys.stdout.write(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
+
+_root = logging.getLogger("pubplus")
+_root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+_root.propagate = False
+if not _root.handlers:
+    _handler = ConsoleHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    _root.addHandler(_handler)
+
+
+def get_logger(name):
+    """Logger for one module, under the shared "pubplus" logger"""
+    return logging.getLogger(f"pubplus.{name}")
+
+
+def debug_enabled(logger):
+    """Guard for debug output that is expensive to compute"""
+    return logger.isEnabledFor(logging.DEBUG)
@@ -1,81 +1,146 @@
 from datetime import datetime, timedelta
+import sys
 import time
 import os
 import pandas as pd
-from dotenv import load_dotenv
-from get import get_campaign_data
-from csv_handler import process_campaigns_data, save_to_csv
+import config  # Load environment variables
+from config import CSV_PATH, DATA_DIR, FETCH_DAYS_BACK, FETCH_DELAY_SECONDS
+import get
+from get import fetch_day
+from csv_handler import process_campaigns_data, projected_columns, retained_columns, save_to_csv
+from sheet_index import remembered_header
 from drive_handler import (
+    SPREADSHEET_ID,
     get_google_drive_service,
     create_folder_if_not_exists,
+    reset_folder_listings,
+    upload_csv_artifact,
     upload_df_to_drive,
+    write_summary_tab,
 )
+from sheet_shards import SHEETS_SHARD_BY
 from twilio_utils import send_notification_with_fallback
+import metrics
+import preflight
+import rollups
 
-# Load environment variables
-load_dotenv()
+# Process exit codes
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_NO_DATA = 2
 
 
-def main():
-    print("\n🔄 Starting PubPlus campaign data collection...")
-
+def connect_google():
+    """Drive and Sheets services plus the campaign_data folder ID, or None on failure"""
     # Initialize Google Drive and Sheets services
     try:
         drive_service, sheets_service = get_google_drive_service()
-        print("✅ Successfully connected to Google services")
+        print("✅ Google services ready (connecting on first use)")
     except Exception as e:
         error_message = f"❌ Error connecting to Google services: {e}"
         print(error_message)
         print("Please check your Google API credentials and internet connection.")
         send_notification_with_fallback(f"ALERT: {error_message}")
-        return
+        return None
 
     # Create or get the main campaign_data folder in Google Drive
     try:
-        drive_folder_id = create_folder_if_not_exists(drive_service, "campaign_data")
-        print(f"ℹ️ Using Google Drive folder: campaign_data (ID: {drive_folder_id})")
+        drive_folder_id = create_folder_if_not_exists(drive_service, config.DRIVE_FOLDER_NAME)
+        print(f"ℹ️ Using Google Drive folder: {config.DRIVE_FOLDER_NAME} (ID: {drive_folder_id})")
     except Exception as e:
         error_message = f"❌ Error accessing Google Drive folder: {e}"
         print(error_message)
         send_notification_with_fallback(f"ALERT: {error_message}")
+        return None
+
+    return drive_service, sheets_service, drive_folder_id
+
+
+def refresh_rollups(campaigns):
+    """Fold the run's rows into the local 7/30 day rollups; returns the store, None when off or failed"""
+    try:
+        return rollups.refresh(campaigns)
+    except Exception as e:
+        error_message = f"❌ Error updating campaign rollups: {e}"
+        print(error_message)
+        send_notification_with_fallback(f"ALERT: {error_message}")
+        return None
+
+
+def write_rollups_tab(drive_service, sheets_service, store):
+    """Rewrite the summary tab after the data upload; never fatal"""
+    spreadsheet_id = rollups.ROLLUP_SPREADSHEET_ID or (SPREADSHEET_ID if SHEETS_SHARD_BY == "none" else None)
+    if spreadsheet_id is None:
+        print(f"ℹ️ Sharded upload, set ROLLUP_SPREADSHEET_ID to get the {rollups.ROLLUP_SHEET_TITLE} tab")
         return
 
-    # Create directory for data if it doesn't exist
-    output_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), "campaign_data")
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-        print(f"ℹ️ Created local directory: {output_dir}")
+    try:
+        values = rollups.summary_values(store)
+        if write_summary_tab(drive_service, sheets_service, spreadsheet_id, rollups.ROLLUP_SHEET_TITLE, values):
+            print(f"✅ Wrote {len(values) - 1} campaign rollups to the {rollups.ROLLUP_SHEET_TITLE} tab")
+        else:
+            print(f"ℹ️ Campaign rollups unchanged, {rollups.ROLLUP_SHEET_TITLE} tab left as is")
+    except Exception as e:
+        print(f"⚠️ Could not write the {rollups.ROLLUP_SHEET_TITLE} tab, it will be rewritten next run: {e}")
 
-    # Define the single CSV file path using os.path.join
-    filename = os.path.join(output_dir, "pubplus_campaign_data.csv")
 
-    # Get current date and calculate start date (30 days ago)
+def default_dates(days_back=FETCH_DAYS_BACK):
+    """Dates of a normal run, oldest first"""
     today = datetime.now()
-    start_date = today - timedelta(days=7)
-    print(f"ℹ️ Fetching data from {start_date.strftime('%Y-%m-%d')} to {today.strftime('%Y-%m-%d')}")
+    return [today - timedelta(days=n) for n in range(days_back, -1, -1)]
+
+
+def main(dates=None, services=None, notify_success=True):
+    """
+    Fetch, save and upload the campaign data; returns a process exit code.
+    dates defaults to the last FETCH_DAYS_BACK days plus today. services is the result of
+    connect_google(), passed in by long-running callers that keep their clients warm.
+    """
+    print("\n🔄 Starting PubPlus campaign data collection...")
+    # Drive folder listings are memoized per run; the scheduler runs many in one process
+    reset_folder_listings()
+
+    # Token expiry, PubPlus endpoint and Google connection, checked side by side
+    with metrics.stage("preflight"):
+        ok, connected = preflight.run(connect_google if services is None else None)
+    if not ok:
+        return EXIT_FAILED
+    drive_service, sheets_service, drive_folder_id = services or connected
+
+    # Create directory for data if it doesn't exist
+    if not os.path.exists(DATA_DIR):
+        os.makedirs(DATA_DIR)
+        print(f"ℹ️ Created local directory: {DATA_DIR}")
+
+    filename = CSV_PATH
+
+    dates = dates or default_dates()
+    print(f"ℹ️ Fetching data from {dates[0].strftime('%Y-%m-%d')} to {dates[-1].strftime('%Y-%m-%d')}")
+
+    # Only the schema's fields (or the sheet's columns) are kept while flattening
+    columns = projected_columns(remembered_header(SPREADSHEET_ID))
+    if columns is not None:
+        print(f"ℹ️ Keeping {columns}")
 
     all_campaigns = []
     successful_days = 0
     failed_days = 0
     empty_days = 0
 
-    # Fetch data for each day in the last 7 days
-    current_date = start_date
+    # Fetch data for each requested day
     campaigns_by_date = {}  # Dictionary to track campaigns per date
     
-    while current_date <= today:
+    for i, current_date in enumerate(dates):
         date_str = current_date.strftime("%Y-%m-%d")
-        
-        # Set time range for the entire day
-        start_datetime = f"{date_str} 00:00:00"
-        end_datetime = f"{date_str} 23:59:59"
 
         print(f"\nℹ️ Fetching data for {date_str}...")
 
-        response_data = get_campaign_data(start_datetime, end_datetime)
+        with metrics.stage("fetch"):
+            response_data = fetch_day(date_str)
 
         if response_data:
-            campaigns_list = process_campaigns_data(response_data)
+            with metrics.stage("process"):
+                campaigns_list = process_campaigns_data(response_data, columns)
             if campaigns_list and len(campaigns_list) > 0:
                 for campaign in campaigns_list:
                     campaign["date"] = date_str
@@ -91,13 +156,17 @@ def main():
             failed_days += 1
             campaigns_by_date[date_str] = 0
             print(f"❌ Failed to fetch data for {date_str}")
-
-        current_date += timedelta(days=1)
+            if get.token_rejected:
+                # Every remaining day would fail the same way
+                skipped = len(dates) - i - 1
+                failed_days += skipped
+                print(f"❌ PubPlus rejected the token, skipping the remaining {skipped} day(s)")
+                break
 
         # Add delay between days to avoid rate limiting
-        if current_date <= today:
+        if i < len(dates) - 1:
             print("ℹ️ Waiting before next request...")
-            time.sleep(5)  # Add 5 second delay between requests
+            time.sleep(FETCH_DELAY_SECONDS)
 
     # Summary of data collection
     print(f"\n📊 Data collection summary:")
@@ -111,110 +180,75 @@ def main():
     for date, count in sorted(campaigns_by_date.items()):
         print(f"  {date}: {count} campaigns")
 
+    exit_code = EXIT_OK
     if all_campaigns:
         # Upload to Google Drive
         try:
             print(f"ℹ️ Uploading data to Google Drive...")
             
             # First save to CSV
-            save_to_csv(all_campaigns, filename)
+            with metrics.stage("save_csv"):
+                save_to_csv(all_campaigns, filename, retained_columns(columns))
             print(f"✅ Saved data to local CSV: {filename}")
-            
+
+            # Optionally keep a compressed copy of the CSV in Drive as well
+            if os.getenv("UPLOAD_CSV_ARTIFACT", "off").lower() == "on":
+                try:
+                    upload_csv_artifact(drive_service, filename, drive_folder_id)
+                except Exception as e:
+                    print(f"⚠️ Could not upload CSV artifact: {e}")
+
+            with metrics.stage("rollups"):
+                rollup_store = refresh_rollups(all_campaigns)
+
             # Create DataFrame directly from all_campaigns
             df = pd.DataFrame(all_campaigns)
             
             # Upload DataFrame directly
-            file_id = upload_df_to_drive(drive_service, sheets_service, df, drive_folder_id)
+            with metrics.stage("upload"):
+                file_id = upload_df_to_drive(drive_service, sheets_service, df, drive_folder_id)
             
             if file_id:
                 success_message = f"✅ Data successfully updated in Google Drive spreadsheet"
                 print(success_message)
+
+                # After the data upload, so the tab write can re-stamp the version it recorded
+                if rollup_store is not None:
+                    with metrics.stage("rollups"):
+                        write_rollups_tab(drive_service, sheets_service, rollup_store)
+            if file_id and notify_success:
                 # Send success notification
                 send_notification_with_fallback(
                     f"SUCCESS: PubPlus data collection complete. Updated {successful_days} days of data. ({empty_days} empty, {failed_days} failed)"
                 )
-            else:
+            elif not file_id:
                 error_message = "❌ Failed to update Google Drive spreadsheet - file not found"
                 print(error_message)
                 send_notification_with_fallback(f"ALERT: {error_message}")
+                exit_code = EXIT_FAILED
         except Exception as e:
             error_message = f"❌ Error uploading to Google Drive: {e}"
             print(error_message)
             send_notification_with_fallback(f"ALERT: {error_message}")
+            exit_code = EXIT_FAILED
     else:
         error_message = "⚠️ No data to upload to Google Drive"
         print(error_message)
         send_notification_with_fallback(f"WARNING: {error_message}")
+        exit_code = EXIT_NO_DATA
 
     print("\n✅ Data collection process complete!")
+    return exit_code
 
 
 if __name__ == "__main__":
+    metrics.start_run()
     try:
-        main()
+        exit_code = main()
     except Exception as e:
         error_message = f"❌ CRITICAL ERROR: {e}"
         print(error_message)
         send_notification_with_fallback(f"CRITICAL ERROR: {error_message}")
-
-def save_to_csv(campaigns, filename):
-    """Save campaign data to CSV file"""
-    try:
-        # Debug print raw data
-        print("\n🔍 Debug - Raw data before DataFrame conversion:")
-        print(f"  Number of campaigns: {len(campaigns)}")
-        date_counts = {}
-        for campaign in campaigns:
-            date = campaign['date']
-            date_counts[date] = date_counts.get(date, 0) + 1
-        
-        print("  Date distribution in raw data:")
-        for date in sorted(date_counts.keys()):
-            print(f"    {date}: {date_counts[date]} campaigns")
-        
-        # Convert list of dictionaries to DataFrame
-        df = pd.DataFrame(campaigns)
-        
-        # Debug print before saving
-        print("\n🔍 Debug - Data being saved to CSV:")
-        print(f"  Date range in memory: {df['date'].min()} to {df['date'].max()}")
-        print(f"  Total rows: {len(df)}")
-        
-        # Save to CSV with explicit date format
-        df.to_csv(filename, index=False, date_format='%Y-%m-%d')
-        print(f"Saved {len(df)} rows to {filename}")
-        
-        # Verify saved data
-        df_check = pd.read_csv(filename)
-        print("\n🔍 Debug - Verification after save:")
-        print(f"  Date range in saved file: {df_check['date'].min()} to {df_check['date'].max()}")
-        print(f"  Total rows in file: {len(df_check)}")
-        
-        # Check for date format issues
-        print("\n🔍 Debug - Date format check:")
-        date_samples = df_check['date'].sample(min(5, len(df_check))).tolist()
-        print(f"  Sample dates from file: {date_samples}")
-        
-        # Verify all dates are present
-        date_counts_in_file = df_check['date'].value_counts().to_dict()
-        print(f"  Number of unique dates in file: {len(date_counts_in_file)}")
-        
-        # Check for missing dates
-        missing_dates = []
-        for date in date_counts:
-            if date not in date_counts_in_file:
-                missing_dates.append(date)
-        
-        if missing_dates:
-            print(f"⚠️ WARNING: {len(missing_dates)} dates are missing in the saved file!")
-            print(f"  Missing dates: {missing_dates}")
-        else:
-            print("✅ All dates from raw data are present in the saved file")
-        
-        return df_check  # Return the dataframe for direct use
-        
-    except Exception as e:
-        error_message = f"❌ Error saving to CSV: {e}"
-        print(error_message)
-        send_notification_with_fallback(f"ERROR: {error_message}")
-        return None
+        exit_code = EXIT_FAILED
+    metrics.finish_run(exit_code)
+    sys.exit(exit_code)
@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+import config  # Load environment variables
+
+# Per-stage timings, API call counts, bytes moved and memory, exported after each run
+METRICS_ENABLED = os.getenv("METRICS", "on").lower() != "off"
+METRICS_DIR = os.getenv(
+    "METRICS_DIR",
+    os.path.join(config.DATA_DIR, "metrics"),
+)
+# JSON run report and Prometheus textfile (point the latter at node_exporter's textfile directory)
+METRICS_REPORT_PATH = os.getenv("METRICS_REPORT_PATH", os.path.join(METRICS_DIR, "run_report.json"))
+METRICS_PROM_PATH = os.getenv("METRICS_PROM_PATH", os.path.join(METRICS_DIR, "pubplus.prom"))
+RSS_SAMPLE_SECONDS = 0.05
+
+# Set by runner.py --profile: cProfile and tracemalloc dumps per top-level stage go here
+PROFILE_DIR = os.getenv("METRICS_PROFILE_DIR") or None
+
+_lock = threading.Lock()
+_run = None
+_active = []  # stages currently open, innermost last
+_sampler = None
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss():
+    """Peak RSS of the process so far in bytes, or None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _new_run(run_id):
+    return {"run_id": run_id, "started_at": time.time(), "stages": {}, "calls": Counter(), "bytes": Counter()}
+
+
+def start_run(run_id=None):
+    """Reset the collected metrics for a new run"""
+    global _run
+    with _lock:
+        _run = _new_run(run_id)
+        _active.clear()
+    if PROFILE_DIR:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+
+def _current_run():
+    # Called with _lock held; metrics recorded outside runner/main start an implicit run
+    global _run
+    if _run is None:
+        _run = _new_run(None)
+    return _run
+
+
+def count_call(api, method, n=1):
+    """Count a request to an external API (pubplus, google, twilio)"""
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        _current_run()["calls"][(api, method)] += n
+
+
+def add_bytes(api, direction, n):
+    """Count payload bytes sent ("out") to or received ("in") from an API"""
+    if not METRICS_ENABLED or not n:
+        return
+    with _lock:
+        _current_run()["bytes"][(api, direction)] += n
+
+
+def _sample_rss():
+    while True:
+        with _lock:
+            if not _active:
+                break
+            rss = current_rss()
+            for entry in _active:
+                entry["peak"] = max(entry["peak"], rss or 0)
+        time.sleep(RSS_SAMPLE_SECONDS)
+
+
+def _ensure_sampler():
+    global _sampler
+    if current_rss() is None:
+        return
+    if _sampler is None or not _sampler.is_alive():
+        _sampler = threading.Thread(target=_sample_rss, name="metrics-rss", daemon=True)
+        _sampler.start()
+
+
+@contextmanager
+def stage(name):
+    """
+    Time a pipeline stage. Wall and CPU time add up over repeated stages of the same
+    name; peak RSS is the highest resident size seen while any of them ran.
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+
+    entry = {"name": name, "peak": current_rss() or 0}
+    with _lock:
+        _current_run()
+        top_level = not _active
+        _active.append(entry)
+    _ensure_sampler()
+
+    profiler = snapshot = None
+    if PROFILE_DIR and top_level:
+        import cProfile
+        import tracemalloc
+        profiler = cProfile.Profile()
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        profiler.enable()
+
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - wall_started
+        cpu = time.process_time() - cpu_started
+        if profiler is not None:
+            profiler.disable()
+            write_profile(name, profiler, snapshot)
+        with _lock:
+            _active.remove(entry)
+            peak = max(entry["peak"], current_rss() or 0) or peak_rss()
+            stats = _run["stages"].setdefault(
+                name, {"count": 0, "seconds": 0.0, "cpu_seconds": 0.0, "peak_rss_bytes": 0}
+            )
+            stats["count"] += 1
+            stats["seconds"] += wall
+            stats["cpu_seconds"] += cpu
+            stats["peak_rss_bytes"] = max(stats["peak_rss_bytes"], peak or 0)
+
+
+def write_profile(name, profiler, snapshot):
+    """Dump a stage's cProfile stats and its top allocations since the stage started"""
+    import tracemalloc
+
+    run_dir = os.path.join(PROFILE_DIR, (_run or {}).get("run_id") or "run")
+    os.makedirs(run_dir, exist_ok=True)
+    safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+    profiler.dump_stats(os.path.join(run_dir, f"{safe_name}.prof"))
+    if snapshot is not None and tracemalloc.is_tracing():
+        top = tracemalloc.take_snapshot().compare_to(snapshot, "lineno")[:25]
+        with open(os.path.join(run_dir, f"{safe_name}.tracemalloc.txt"), "w") as f:
+            f.write("\n".join(str(stat) for stat in top) + "\n")
+
+
+def run_report(exit_code=None):
+    """The collected metrics as a JSON-serialisable dict"""
+    with _lock:
+        run = _current_run()
+        return {
+            "run_id": run["run_id"],
+            "started_at": run["started_at"],
+            "finished_at": time.time(),
+            "exit_code": exit_code,
+            "peak_rss_bytes": peak_rss(),
+            "stages": {name: dict(stats) for name, stats in run["stages"].items()},
+            "api_calls": [
+                {"api": api, "method": method, "count": n} for (api, method), n in sorted(run["calls"].items())
+            ],
+            "bytes": [
+                {"api": api, "direction": direction, "bytes": n}
+                for (api, direction), n in sorted(run["bytes"].items())
+            ],
+        }
+
+
+def prometheus_text(report):
+    """Render a run report in the Prometheus text exposition format"""
+    lines = [
+        "# HELP pubplus_run_exit_code Exit code of the last run",
+        "# TYPE pubplus_run_exit_code gauge",
+        f"pubplus_run_exit_code {report['exit_code'] if report['exit_code'] is not None else -1}",
+        "# HELP pubplus_run_finished_timestamp_seconds When the last run finished",
+        "# TYPE pubplus_run_finished_timestamp_seconds gauge",
+        f"pubplus_run_finished_timestamp_seconds {report['finished_at']:.3f}",
+        "# HELP pubplus_run_duration_seconds Wall time of the last run",
+        "# TYPE pubplus_run_duration_seconds gauge",
+        f"pubplus_run_duration_seconds {report['finished_at'] - report['started_at']:.3f}",
+    ]
+    for metric, key, help_text in (
+        ("pubplus_stage_seconds", "seconds", "Wall time spent in a stage during the last run"),
+        ("pubplus_stage_cpu_seconds", "cpu_seconds", "CPU time spent in a stage during the last run"),
+        ("pubplus_stage_peak_rss_bytes", "peak_rss_bytes", "Peak resident memory while a stage ran"),
+        ("pubplus_stage_count", "count", "How often a stage ran during the last run"),
+    ):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+        for name, stats in sorted(report["stages"].items()):
+            lines.append(f'{metric}{{stage="{name}"}} {stats[key]:.6g}')
+    lines += ["# HELP pubplus_api_calls Requests made to external APIs during the last run", "# TYPE pubplus_api_calls gauge"]
+    for call in report["api_calls"]:
+        lines.append(f'pubplus_api_calls{{api="{call["api"]}",method="{call["method"]}"}} {call["count"]}')
+    lines += ["# HELP pubplus_api_bytes Payload bytes exchanged with external APIs during the last run", "# TYPE pubplus_api_bytes gauge"]
+    for entry in report["bytes"]:
+        lines.append(f'pubplus_api_bytes{{api="{entry["api"]}",direction="{entry["direction"]}"}} {entry["bytes"]}')
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def finish_run(exit_code=None):
+    """Write the JSON run report and the Prometheus textfile; returns the report"""
+    if not METRICS_ENABLED:
+        return None
+    report = run_report(exit_code)
+    try:
+        _write_atomic(METRICS_REPORT_PATH, json.dumps(report, indent=2))
+        _write_atomic(METRICS_PROM_PATH, prometheus_text(report))
+    except Exception as e:
+        print(f"⚠️ Could not write metrics: {e}")
+        return report
+
+    print("\n📊 Run metrics:")
+    for name, stats in report["stages"].items():
+        print(
+            f"  {name}: {stats['seconds']:.2f}s wall, {stats['cpu_seconds']:.2f}s CPU, "
+            f"peak RSS {stats['peak_rss_bytes'] / 1e6:.0f} MB ({stats['count']}x)"
+        )
+    print(f"ℹ️ Metrics written to {METRICS_REPORT_PATH} and {METRICS_PROM_PATH}")
+    return report
@@ -0,0 +1,582 @@
+import os
+import re
+import csv
+import io
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+import httplib2
+from googleapiclient.errors import HttpError
+import config  # Load environment variables
+import metrics
+import api_limits
+
+# In-process stand-in for the Drive v3 and Sheets v4 endpoints drive_handler uses.
+# Selected with GOOGLE_BACKEND=offline; state lives in memory for the life of the process.
+OFFLINE_LATENCY_SECONDS = float(os.getenv("OFFLINE_GOOGLE_LATENCY", 0))
+OFFLINE_UPLOAD_BYTES_PER_SECOND = float(os.getenv("OFFLINE_GOOGLE_BYTES_PER_SECOND", 0))  # 0 = unlimited
+OFFLINE_DOWNLOAD_BYTES_PER_SECOND = float(os.getenv("OFFLINE_GOOGLE_DOWNLOAD_BYTES_PER_SECOND", 0))  # 0 = unlimited
+OFFLINE_WRITE_QUOTA_PER_MINUTE = int(os.getenv("OFFLINE_GOOGLE_WRITE_QUOTA", 0))  # 0 = unlimited
+OFFLINE_ERROR_RATE = float(os.getenv("OFFLINE_GOOGLE_ERROR_RATE", 0))
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+SPREADSHEET_MIME_TYPE = "application/vnd.google-apps.spreadsheet"
+
+# Requests counted against the Sheets write quota
+WRITE_ENDPOINTS = {
+    "values.update",
+    "values.batchUpdate",
+    "values.clear",
+    "spreadsheets.batchUpdate",
+}
+
+
+class SimulatedClock:
+    """Clock that only moves when something sleeps, for timing runs without waiting"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 0)
+
+
+def http_error(status, reason, uri=""):
+    """HttpError shaped like the ones googleapiclient raises"""
+    content = json.dumps({"error": {"code": status, "message": reason, "status": reason}}).encode("utf-8")
+    return HttpError(httplib2.Response({"status": status}), content, uri=uri)
+
+
+def parse_query(q):
+    """The handful of Drive query clauses we use, as a predicate over file metadata"""
+    name = re.search(r"name='((?:[^'\\]|\\.)*)'", q)
+    mime_type = re.search(r"mimeType='([^']*)'", q)
+    parent = re.search(r"'([^']*)' in parents", q)
+    not_trashed = "trashed=false" in q.replace(" ", "")
+
+    def _match(f):
+        if name and f["name"] != name.group(1).replace("\\'", "'"):
+            return False
+        if mime_type and f["mimeType"] != mime_type.group(1):
+            return False
+        if parent and parent.group(1) not in f.get("parents", []):
+            return False
+        if not_trashed and f.get("trashed"):
+            return False
+        return True
+
+    return _match
+
+
+def column_index(letters):
+    """0-based index of an A1 column such as 'A' or 'AB'"""
+    index = 0
+    for letter in letters.upper():
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
+
+
+def parse_range(a1_range):
+    """
+    Bounds of an A1 range such as 'Sheet1', 'Sheet1!A25', 'Sheet1!1:1' or 'Sheet1!B5:B9'
+    as 0-based (first_row, last_row, first_col, last_col); open ends are None.
+    """
+    cells = a1_range.split("!", 1)[1] if "!" in a1_range else ""
+    bounds = []
+    for part in cells.split(":") if cells else []:
+        match = re.fullmatch(r"([A-Za-z]*)(\d*)", part)
+        bounds.append((
+            int(match.group(2)) - 1 if match.group(2) else None,
+            column_index(match.group(1)) if match.group(1) else None,
+        ))
+    if not bounds:
+        return 0, None, 0, None
+    (first_row, first_col), (last_row, last_col) = bounds[0], bounds[-1]
+    if len(bounds) == 1 and first_col is not None:
+        # A single cell reference only anchors where writes start
+        last_row, last_col = None, None
+    return first_row or 0, last_row, first_col or 0, last_col
+
+
+def range_start_row(a1_range):
+    """0-based first row of an A1 range"""
+    return parse_range(a1_range)[0]
+
+
+def range_title(a1_range):
+    return a1_range.split("!", 1)[0].strip("'")
+
+
+class OfflineRequest:
+    """Stands in for googleapiclient's HttpRequest"""
+
+    def __init__(self, backend, endpoint, body, handler, media=None):
+        self.backend = backend
+        self.endpoint = endpoint
+        self.body = body
+        self.handler = handler
+        self.media = media
+
+    def execute(self, http=None, num_retries=0):
+        for attempt in range(num_retries + 1):
+            try:
+                return self.backend.call(self)
+            except HttpError as e:
+                # googleapiclient retries 429 and 5xx itself when num_retries is set
+                if int(e.resp.status) not in (429, 500, 502, 503, 504) or attempt == num_retries:
+                    raise
+                self.backend.sleep(random.random() * 2 ** attempt)
+
+    def next_chunk(self, num_retries=0):
+        """Resumable upload: the whole file in one call, timed as initiation plus one round trip per chunk"""
+        return None, self.execute(num_retries=num_retries)
+
+    def payload_bytes(self):
+        if self.media is not None:
+            return self.media.size()
+        return len(json.dumps(self.body)) if self.body else 0
+
+
+class OfflineBatch:
+    """Stands in for BatchHttpRequest: every added request shares one round trip"""
+
+    def __init__(self, backend, callback):
+        self.backend = backend
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id or str(len(self.requests)), request))
+
+    def execute(self):
+        self.backend.round_trip("batch", sum(request.payload_bytes() for _, request in self.requests))
+        for request_id, request in self.requests:
+            try:
+                response, exception = self.backend.call(request, in_batch=True), None
+            except HttpError as e:
+                response, exception = None, e
+            self.callback(request_id, response, exception)
+
+
+class _Resource:
+    """Namespace object handing out OfflineRequests for one API resource"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+
+class _Files(_Resource):
+    def list(self, q="", pageSize=100, pageToken=None, **kwargs):
+        return OfflineRequest(
+            self.backend, "files.list", None, lambda: self.backend.list_files(q, pageSize, pageToken)
+        )
+
+    def get(self, fileId, fields=None, **kwargs):
+        return OfflineRequest(self.backend, "files.get", None, lambda: self.backend.get_file(fileId))
+
+    def create(self, body=None, media_body=None, fields=None, **kwargs):
+        return OfflineRequest(
+            self.backend,
+            "files.create",
+            body,
+            lambda: self.backend.create_file(body or {}, media_body),
+            media=media_body,
+        )
+
+    def update(self, fileId, body=None, media_body=None, fields=None, **kwargs):
+        return OfflineRequest(
+            self.backend,
+            "files.update",
+            body,
+            lambda: self.backend.update_file(fileId, body or {}, media_body),
+            media=media_body,
+        )
+
+
+class _Values(_Resource):
+    # Cells are kept as the strings written with valueInputOption RAW, which Sheets returns
+    # unchanged whatever the valueRenderOption/dateTimeRenderOption, so both are ignored
+    def get(self, spreadsheetId, range, **kwargs):
+        return OfflineRequest(
+            self.backend, "values.get", None, lambda: self.backend.get_values(spreadsheetId, range)
+        )
+
+    def batchGet(self, spreadsheetId, ranges, **kwargs):
+        return OfflineRequest(
+            self.backend,
+            "values.batchGet",
+            None,
+            lambda: {
+                "spreadsheetId": spreadsheetId,
+                "valueRanges": [self.backend.get_values(spreadsheetId, a1_range) for a1_range in ranges],
+            },
+        )
+
+    def clear(self, spreadsheetId, range, body=None, **kwargs):
+        return OfflineRequest(
+            self.backend, "values.clear", body, lambda: self.backend.clear_values(spreadsheetId, range)
+        )
+
+    def update(self, spreadsheetId, range, valueInputOption=None, body=None, **kwargs):
+        return OfflineRequest(
+            self.backend,
+            "values.update",
+            body,
+            lambda: self.backend.write_values(spreadsheetId, [{"range": range, "values": body["values"]}]),
+        )
+
+    def batchUpdate(self, spreadsheetId, body):
+        return OfflineRequest(
+            self.backend,
+            "values.batchUpdate",
+            body,
+            lambda: self.backend.write_values(spreadsheetId, body["data"]),
+        )
+
+
+class _Spreadsheets(_Resource):
+    def get(self, spreadsheetId, fields=None, **kwargs):
+        return OfflineRequest(
+            self.backend, "spreadsheets.get", None, lambda: self.backend.get_spreadsheet(spreadsheetId)
+        )
+
+    def batchUpdate(self, spreadsheetId, body):
+        return OfflineRequest(
+            self.backend,
+            "spreadsheets.batchUpdate",
+            body,
+            lambda: self.backend.apply_requests(spreadsheetId, body["requests"]),
+        )
+
+    def values(self):
+        return _Values(self.backend)
+
+
+class OfflineDrive(_Resource):
+    def files(self):
+        return _Files(self.backend)
+
+    def new_batch_http_request(self, callback=None):
+        return OfflineBatch(self.backend, callback)
+
+
+class OfflineSheets(_Resource):
+    def spreadsheets(self):
+        return _Spreadsheets(self.backend)
+
+
+class OfflineGoogle:
+    """
+    In-memory Drive and Sheets with configurable latency, bandwidth, write quota and
+    injected 429s. Every round trip is counted per endpoint along with the bytes sent
+    and received.
+    IDs and versions carry an "offline-" prefix so they never match real Drive state
+    left in the local caches.
+    """
+
+    def __init__(
+        self,
+        latency=OFFLINE_LATENCY_SECONDS,
+        upload_bytes_per_second=OFFLINE_UPLOAD_BYTES_PER_SECOND,
+        download_bytes_per_second=OFFLINE_DOWNLOAD_BYTES_PER_SECOND,
+        write_quota_per_minute=OFFLINE_WRITE_QUOTA_PER_MINUTE,
+        error_rate=OFFLINE_ERROR_RATE,
+        error_endpoints=None,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        seed=0,
+    ):
+        self.latency = latency
+        self.upload_bytes_per_second = upload_bytes_per_second
+        self.download_bytes_per_second = download_bytes_per_second
+        self.write_quota_per_minute = write_quota_per_minute
+        self.error_rate = error_rate
+        self.error_endpoints = error_endpoints
+        self.clock = clock
+        self.sleep = sleep
+        self.files = {}
+        self._random = random.Random(seed)
+        self._writes = deque()
+        self._next_id = 0
+        self._lock = threading.RLock()
+        self.reset_stats()
+
+    def services(self):
+        """(drive_service, sheets_service) pair, as returned by get_google_drive_service"""
+        return OfflineDrive(self), OfflineSheets(self)
+
+    def reset_stats(self):
+        self.requests = Counter()
+        self.errors = Counter()
+        self.round_trips = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    # --- transport ---------------------------------------------------------
+
+    def round_trip(self, endpoint, payload_bytes):
+        """Account for one HTTP exchange and let the configured network time pass"""
+        with self._lock:
+            self.round_trips += 1
+            self.requests[endpoint] += 1
+            self.bytes_sent += payload_bytes
+        seconds = self.latency
+        if self.upload_bytes_per_second:
+            seconds += payload_bytes / self.upload_bytes_per_second
+        if seconds:
+            self.sleep(seconds)
+
+    def call(self, request, in_batch=False):
+        """Run one request: network time, quota and error injection, then the handler"""
+        if in_batch:
+            return self._call(request, in_batch)
+        with api_limits.slot("google"):
+            return self._call(request, in_batch)
+
+    def _call(self, request, in_batch):
+        if in_batch:
+            with self._lock:
+                self.requests[request.endpoint] += 1
+        elif request.media is not None:
+            # Resumable upload: initiation request plus one request per chunk
+            chunk_size = getattr(request.media, "chunksize", lambda: 0)() or request.payload_bytes()
+            chunks = max(1, math.ceil(request.payload_bytes() / max(chunk_size, 1)))
+            self.round_trip(request.endpoint, 0)
+            for i in range(chunks):
+                self.round_trip(request.endpoint, min(chunk_size, request.payload_bytes() - i * chunk_size))
+        else:
+            self.round_trip(request.endpoint, request.payload_bytes())
+            # Batches and media uploads are counted by drive_handler, as with the real client
+            metrics.count_call("google", request.endpoint)
+            metrics.add_bytes("google", "out", request.payload_bytes())
+
+        with self._lock:
+            self._check_quota(request.endpoint)
+            if self.error_rate and (self.error_endpoints is None or request.endpoint in self.error_endpoints):
+                if self._random.random() < self.error_rate:
+                    self.errors[request.endpoint] += 1
+                    raise http_error(429, "RESOURCE_EXHAUSTED", request.endpoint)
+            response = request.handler()
+            response_bytes = len(json.dumps(response))
+            self.bytes_received += response_bytes
+        metrics.add_bytes("google", "in", response_bytes)
+
+        if self.download_bytes_per_second:
+            self.sleep(response_bytes / self.download_bytes_per_second)
+        return response
+
+    def _check_quota(self, endpoint):
+        if not self.write_quota_per_minute or endpoint not in WRITE_ENDPOINTS:
+            return
+        now = self.clock()
+        while self._writes and self._writes[0] + 60 <= now:
+            self._writes.popleft()
+        if len(self._writes) >= self.write_quota_per_minute:
+            self.errors[endpoint] += 1
+            raise http_error(429, "RATE_LIMIT_EXCEEDED", endpoint)
+        self._writes.append(now)
+
+    # --- Drive -------------------------------------------------------------
+
+    def _new_id(self, kind):
+        self._next_id += 1
+        return f"offline-{kind}-{self._next_id}"
+
+    def _touch(self, f):
+        f["version"] = f"offline-{int(f['version'].rsplit('-', 1)[1]) + 1}"
+        f["modifiedTime"] = datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+    def _file(self, file_id):
+        f = self.files.get(file_id)
+        if f is None:
+            raise http_error(404, f"File not found: {file_id}")
+        return f
+
+    def _metadata(self, f):
+        return {key: value for key, value in f.items() if key not in ("sheets", "content")}
+
+    def add_file(self, name, mime_type, parents=None, file_id=None):
+        """Create a file directly, without going through the API"""
+        with self._lock:
+            file_id = file_id or self._new_id("folder" if mime_type == FOLDER_MIME_TYPE else "file")
+            f = {
+                "id": file_id,
+                "name": name,
+                "mimeType": mime_type,
+                "parents": list(parents or []),
+                "trashed": False,
+                "version": "offline-0",
+                "modifiedTime": None,
+                "size": "0",
+            }
+            if mime_type == SPREADSHEET_MIME_TYPE:
+                f["sheets"] = [{"title": "Sheet1", "sheetId": 0, "rows": []}]
+            self._touch(f)
+            self.files[file_id] = f
+            return f
+
+    def ensure_spreadsheet(self, file_id, name, rows=None, parents=None):
+        """Make sure a spreadsheet with this ID exists, optionally seeding its first tab"""
+        with self._lock:
+            f = self.files.get(file_id) or self.add_file(name, SPREADSHEET_MIME_TYPE, parents, file_id)
+            if rows is not None:
+                f["sheets"][0]["rows"] = [list(row) for row in rows]
+                self._touch(f)
+            return f
+
+    def sheet_rows(self, file_id, index=0):
+        """Current rows of a tab, trailing empty cells trimmed like the values API does"""
+        return self.get_values(file_id, self._file(file_id)["sheets"][index]["title"]).get("values", [])
+
+    def list_files(self, q, page_size, page_token):
+        matches = [self._metadata(f) for f in self.files.values() if parse_query(q)(f)]
+        matches.sort(key=lambda f: f["modifiedTime"] or "", reverse=True)
+        start = int(page_token or 0)
+        result = {"files": matches[start:start + page_size]}
+        if start + page_size < len(matches):
+            result["nextPageToken"] = str(start + page_size)
+        return result
+
+    def get_file(self, file_id):
+        return self._metadata(self._file(file_id))
+
+    def create_file(self, body, media):
+        f = self.add_file(body.get("name", "Untitled"), body.get("mimeType", "application/octet-stream"), body.get("parents"))
+        if media is not None:
+            self._store_media(f, media)
+        return self._metadata(f)
+
+    def update_file(self, file_id, body, media):
+        f = self._file(file_id)
+        f.update({key: value for key, value in body.items() if key in ("name", "trashed")})
+        if media is not None:
+            self._store_media(f, media)
+        self._touch(f)
+        return self._metadata(f)
+
+    def _store_media(self, f, media):
+        content = media.getbytes(0, media.size())
+        f["size"] = str(len(content))
+        if f["mimeType"] == SPREADSHEET_MIME_TYPE and media.mimetype() == "text/csv":
+            # Drive converts the CSV into a single fresh tab
+            rows = list(csv.reader(io.StringIO(content.decode("utf-8"))))
+            f["sheets"] = [{"title": "Sheet1", "sheetId": 0, "rows": rows}]
+        else:
+            f["content"] = content
+
+    # --- Sheets ------------------------------------------------------------
+
+    def _spreadsheet(self, spreadsheet_id):
+        f = self._file(spreadsheet_id)
+        if "sheets" not in f:
+            raise http_error(400, "This operation is not supported for this document")
+        return f
+
+    def _tab(self, f, title=None, sheet_id=None):
+        for tab in f["sheets"]:
+            if tab["title"] == title or tab["sheetId"] == sheet_id:
+                return tab
+        raise http_error(400, f"Unable to parse range: {title or sheet_id}")
+
+    def get_spreadsheet(self, spreadsheet_id):
+        f = self._spreadsheet(spreadsheet_id)
+        result = {"sheets": [{"properties": {"sheetId": tab["sheetId"], "title": tab["title"]}} for tab in f["sheets"]]}
+        if f.get("developerMetadata"):
+            result["developerMetadata"] = [dict(metadata) for metadata in f["developerMetadata"]]
+        return result
+
+    def get_values(self, spreadsheet_id, a1_range):
+        f = self._spreadsheet(spreadsheet_id)
+        first_row, last_row, first_col, last_col = parse_range(a1_range)
+        rows = self._tab(f, range_title(a1_range))["rows"]
+        rows = rows[first_row:None if last_row is None else last_row + 1]
+        values = []
+        for row in rows:
+            row = row[first_col:None if last_col is None else last_col + 1]
+            end = len(row)
+            while end and row[end - 1] in ("", None):
+                end -= 1
+            values.append(list(row[:end]))
+        while values and not values[-1]:
+            values.pop()
+        result = {"range": a1_range, "majorDimension": "ROWS"}
+        if values:
+            result["values"] = values
+        return result
+
+    def clear_values(self, spreadsheet_id, a1_range):
+        f = self._spreadsheet(spreadsheet_id)
+        tab = self._tab(f, range_title(a1_range))
+        start = range_start_row(a1_range)
+        tab["rows"] = tab["rows"][:start]
+        self._touch(f)
+        return {"spreadsheetId": spreadsheet_id, "clearedRange": a1_range}
+
+    def write_values(self, spreadsheet_id, data):
+        f = self._spreadsheet(spreadsheet_id)
+        updated = 0
+        for value_range in data:
+            rows = self._tab(f, range_title(value_range["range"]))["rows"]
+            start = range_start_row(value_range["range"])
+            if len(rows) < start + len(value_range["values"]):
+                rows.extend([] for _ in range(start + len(value_range["values"]) - len(rows)))
+            for i, row in enumerate(value_range["values"]):
+                rows[start + i] = ["" if val is None else str(val) for val in row]
+                updated += len(row)
+        self._touch(f)
+        return {"spreadsheetId": spreadsheet_id, "totalUpdatedCells": updated}
+
+    def apply_requests(self, spreadsheet_id, requests):
+        f = self._spreadsheet(spreadsheet_id)
+        replies = []
+        for request in requests:
+            if "insertDimension" in request:
+                grid = request["insertDimension"]["range"]
+                rows = self._tab(f, sheet_id=grid["sheetId"])["rows"]
+                rows[grid["startIndex"]:grid["startIndex"]] = [[] for _ in range(grid["endIndex"] - grid["startIndex"])]
+            elif "deleteDimension" in request:
+                grid = request["deleteDimension"]["range"]
+                rows = self._tab(f, sheet_id=grid["sheetId"])["rows"]
+                del rows[grid["startIndex"]:grid["endIndex"]]
+            elif "addSheet" in request:
+                title = request["addSheet"].get("properties", {}).get("title")
+                if any(tab["title"] == title for tab in f["sheets"]):
+                    raise http_error(400, f"A sheet with the name \"{title}\" already exists")
+                sheet_id = max(tab["sheetId"] for tab in f["sheets"]) + 1 if f["sheets"] else 0
+                f["sheets"].append({"title": title, "sheetId": sheet_id, "rows": []})
+                replies.append({"addSheet": {"properties": {"sheetId": sheet_id, "title": title}}})
+                continue
+            elif "createDeveloperMetadata" in request:
+                metadata = dict(request["createDeveloperMetadata"]["developerMetadata"])
+                metadata.setdefault("metadataId", len(f.setdefault("developerMetadata", [])) + 1)
+                f["developerMetadata"].append(metadata)
+            elif "deleteDeveloperMetadata" in request:
+                lookup = request["deleteDeveloperMetadata"]["dataFilter"]["developerMetadataLookup"]
+                f["developerMetadata"] = [
+                    metadata
+                    for metadata in f.get("developerMetadata", [])
+                    if any(metadata.get(key) != value for key, value in lookup.items())
+                ]
+            else:
+                raise http_error(400, f"Unsupported request: {next(iter(request))}")
+            replies.append({})
+        self._touch(f)
+        return {"spreadsheetId": spreadsheet_id, "replies": replies}
+
+
+_default_backend = None
+
+
+def default_backend():
+    """Process-wide stand-in configured from the OFFLINE_GOOGLE_* environment variables"""
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = OfflineGoogle()
+    return _default_backend
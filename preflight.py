@@ -0,0 +1,135 @@
+import os
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import config  # Load environment variables
+import get
+import metrics
+from twilio_utils import send_notification_with_fallback
+
+# Checks made before a run starts fetching. Token expiry is read from the JWT locally,
+# so a run with an expired token stops before its first request.
+
+# Warn (and alert once per process) when the PubPlus token expires within this many hours
+TOKEN_WARN_HOURS = float(os.getenv("PREFLIGHT_TOKEN_WARN_HOURS", 48))
+
+# "off" skips the HEAD request to the PubPlus endpoint before each run
+PREFLIGHT_CHECK_ENDPOINT = os.getenv("PREFLIGHT_CHECK_ENDPOINT", "on").lower() != "off"
+
+OK = "ok"
+WARN = "warn"
+FAIL = "fail"
+ICONS = {OK: "✅", WARN: "⚠️", FAIL: "❌"}
+
+_expiry_warned = False
+
+
+def show(status, message):
+    print(f"{ICONS[status]} {message}")
+
+
+def check_token(now=None):
+    """PubPlus token expiry from its exp claim, without calling the API"""
+    now = now or datetime.now(timezone.utc)
+    expires = get.token_expires_at()
+    if expires is None:
+        return WARN, "PubPlus token has no readable expiry"
+    if expires <= now:
+        return FAIL, f"PubPlus token expired on {expires:%Y-%m-%d %H:%M} UTC. Please update the token."
+    if expires - now < timedelta(hours=TOKEN_WARN_HOURS):
+        return WARN, f"PubPlus token expires in {(expires - now).total_seconds() / 3600:.0f} hours"
+    return OK, f"PubPlus token valid until {expires:%Y-%m-%d %H:%M} UTC"
+
+
+def check_google_config():
+    if os.getenv("GOOGLE_BACKEND", "google").lower() == "offline":
+        return OK, "Google: offline backend, no credentials needed"
+    if os.path.exists(config.GOOGLE_TOKEN_PATH):
+        return OK, f"Google token found at {config.GOOGLE_TOKEN_PATH}"
+    if os.path.exists(config.GOOGLE_CREDENTIALS_PATH):
+        return WARN, "No Google token yet, the next run will open a browser to log in"
+    return FAIL, f"No Google credentials: {config.GOOGLE_CREDENTIALS_PATH} is missing"
+
+
+def check_twilio():
+    twilio_vars = ["TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN", "TWILIO_FROM_NUMBER", "TWILIO_TO_NUMBER"]
+    missing = [name for name in twilio_vars if not os.getenv(name)]
+    if missing:
+        return WARN, f"Twilio alerts disabled, missing {', '.join(missing)}"
+    return OK, "Twilio settings present"
+
+
+def check_data_dir():
+    try:
+        os.makedirs(config.DATA_DIR, exist_ok=True)
+        writable = os.access(config.DATA_DIR, os.W_OK)
+    except OSError:
+        writable = False
+    if writable:
+        return OK, f"Data directory writable: {config.DATA_DIR}"
+    return FAIL, f"Cannot write to {config.DATA_DIR}"
+
+
+def check_endpoint():
+    """One HEAD request: is PubPlus reachable, and does it still accept our token?"""
+    try:
+        status_code = get.check_endpoint()
+    except Exception as e:
+        return WARN, f"PubPlus endpoint unreachable: {e}"
+    if status_code in (401, 403):
+        return FAIL, f"PubPlus rejected the token (HTTP {status_code}). Please update the token."
+    if status_code >= 400:
+        return WARN, f"PubPlus endpoint answered HTTP {status_code}"
+    return OK, f"PubPlus endpoint reachable (HTTP {status_code})"
+
+
+LOCAL_CHECKS = [check_token, check_google_config, check_twilio, check_data_dir]
+
+
+def _connect(connect):
+    with metrics.stage("connect"):
+        return connect()
+
+
+def run(connect=None):
+    """
+    Preflight of a pipeline run. The token expiry is checked first, locally; then the
+    PubPlus endpoint check and connect() (Google credentials and Drive folder lookup) run
+    side by side. Returns (ok, services), services being connect()'s result or None.
+    Stops at the first fatal result without waiting for the other check.
+    """
+    global _expiry_warned
+    get.token_rejected = False
+
+    status, message = check_token()
+    show(status, message)
+    if status == FAIL:
+        send_notification_with_fallback(f"ALERT: ❌ {message}")
+        return False, None
+    if status == WARN and not _expiry_warned and get.token_expires_at() is not None:
+        send_notification_with_fallback(f"WARNING: {message}")
+        _expiry_warned = True
+
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="preflight")
+    tasks = {}
+    if PREFLIGHT_CHECK_ENDPOINT:
+        tasks[pool.submit(check_endpoint)] = "pubplus"
+    if connect is not None:
+        tasks[pool.submit(_connect, connect)] = "google"
+
+    services = None
+    try:
+        for future in as_completed(tasks):
+            if tasks[future] == "pubplus":
+                status, message = future.result()
+                show(status, message)
+                if status == FAIL:
+                    send_notification_with_fallback(f"ALERT: ❌ {message}")
+                    return False, None
+            else:
+                # connect_google reports its own failures
+                services = future.result()
+                if services is None:
+                    return False, None
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return True, services
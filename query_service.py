@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+import io
+import os
+import sys
+import csv
+import json
+import bisect
+import hashlib
+import argparse
+import threading
+from urllib.parse import parse_qs, urlparse
+import config  # Load environment variables
+
+# Lookups over the retained campaign data in the local CSV, answered from in-memory
+# indexes instead of the shared spreadsheet. Deliberately free of pandas and the Google
+# clients so the CLI answers in milliseconds.
+
+# Port for `serve`; binds to localhost only unless QUERY_HOST says otherwise
+QUERY_HOST = os.getenv("QUERY_HOST", "127.0.0.1")
+QUERY_PORT = int(os.getenv("QUERY_PORT", 8765))
+
+# Same suffix as csv_handler.CSV_MANIFEST_SUFFIX (not imported, it would load pandas)
+CSV_MANIFEST_SUFFIX = ".sha256.json"
+
+INDEXED_COLUMNS = ["campaign_id", "date", "site_name", "status"]
+
+# Parsed as numbers so range filters and group-by sums work on them
+NUMERIC_COLUMNS = {
+    "daily_budget",
+    "revenue",
+    "page_views",
+    "visits",
+    "clicks",
+    "roi",
+    "cost_per_click",
+    "profit",
+    "results",
+    "results_rate",
+    "keyword_impressions",
+    "searches",
+    "visit_roi",
+}
+
+# Summed by group_by unless other metrics are asked for
+DEFAULT_METRICS = ["revenue", "profit", "clicks", "visits"]
+
+
+def _number(value):
+    if value == "":
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    return int(number) if number.is_integer() and "." not in value else number
+
+
+class CampaignIndex:
+    """
+    Rows of the local CSV with hash indexes on campaign_id, site_name and status and a
+    sorted date index. reload() uses the CSV's checksum manifest to re-read only the
+    dates whose bytes changed since the last load.
+    """
+
+    def __init__(self, csv_path=None):
+        self.csv_path = csv_path or config.CSV_PATH
+        self.manifest_path = f"{self.csv_path}{CSV_MANIFEST_SUFFIX}"
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.columns = []
+        self.rows = {}  # row id -> row dict
+        self.indexes = {column: {} for column in INDEXED_COLUMNS}  # column -> value -> row ids
+        self.dates = []  # sorted keys of indexes["date"]
+        self.date_hashes = {}
+        self._next_id = 0
+        self._stamp = None
+
+    def _file_stamp(self):
+        stamps = []
+        for path in (self.csv_path, self.manifest_path):
+            try:
+                stat = os.stat(path)
+                stamps.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def _add(self, row):
+        row_id = self._next_id
+        self._next_id += 1
+        self.rows[row_id] = row
+        for column in INDEXED_COLUMNS:
+            ids = self.indexes[column].setdefault(row.get(column, ""), set())
+            if column == "date" and not ids:
+                bisect.insort(self.dates, row.get("date", ""))
+            ids.add(row_id)
+
+    def _drop_date(self, date):
+        for row_id in self.indexes["date"].pop(date, set()):
+            row = self.rows.pop(row_id)
+            for column in INDEXED_COLUMNS:
+                if column == "date":
+                    continue
+                ids = self.indexes[column][row.get(column, "")]
+                ids.discard(row_id)
+                if not ids:
+                    del self.indexes[column][row.get(column, "")]
+        position = bisect.bisect_left(self.dates, date)
+        if position < len(self.dates) and self.dates[position] == date:
+            del self.dates[position]
+        self.date_hashes.pop(date, None)
+
+    def _parse(self, records, columns):
+        for values in records:
+            row = dict(zip(columns, values))
+            for column in NUMERIC_COLUMNS.intersection(row):
+                row[column] = _number(row[column])
+            self._add(row)
+
+    def _load_all(self):
+        self._reset()
+        with open(self.csv_path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            self.columns = next(reader, [])
+            self._parse(reader, self.columns)
+
+    def reload(self):
+        """
+        Bring the indexes up to date with the CSV. Returns the dates that were (re)loaded,
+        or None when nothing changed. Falls back to a full load when there is no usable
+        manifest (missing, older than the CSV or for another size), the columns changed,
+        or a date's bytes do not match their checksum.
+        """
+        with self._lock:
+            stamp = self._file_stamp()
+            if stamp == self._stamp:
+                return None
+            if stamp[0] is None:
+                self._reset()
+                self._stamp = stamp
+                return []
+
+            try:
+                with open(self.manifest_path) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                manifest = None
+
+            # The manifest is replaced after the CSV, so an older one describes a previous file
+            usable = (
+                manifest is not None
+                and stamp[1] is not None
+                and stamp[1][0] >= stamp[0][0]
+                and manifest.get("bytes") == stamp[0][1]
+                and all("spans" in entry for entry in manifest.get("dates", {}).values())
+            )
+            if not usable or manifest.get("columns") != self.columns or not self.rows:
+                self._load_all()
+                if usable:
+                    self.date_hashes = {date: entry["sha256"] for date, entry in manifest["dates"].items()}
+                self._stamp = stamp
+                return list(self.dates)
+
+            changed = [
+                date for date, entry in manifest["dates"].items() if self.date_hashes.get(date) != entry["sha256"]
+            ]
+            for date in set(self.date_hashes) - set(manifest["dates"]):
+                self._drop_date(date)
+            with open(self.csv_path, "rb") as f:
+                for date in changed:
+                    entry = manifest["dates"][date]
+                    digest = hashlib.sha256()
+                    chunks = []
+                    for offset, length in entry["spans"]:
+                        f.seek(offset)
+                        chunks.append(f.read(length))
+                        digest.update(chunks[-1])
+                    if digest.hexdigest() != entry["sha256"]:
+                        # The CSV was replaced after this manifest was read
+                        self._load_all()
+                        self._stamp = None
+                        return list(self.dates)
+                    self._drop_date(date)
+                    text = io.StringIO(b"".join(chunks).decode("utf-8"), newline="")
+                    self._parse(csv.reader(text), self.columns)
+                    self.date_hashes[date] = entry["sha256"]
+            self._stamp = stamp
+            return changed
+
+    def select(self, campaign_id=None, site_name=None, status=None, date=None, start=None, end=None):
+        """Rows matching every given filter; start/end are an inclusive date range"""
+        with self._lock:
+            candidates = []
+            for column, value in (("campaign_id", campaign_id), ("site_name", site_name), ("status", status)):
+                if value is not None:
+                    candidates.append(self.indexes[column].get(value, set()))
+            if date is not None:
+                candidates.append(self.indexes["date"].get(date, set()))
+            if start is not None or end is not None:
+                low = bisect.bisect_left(self.dates, start) if start else 0
+                high = bisect.bisect_right(self.dates, end) if end else len(self.dates)
+                candidates.append(set().union(*(self.indexes["date"][d] for d in self.dates[low:high])))
+
+            if not candidates:
+                ids = self.rows.keys()
+            else:
+                candidates.sort(key=len)
+                ids = candidates[0].intersection(*candidates[1:])
+            rows = [self.rows[row_id] for row_id in ids]
+        rows.sort(key=lambda row: (row.get("date", ""), row.get("campaign_id", "")))
+        return rows
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rows": len(self.rows),
+                "dates": len(self.dates),
+                "first_date": self.dates[0] if self.dates else None,
+                "last_date": self.dates[-1] if self.dates else None,
+                "campaigns": len(self.indexes["campaign_id"]),
+                "sites": len(self.indexes["site_name"]),
+            }
+
+
+def group_by(rows, keys, metrics=None):
+    """Sum metrics over rows grouped by the given columns, largest first metric first"""
+    metrics = metrics or DEFAULT_METRICS
+    groups = {}
+    for row in rows:
+        key = tuple(row.get(column, "") for column in keys)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = dict(zip(keys, key), rows=0, **{metric: 0 for metric in metrics})
+        group["rows"] += 1
+        for metric in metrics:
+            value = row.get(metric)
+            if isinstance(value, (int, float)):
+                group[metric] += value
+    results = list(groups.values())
+    for group in results:
+        for metric in metrics:
+            if isinstance(group[metric], float):
+                group[metric] = round(group[metric], 6)
+    results.sort(key=lambda group: group[metrics[0]], reverse=True)
+    return results
+
+
+def run_query(index, params):
+    """Answer one query given as a dict of filters plus optional group_by, metrics and fields"""
+    rows = index.select(
+        campaign_id=params.get("campaign_id"),
+        site_name=params.get("site_name"),
+        status=params.get("status"),
+        date=params.get("date"),
+        start=params.get("from"),
+        end=params.get("to"),
+    )
+    if params.get("group_by"):
+        return group_by(rows, params["group_by"], params.get("metrics"))
+    if params.get("fields"):
+        rows = [{field: row.get(field) for field in params["fields"]} for row in rows]
+    limit = params.get("limit")
+    return rows[:limit] if limit else rows
+
+
+def _list(value):
+    return [item for part in value for item in part.split(",") if item] if value else None
+
+
+def make_handler(index):
+    """HTTP handler class answering GET /rows?<filters> and GET /stats from index"""
+    from http.server import BaseHTTPRequestHandler
+
+    class QueryHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            # A run may have rewritten the CSV since the last request
+            index.reload()
+            try:
+                if url.path == "/stats":
+                    result = index.stats()
+                elif url.path == "/rows":
+                    params = {key: values[-1] for key, values in query.items()}
+                    for key in ("group_by", "metrics", "fields"):
+                        params[key] = _list(query.get(key))
+                    params["limit"] = int(params["limit"]) if params.get("limit") else None
+                    result = run_query(index, params)
+                else:
+                    self.send_error(404)
+                    return
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+            body = json.dumps(result).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return QueryHandler
+
+
+def serve(index, host=QUERY_HOST, port=QUERY_PORT):
+    """Answer queries over HTTP until interrupted, reloading changed dates before each request"""
+    from http.server import ThreadingHTTPServer
+
+    server = ThreadingHTTPServer((host, port), make_handler(index))
+    print(f"✅ Serving {index.stats()['rows']} rows on http://{host}:{server.server_port}/rows")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def print_rows(rows, output):
+    if output == "json":
+        json.dump(rows, sys.stdout, indent=2)
+        print()
+        return
+    if not rows:
+        print("⚠️ No matching rows")
+        return
+    columns = list(rows[0])
+    writer = csv.DictWriter(sys.stdout, columns, extrasaction="ignore", delimiter="," if output == "csv" else "\t")
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def add_arguments(parser):
+    parser.add_argument("--csv", default=config.CSV_PATH, help="CSV to query (default %(default)s)")
+    parser.add_argument("--campaign-id")
+    parser.add_argument("--site-name")
+    parser.add_argument("--status")
+    parser.add_argument("--date", help="single day YYYY-MM-DD")
+    parser.add_argument("--from", dest="start", help="first day YYYY-MM-DD (inclusive)")
+    parser.add_argument("--to", dest="end", help="last day YYYY-MM-DD (inclusive)")
+    parser.add_argument("--group-by", nargs="+", choices=INDEXED_COLUMNS, help="sum metrics per group")
+    parser.add_argument("--metrics", nargs="+", help=f"columns summed by --group-by (default {' '.join(DEFAULT_METRICS)})")
+    parser.add_argument("--fields", nargs="+", help="columns to print")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--output", choices=["table", "csv", "json"], default="table")
+    parser.add_argument("--serve", action="store_true", help="answer the same queries over HTTP instead")
+    parser.add_argument("--port", type=int, default=QUERY_PORT)
+
+
+def main(args):
+    if not os.path.exists(args.csv):
+        print(f"❌ No local data at {args.csv}, run a fetch first")
+        return 2
+    index = CampaignIndex(args.csv)
+    index.reload()
+    if args.serve:
+        return serve(index, port=args.port)
+
+    params = {
+        "campaign_id": args.campaign_id,
+        "site_name": args.site_name,
+        "status": args.status,
+        "date": args.date,
+        "from": args.start,
+        "to": args.end,
+        "group_by": args.group_by,
+        "metrics": args.metrics,
+        "fields": args.fields,
+        "limit": args.limit,
+    }
+    print_rows(run_query(index, params), args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the retained campaign data")
+    add_arguments(parser)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,227 @@
+import os
+import json
+from datetime import datetime, timedelta
+import config  # Load environment variables
+
+# Per-campaign 7 and 30 day totals, kept up to date from each run's per-day rows instead
+# of sheet formulas over the whole raw tab
+ROLLUPS_ENABLED = os.getenv("ROLLUPS", "on").lower() != "off"
+ROLLUP_STORE_PATH = os.getenv("ROLLUP_STORE_PATH", os.path.join(config.DATA_DIR, "rollups.json"))
+
+# Tab the summary is written to, in ROLLUP_SPREADSHEET_ID (default PUBPLUS_SPREADSHEET_ID;
+# with SHEETS_SHARD_BY set the tab is only written when ROLLUP_SPREADSHEET_ID is given)
+ROLLUP_SHEET_TITLE = os.getenv("ROLLUP_SHEET_TITLE", "Rollups")
+ROLLUP_SPREADSHEET_ID = os.getenv("ROLLUP_SPREADSHEET_ID", "")
+
+# Window name -> days, counted back from the newest date seen (inclusive)
+WINDOWS = {"7d": 7, "30d": 30}
+RETAIN_DAYS = max(WINDOWS.values())
+
+# Summed per campaign and day. Money is kept in integer micros so adding and later
+# subtracting a day gives back exactly the same totals.
+METRICS = ["revenue", "profit", "clicks", "visits"]
+MONEY_METRICS = {"revenue", "profit"}
+MICROS = 1000000
+
+
+def _number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if number != number else number  # NaN from empty CSV cells
+
+
+def _text(value):
+    return "" if value is None or value != value else str(value)
+
+
+def day_vector(row):
+    """A row's metrics as [revenue, profit, clicks, visits], money in micros"""
+    return [
+        round(_number(row.get(name)) * MICROS) if name in MONEY_METRICS else round(_number(row.get(name)))
+        for name in METRICS
+    ]
+
+
+def aggregate_days(rows):
+    """Rows with a date and campaign_id -> {date: {campaign_id: metrics}}"""
+    days = {}
+    for row in rows:
+        date, campaign_id = row.get("date"), row.get("campaign_id")
+        if not date or campaign_id is None:
+            continue
+        campaigns = days.setdefault(str(date)[:10], {})
+        vector = day_vector(row)
+        current = campaigns.get(str(campaign_id))
+        campaigns[str(campaign_id)] = vector if current is None else [a + b for a, b in zip(current, vector)]
+    return days
+
+
+def empty_store():
+    return {"as_of": None, "days": {}, "totals": {name: {} for name in WINDOWS}, "info": {}}
+
+
+def load_store(path=None):
+    """The saved rollups, or None when there are none yet (or they are unreadable)"""
+    path = path or ROLLUP_STORE_PATH
+    try:
+        with open(path) as f:
+            store = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring unreadable rollup store {path}: {e}")
+        return None
+    if set(store.get("totals", {})) != set(WINDOWS):
+        print("ℹ️ Rollup windows changed, rebuilding from the retained days")
+        store["totals"] = rebuild_totals(store)
+    return store
+
+
+def save_store(store, path=None):
+    path = path or ROLLUP_STORE_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Write to a temporary file first so a crash never leaves half-written rollups
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(store, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def _age(date, as_of):
+    return (datetime.strptime(as_of, "%Y-%m-%d") - datetime.strptime(date, "%Y-%m-%d")).days
+
+
+def in_window(date, as_of, days):
+    return as_of is not None and 0 <= _age(date, as_of) < days
+
+
+def _add(totals, campaigns, sign):
+    """Add (sign=1) or subtract (sign=-1) one day's campaigns; the last slot counts days"""
+    for campaign_id, vector in campaigns.items():
+        total = totals.setdefault(campaign_id, [0] * (len(METRICS) + 1))
+        for i, value in enumerate(vector):
+            total[i] += sign * value
+        total[-1] += sign
+        if total[-1] == 0:
+            del totals[campaign_id]
+
+
+def update(store, rows):
+    """
+    Fold one run's per-day rows into the rollups. Days that left a window are subtracted,
+    refreshed days replace what was stored for them; untouched days are never re-read.
+    Returns the number of days added or replaced.
+    """
+    refreshed = aggregate_days(rows)
+    if not refreshed:
+        return 0
+
+    old_as_of = store["as_of"]
+    new_as_of = max(filter(None, [old_as_of, max(refreshed)]))
+
+    # Moving the window forward drops the oldest days from each total
+    if new_as_of != old_as_of:
+        for name, days in WINDOWS.items():
+            for date, campaigns in store["days"].items():
+                if in_window(date, old_as_of, days) and not in_window(date, new_as_of, days):
+                    _add(store["totals"][name], campaigns, -1)
+    store["as_of"] = new_as_of
+
+    changed = 0
+    for date in sorted(refreshed):
+        if not in_window(date, new_as_of, RETAIN_DAYS):
+            continue
+        previous = store["days"].get(date, {})
+        for name, days in WINDOWS.items():
+            if in_window(date, new_as_of, days):
+                _add(store["totals"][name], previous, -1)
+                _add(store["totals"][name], refreshed[date], 1)
+        store["days"][date] = refreshed[date]
+        changed += 1
+
+    store["days"] = {date: c for date, c in store["days"].items() if in_window(date, new_as_of, RETAIN_DAYS)}
+
+    # Name and status as of each campaign's newest row
+    for row in rows:
+        campaign_id, date = str(row.get("campaign_id")), str(row.get("date"))[:10]
+        if campaign_id in store["info"] and store["info"][campaign_id][2] > date:
+            continue
+        store["info"][campaign_id] = [_text(row.get("site_name")), _text(row.get("status")), date]
+    active = {campaign_id for totals in store["totals"].values() for campaign_id in totals}
+    store["info"] = {campaign_id: info for campaign_id, info in store["info"].items() if campaign_id in active}
+    return changed
+
+
+def rebuild_totals(store):
+    """Totals recomputed from every retained day, to check the incremental ones against"""
+    totals = {name: {} for name in WINDOWS}
+    for date, campaigns in store["days"].items():
+        for name, days in WINDOWS.items():
+            if in_window(date, store["as_of"], days):
+                _add(totals[name], campaigns, 1)
+    return totals
+
+
+def roi(revenue, profit):
+    """Profit as a percentage of cost (revenue - profit), blank without cost"""
+    cost = revenue - profit
+    return round(profit / cost * 100, 2) if cost else ""
+
+
+def summary_values(store):
+    """Header plus one row per campaign, highest 7 day revenue first, as the string cells the sheet gets"""
+    header = ["campaign_id", "site_name", "status"]
+    for name in WINDOWS:
+        header += [f"{metric}_{name}" for metric in METRICS] + [f"roi_{name}"]
+
+    rows = []
+    for campaign_id, (site_name, status, _) in store["info"].items():
+        row = [campaign_id, site_name, status]
+        for name in WINDOWS:
+            revenue, profit, clicks, visits, _ = store["totals"][name].get(campaign_id, [0] * (len(METRICS) + 1))
+            row += [round(revenue / MICROS, 2), round(profit / MICROS, 2), clicks, visits, roi(revenue, profit)]
+        rows.append(row)
+    rows.sort(key=lambda row: (-row[3], row[0]))
+    return [header] + [[str(val) for val in row] for row in rows]
+
+
+def rows_from_csv(csv_path, as_of):
+    """Retained days from the local CSV, used to seed a new store with full windows"""
+    import pandas as pd
+
+    columns = ["date", "campaign_id", "site_name", "status"] + METRICS
+    try:
+        df = pd.read_csv(csv_path, dtype={"date": str, "campaign_id": str}, usecols=lambda c: c in columns)
+    except FileNotFoundError:
+        return []
+    first = (datetime.strptime(as_of, "%Y-%m-%d") - timedelta(days=RETAIN_DAYS - 1)).strftime("%Y-%m-%d")
+    return df[df["date"].str[:10] >= first].to_dict("records")
+
+
+def refresh(campaigns, csv_path=None):
+    """Update the local rollups with this run's rows; returns the store, or None when off"""
+    if not ROLLUPS_ENABLED:
+        return None
+    store = load_store()
+    if store is None:
+        store = empty_store()
+        # The CSV already holds this run's rows; only the other retained days come from it
+        run_dates = {str(c.get("date"))[:10] for c in campaigns}
+        seed = [
+            row
+            for row in rows_from_csv(csv_path or config.CSV_PATH, max(run_dates))
+            if str(row["date"])[:10] not in run_dates
+        ]
+        if seed:
+            print(f"ℹ️ Seeding rollups from {len(seed)} rows of the local CSV")
+            campaigns = seed + list(campaigns)
+
+    changed = update(store, campaigns)
+    save_store(store)
+    print(
+        f"✅ Rollups updated as of {store['as_of']}: {changed} day(s) refreshed, "
+        f"{len(store['info'])} campaigns in the last {RETAIN_DAYS} days"
+    )
+    return store
@@ -1,16 +1,11 @@
 #!/usr/bin/env python3
 import os
-import subprocess
 import sys
 import platform
 import io
 
 def main():
     try:
-        # Get the directory of the script file we want to run
-        dir_path = os.path.dirname(os.path.realpath(__file__))
-        main_script = os.path.join(dir_path, "main.py")
-        
         print("Starting script with error handling wrapper...")
           # Set environment variable to help with encoding issues
         os.environ["PYTHONIOENCODING"] = "utf-8"
@@ -25,40 +20,11 @@ def main():
         os.environ["PUBPLUS_USER_AGENT"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36"
         os.environ["PUBPLUS_NETWORK_CODE"] = "PRR"
         
-        # Determine python command based on OS
-        python_cmd = "python" if platform.system() == "Windows" else "python3"
-        
-        # Set up process with proper encoding for Windows
-        if platform.system() == "Windows":
-            # For Windows, use shell=True to handle encoding properly
-            process = subprocess.run(
-                f'"{python_cmd}" "{main_script}"',
-                shell=True,
-                capture_output=True,
-                encoding='utf-8',
-                errors='replace',
-                check=True
-            )
-        else:
-            # For Unix-like systems
-            process = subprocess.run(
-                [python_cmd, main_script],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-        
-        # Print stdout
-        if process.stdout:
-            print(process.stdout)
-            
-        return 0
-            
-    except subprocess.CalledProcessError as e:
-        print(f"Error running main.py: {e}")
-        if e.stderr:
-            print(f"Error output: {e.stderr}")
-        return 1
+        # Run the pipeline in this process; output streams as it happens and is
+        # also logged as JSON records by the runner
+        from runner import run
+        return run()
+
     except Exception as e:
         print(f"Error in wrapper script: {str(e)}")
         return 1
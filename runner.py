@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import threading
+import traceback
+import faulthandler
+from datetime import datetime, timezone
+import config  # Load environment variables
+
+# Every output line of a run is also appended here as one JSON record
+RUN_LOG_PATH = os.getenv(
+    "RUN_LOG_PATH",
+    os.path.join(config.DATA_DIR, "run_log.jsonl"),
+)
+
+# Dump every thread's stack and exit when a run takes longer than this (0 = no limit)
+RUN_TIMEOUT_SECONDS = float(os.getenv("RUN_TIMEOUT_SECONDS", 0))
+
+EXIT_CRASHED = 1
+EXIT_INTERRUPTED = 130
+
+
+def line_level(line, default="info"):
+    """Log level of an output line, from the emoji/prefix conventions used across the scripts"""
+    stripped = line.lstrip()
+    if stripped.startswith(("❌", "CRITICAL", "Error", "ERROR", "Traceback")):
+        return "error"
+    if stripped.startswith(("⚠️", "WARNING", "Warning")):
+        return "warning"
+    if stripped.startswith("🔍"):
+        return "debug"
+    return default
+
+
+class LogStream(io.TextIOBase):
+    """
+    stdout/stderr replacement that passes each line straight to the console and appends
+    it to the run log as a JSON record. Only the current partial line is held in memory.
+    """
+
+    def __init__(self, console, log_file, run_id, stream, lock, default_level="info"):
+        self.console = console
+        self.log_file = log_file
+        self.run_id = run_id
+        self.stream = stream
+        self.lock = lock
+        self.default_level = default_level
+        self._partial = ""
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        with self.lock:
+            self.console.write(text)
+            self.console.flush()
+            lines = (self._partial + text).split("\n")
+            self._partial = lines.pop()
+            for line in lines:
+                self._record(line)
+        return len(text)
+
+    def flush(self):
+        with self.lock:
+            self.console.flush()
+            self.log_file.flush()
+
+    def close_line(self):
+        with self.lock:
+            if self._partial:
+                self._record(self._partial)
+                self._partial = ""
+
+    def _record(self, line):
+        if not line.strip():
+            return
+        record = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "run_id": self.run_id,
+            "stream": self.stream,
+            "level": line_level(line, self.default_level),
+            "msg": line,
+        }
+        self.log_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.log_file.flush()
+
+
+def write_event(log_file, run_id, event, **fields):
+    record = {"ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"), "run_id": run_id, "event": event}
+    record.update(fields)
+    log_file.write(json.dumps(record) + "\n")
+    log_file.flush()
+
+
+def run_pipeline():
+    """Default pipeline: main.main, imported only when a run starts"""
+    import main
+    return main.main()
+
+
+def run(pipeline=run_pipeline, log_path=RUN_LOG_PATH, timeout=RUN_TIMEOUT_SECONDS):
+    """
+    Run the pipeline in this process with output streamed line by line and logged as
+    JSON records. Returns the process exit code.
+    """
+    import metrics
+
+    run_id = uuid.uuid4().hex[:12]
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    started = time.monotonic()
+    exit_code = EXIT_CRASHED
+
+    with open(log_path, "a", encoding="utf-8") as log_file:
+        lock = threading.RLock()
+        console_out, console_err = sys.stdout, sys.stderr
+        out = LogStream(console_out, log_file, run_id, "stdout", lock)
+        err = LogStream(console_err, log_file, run_id, "stderr", lock, default_level="error")
+        write_event(log_file, run_id, "run_start", pid=os.getpid())
+
+        if timeout:
+            # Written straight to the console's file descriptor, so it works even when Python is stuck
+            faulthandler.dump_traceback_later(timeout, exit=True, file=console_err)
+
+        sys.stdout, sys.stderr = out, err
+        metrics.start_run(run_id)
+        try:
+            result = pipeline()
+            exit_code = result if isinstance(result, int) else 0
+        except KeyboardInterrupt:
+            print("⚠️ Run interrupted")
+            exit_code = EXIT_INTERRUPTED
+        except Exception as e:
+            traceback.print_exc()
+            error_message = f"❌ CRITICAL ERROR: {e}"
+            print(error_message)
+            from twilio_utils import send_notification_with_fallback
+            send_notification_with_fallback(f"CRITICAL ERROR: {error_message}")
+            exit_code = EXIT_CRASHED
+        finally:
+            if timeout:
+                faulthandler.cancel_dump_traceback_later()
+            # Send queued alerts while their output still reaches the run log
+            if "twilio_utils" in sys.modules:
+                sys.modules["twilio_utils"].flush_notifications()
+            metrics.finish_run(exit_code)
+            out.close_line()
+            err.close_line()
+            sys.stdout, sys.stderr = console_out, console_err
+            write_event(
+                log_file,
+                run_id,
+                "run_end",
+                exit_code=exit_code,
+                duration_seconds=round(time.monotonic() - started, 3),
+            )
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the PubPlus pipeline in-process")
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=os.path.join(config.DATA_DIR, "profiles"),
+        help="Write cProfile and tracemalloc dumps per stage to this directory",
+    )
+    args = parser.parse_args()
+    if args.profile:
+        import metrics
+        metrics.PROFILE_DIR = args.profile
+    sys.exit(run())
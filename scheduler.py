@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+import config  # Load environment variables
+
+# Refresh cadences in minutes: today's numbers move all day, yesterday's settle over
+# the next hours, older days only change on late corrections
+SCHEDULE_TODAY_MINUTES = float(os.getenv("SCHEDULE_TODAY_MINUTES", 15))
+SCHEDULE_YESTERDAY_MINUTES = float(os.getenv("SCHEDULE_YESTERDAY_MINUTES", 60))
+SCHEDULE_HISTORY_MINUTES = float(os.getenv("SCHEDULE_HISTORY_MINUTES", 24 * 60))
+
+# How far back the daily history refresh reaches
+SCHEDULE_HISTORY_DAYS = int(os.getenv("SCHEDULE_HISTORY_DAYS", 7))
+
+
+class Tier:
+    """One refresh cadence covering days_back days before today"""
+
+    def __init__(self, name, interval_minutes, days_back):
+        self.name = name
+        self.interval = interval_minutes * 60
+        self.days_back = days_back
+        self.next_due = 0.0  # due on startup
+
+    def due(self, now):
+        return now >= self.next_due
+
+
+class Scheduler:
+    """
+    Runs main.main in-process on tiered cadences, one run at a time.
+
+    When several tiers are due together they are merged into one run over the widest
+    window. Windows always end today and are contiguous, so the sheet sync never drops
+    days that sit between two refreshed ones.
+    """
+
+    def __init__(self, tiers=None, clock=time.monotonic, sleep=time.sleep, today=datetime.now):
+        self.tiers = tiers or [
+            Tier("today", SCHEDULE_TODAY_MINUTES, 0),
+            Tier("yesterday", SCHEDULE_YESTERDAY_MINUTES, 1),
+            Tier("history", SCHEDULE_HISTORY_MINUTES, SCHEDULE_HISTORY_DAYS),
+        ]
+        self.clock = clock
+        self.sleep = sleep
+        self.today = today
+        self.services = None
+        self._day = None
+
+    def due_tiers(self, now):
+        # Right after midnight yesterday's final numbers are worth a refresh straight away
+        day = self.today().date()
+        if self._day is not None and day != self._day:
+            for tier in self.tiers:
+                if tier.days_back >= 1:
+                    tier.next_due = min(tier.next_due, now)
+        self._day = day
+        return [tier for tier in self.tiers if tier.due(now)]
+
+    def run_once(self, tiers):
+        """One pipeline run covering every due tier; returns its exit code"""
+        import main
+        from runner import run
+
+        days_back = max(tier.days_back for tier in tiers)
+        today = self.today()
+        dates = [today - timedelta(days=n) for n in range(days_back, -1, -1)]
+        names = ", ".join(tier.name for tier in tiers)
+        print(f"\n⏰ Scheduled refresh ({names}): {len(dates)} day(s)")
+
+        def _pipeline():
+            # Keep authenticated clients and the resolved folder for the life of the daemon
+            if self.services is None:
+                self.services = main.connect_google()
+                if self.services is None:
+                    return main.EXIT_FAILED
+            # Success SMS only for the daily history run, not every few minutes
+            return main.main(dates, self.services, notify_success=days_back >= SCHEDULE_HISTORY_DAYS)
+
+        return run(_pipeline)
+
+    def loop(self, max_runs=None):
+        runs = 0
+        while max_runs is None or runs < max_runs:
+            now = self.clock()
+            tiers = self.due_tiers(now)
+            if not tiers:
+                wait = min(tier.next_due for tier in self.tiers) - now
+                self.sleep(max(wait, 1))
+                continue
+
+            started = self.clock()
+            exit_code = self.run_once(tiers)
+            runs += 1
+
+            # Every tier inside the refreshed window counts as refreshed
+            days_back = max(tier.days_back for tier in tiers)
+            for tier in self.tiers:
+                if tier.days_back <= days_back:
+                    tier.next_due = started + tier.interval
+            print(f"⏰ Refresh finished with exit code {exit_code} in {self.clock() - started:.0f}s")
+
+
+def main():
+    print("🔄 Starting PubPlus refresh daemon")
+    print(
+        f"ℹ️ Cadences: today every {SCHEDULE_TODAY_MINUTES:g} min, yesterday every "
+        f"{SCHEDULE_YESTERDAY_MINUTES:g} min, last {SCHEDULE_HISTORY_DAYS} days every "
+        f"{SCHEDULE_HISTORY_MINUTES:g} min"
+    )
+    try:
+        Scheduler().loop()
+    except KeyboardInterrupt:
+        print("\n👋 Refresh daemon stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import os
+import json
+import config  # Load environment variables
+from drive_cache import get_cached, set_cached, index_key
+
+# Date -> row range index stored as spreadsheet developer metadata, so a sync can find
+# the rows of the refreshed dates without downloading the whole sheet
+DATE_INDEX_ENABLED = os.getenv("SHEET_DATE_INDEX", "on").lower() != "off"
+DATE_INDEX_KEY = "pubplus_date_index"
+
+# Developer metadata values are limited in size; a daily index stays far below this
+MAX_INDEX_CHARS = 30000
+
+
+def build_date_index(dates, header):
+    """
+    Compact index of the sheet's data rows: the header, plus each run of equal dates
+    in sheet order as [date, row count]. Row positions follow from the running totals.
+    """
+    blocks = []
+    for date in dates:
+        if blocks and blocks[-1][0] == date:
+            blocks[-1][1] += 1
+        else:
+            blocks.append([date, 1])
+    return {"header": list(header), "rows": sum(count for _, count in blocks), "blocks": blocks}
+
+
+def splice_index(index, plan, new_dates):
+    """Index after a plan's block of rows was replaced by rows with new_dates"""
+    start, stop = plan["start"], plan["start"] + plan["removed"]
+    before, after = [], []
+    row = 0
+    for date, count in index["blocks"]:
+        if row + count <= start:
+            before.append([date, count])
+        elif row >= stop:
+            after.append([date, count])
+        row += count
+    return build_date_index(index_dates(before) + list(new_dates) + index_dates(after), index["header"])
+
+
+def index_dates(blocks, start=0, stop=None):
+    """Dates of data rows start..stop (0-based, stop exclusive) expanded from index blocks"""
+    dates = []
+    row = 0
+    for date, count in blocks:
+        first, last = max(row, start), row + count if stop is None else min(row + count, stop)
+        dates.extend([date] * max(last - first, 0))
+        row += count
+    return dates
+
+
+def expected_column(index, first_row, last_row):
+    """Date column cells the sheet should hold for sheet rows first_row..last_row (1-based, inclusive)"""
+    cells = ["date"] if first_row == 1 else []
+    return cells + index_dates(index["blocks"], max(first_row - 2, 0), last_row - 1)
+
+
+def plan_from_index(index, new_row_count, min_new_date, max_new_date):
+    """
+    Same plan as plan_incremental_edits, worked out from the index blocks instead of the
+    downloaded date column. Dates are 'YYYY-MM-DD' strings.
+    """
+    blocks = index["blocks"]
+    dates = [date for date, _ in blocks]
+    # The index only describes a sheet we can splice when it is strictly newest first
+    if any(a <= b for a, b in zip(dates, dates[1:])):
+        return None
+
+    start = 0
+    removed = 0
+    for date, count in blocks:
+        if date > max_new_date:
+            start += count
+        elif date >= min_new_date:
+            removed += count
+    return {"start": start, "removed": removed, "inserted": new_row_count}
+
+
+def fetch_date_index(sheets_service, spreadsheet_id):
+    """Read the index from the spreadsheet's developer metadata, or None"""
+    response = sheets_service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id,
+        fields="developerMetadata(metadataKey,metadataValue)",
+    ).execute()
+    for metadata in response.get("developerMetadata", []):
+        if metadata.get("metadataKey") == DATE_INDEX_KEY:
+            try:
+                return json.loads(metadata["metadataValue"])
+            except (KeyError, ValueError) as e:
+                print(f"⚠️ Ignoring unreadable date index: {e}")
+    return None
+
+
+def index_requests(spreadsheet_id, index, force=False):
+    """
+    spreadsheets.batchUpdate requests that replace the stored index, or [] when the
+    index matches the one we last wrote (unless force is set).
+    """
+    if not DATE_INDEX_ENABLED or index is None:
+        return []
+    value = json.dumps(index, separators=(",", ":"))
+    if len(value) > MAX_INDEX_CHARS:
+        print(f"⚠️ Date index is {len(value)} characters, too large to store in the sheet")
+        return []
+    if not force and get_cached(index_key(spreadsheet_id)) == value:
+        return []
+    return [
+        {"deleteDeveloperMetadata": {"dataFilter": {"developerMetadataLookup": {"metadataKey": DATE_INDEX_KEY}}}},
+        {
+            "createDeveloperMetadata": {
+                "developerMetadata": {
+                    "metadataKey": DATE_INDEX_KEY,
+                    "metadataValue": value,
+                    "location": {"spreadsheet": True},
+                    "visibility": "DOCUMENT",
+                }
+            }
+        },
+    ]
+
+
+def remember_index(spreadsheet_id, index):
+    """Note the index now stored in the sheet so unchanged indexes are not rewritten"""
+    if DATE_INDEX_ENABLED and index is not None:
+        set_cached(index_key(spreadsheet_id), json.dumps(index, separators=(",", ":")))
+
+
+def remembered_header(spreadsheet_id):
+    """Sheet header as of our last write, from the locally cached index, or None"""
+    value = get_cached(index_key(spreadsheet_id))
+    try:
+        return json.loads(value)["header"] if value else None
+    except (KeyError, TypeError, ValueError):
+        return None
@@ -0,0 +1,95 @@
+import os
+import json
+import pandas as pd
+import config  # Load environment variables
+
+# How uploads are split across spreadsheets:
+#   "none"    - everything goes into the single configured spreadsheet
+#   "month"   - one spreadsheet per calendar month (YYYY-MM)
+#   "network" - one spreadsheet per value of SHEETS_SHARD_NETWORK_COLUMN
+# Each shard is its own spreadsheet so it also gets its own cell limit and Drive version.
+SHEETS_SHARD_BY = os.getenv("SHEETS_SHARD_BY", "none").lower()
+SHEETS_SHARD_NETWORK_COLUMN = os.getenv("SHEETS_SHARD_NETWORK_COLUMN", "network")
+SHARD_NAME_PREFIX = os.getenv("SHEETS_SHARD_NAME_PREFIX", "pubplus_campaign_data")
+
+MANIFEST_PATH = os.getenv(
+    "SHEETS_SHARD_MANIFEST",
+    os.path.join(config.DATA_DIR, "sheet_manifest.json"),
+)
+
+SPREADSHEET_MIME_TYPE = "application/vnd.google-apps.spreadsheet"
+
+
+def shard_keys(df, shard_by):
+    """Shard key of every row in the DataFrame"""
+    if shard_by == "month":
+        return pd.to_datetime(df["date"]).dt.strftime("%Y-%m")
+    if shard_by == "network":
+        if SHEETS_SHARD_NETWORK_COLUMN not in df.columns:
+            return pd.Series("unknown", index=df.index)
+        return df[SHEETS_SHARD_NETWORK_COLUMN].replace("", "unknown").fillna("unknown").astype(str)
+    raise ValueError(f"Unknown shard mode: {shard_by}")
+
+
+def load_manifest(shard_by):
+    """Load the manifest of shards and the dates each one holds"""
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH) as f:
+            manifest = json.load(f)
+        if manifest.get("shard_by") == shard_by:
+            return manifest
+        print(f"⚠️ Shard manifest was built for '{manifest.get('shard_by')}', starting a new one for '{shard_by}'")
+    return {"shard_by": shard_by, "shards": {}}
+
+
+def save_manifest(manifest):
+    """Write the manifest atomically"""
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    tmp_path = f"{MANIFEST_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def record_shard_dates(manifest, key, dates):
+    """Remember which dates now live in a shard"""
+    shard = manifest["shards"][key]
+    known = set(shard.get("dates", []))
+    known.update(pd.to_datetime(dates).dt.strftime("%Y-%m-%d"))
+    shard["dates"] = sorted(known)
+
+
+def resolve_shard(drive_service, manifest, folder_id, key):
+    """Return the manifest entry for a shard, finding or creating its spreadsheet on demand"""
+    if key in manifest["shards"]:
+        return manifest["shards"][key]
+
+    name = f"{SHARD_NAME_PREFIX}_{key}"
+    query = (
+        f"name='{name}' and mimeType='{SPREADSHEET_MIME_TYPE}' "
+        f"and '{folder_id}' in parents and trashed=false"
+    )
+    results = (
+        drive_service.files()
+        .list(q=query, spaces="drive", fields="files(id, name)", pageSize=1)
+        .execute(num_retries=5)
+    )
+    items = results.get("files", [])
+
+    if items:
+        spreadsheet_id = items[0]["id"]
+        print(f"ℹ️ Found existing shard spreadsheet: {name} (ID: {spreadsheet_id})")
+    else:
+        created = (
+            drive_service.files()
+            .create(
+                body={"name": name, "mimeType": SPREADSHEET_MIME_TYPE, "parents": [folder_id]},
+                fields="id, name",
+            )
+            .execute(num_retries=5)
+        )
+        spreadsheet_id = created["id"]
+        print(f"✅ Created shard spreadsheet: {name} (ID: {spreadsheet_id})")
+
+    manifest["shards"][key] = {"spreadsheet_id": spreadsheet_id, "name": name, "dates": []}
+    return manifest["shards"][key]
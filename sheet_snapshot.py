@@ -0,0 +1,127 @@
+import os
+import pickle
+import hashlib
+import config  # Load environment variables
+
+# Local copy of what we last uploaded, kept next to the CSV output
+SNAPSHOT_DIR = os.getenv(
+    "SHEET_SNAPSHOT_DIR",
+    config.DATA_DIR,
+)
+SNAPSHOT_ENABLED = os.getenv("SHEET_SNAPSHOT", "on").lower() != "off"
+
+
+def snapshot_path(spreadsheet_id, sheet_title):
+    """Path of the snapshot file for one tab of a spreadsheet"""
+    safe_title = "".join(c if c.isalnum() else "_" for c in sheet_title)
+    return os.path.join(SNAPSHOT_DIR, f".sheet_snapshot_{spreadsheet_id}_{safe_title}.pickle")
+
+
+def content_hash(values):
+    """SHA-256 of the sheet values, used to detect a corrupted or partial snapshot"""
+    digest = hashlib.sha256()
+    for row in values:
+        # Unit/record separators do not occur in our cell text, so rows hash unambiguously
+        digest.update("\x1f".join(str(val) for val in row).encode("utf-8"))
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+def get_file_version(drive_service, spreadsheet_id):
+    """Fetch the Drive modifiedTime/version stamp of the spreadsheet (one small request)"""
+    return (
+        drive_service.files()
+        .get(fileId=spreadsheet_id, fields="modifiedTime, version")
+        .execute(num_retries=3)
+    )
+
+
+def load_snapshot(spreadsheet_id, sheet_title, file_info):
+    """
+    Return the sheet values from the local snapshot, or None when it cannot be trusted:
+    missing, written for another Drive version (someone else edited the sheet) or
+    failing its content hash.
+    """
+    if not SNAPSHOT_ENABLED or not file_info:
+        return None
+
+    path = snapshot_path(spreadsheet_id, sheet_title)
+    if not os.path.exists(path):
+        print("ℹ️ No local sheet snapshot yet")
+        return None
+
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except Exception as e:
+        print(f"⚠️ Could not read local sheet snapshot: {e}")
+        return None
+
+    if snapshot.get("version") != file_info.get("version"):
+        print(
+            f"ℹ️ Sheet changed since our last upload "
+            f"(snapshot version {snapshot.get('version')}, Drive version {file_info.get('version')}, "
+            f"modified {file_info.get('modifiedTime')})"
+        )
+        return None
+
+    if content_hash(snapshot["values"]) != snapshot.get("content_hash"):
+        print("⚠️ Local sheet snapshot failed its content hash check")
+        return None
+
+    return snapshot["values"]
+
+
+def save_snapshot(spreadsheet_id, sheet_title, file_info, values):
+    """Store the values we just uploaded, stamped with the Drive version they produced"""
+    if not SNAPSHOT_ENABLED or not file_info:
+        return
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = snapshot_path(spreadsheet_id, sheet_title)
+    snapshot = {
+        "spreadsheet_id": spreadsheet_id,
+        "sheet_title": sheet_title,
+        "modified_time": file_info.get("modifiedTime"),
+        "version": file_info.get("version"),
+        "content_hash": content_hash(values),
+        "values": values,
+    }
+
+    # Write to a temporary file first so a crash never leaves a half-written snapshot
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    print(f"ℹ️ Saved local sheet snapshot (version {snapshot['version']}, {len(values)} rows)")
+
+
+def restamp_snapshot(spreadsheet_id, sheet_title, old_version, file_info):
+    """
+    Move the snapshot to the Drive version produced by our own write to another tab, so the
+    data tab's snapshot stays usable. Only a snapshot still at old_version is restamped.
+    """
+    if not SNAPSHOT_ENABLED or not file_info:
+        return
+    path = snapshot_path(spreadsheet_id, sheet_title)
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except Exception:
+        return
+    if snapshot.get("version") != old_version:
+        return
+
+    snapshot["version"] = file_info.get("version")
+    snapshot["modified_time"] = file_info.get("modifiedTime")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def discard_snapshot(spreadsheet_id, sheet_title):
+    """Remove the snapshot after a failed or partial write"""
+    path = snapshot_path(spreadsheet_id, sheet_title)
+    if os.path.exists(path):
+        os.remove(path)
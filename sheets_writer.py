@@ -0,0 +1,271 @@
+import os
+import time
+import pickle
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+from google.auth.transport.requests import Request
+from googleapiclient.errors import HttpError
+import config  # Load environment variables
+import metrics
+
+# Google rejects request bodies above ~10MB; stay well below that per batchUpdate
+MAX_BATCH_BYTES = int(os.getenv("SHEETS_MAX_BATCH_BYTES", 2 * 1024 * 1024))
+
+# Default Sheets API write quota is 60 requests per minute per user
+WRITE_REQUESTS_PER_MINUTE = int(os.getenv("SHEETS_WRITE_QUOTA_PER_MINUTE", 60))
+
+# Independent range writes in flight at once
+WRITE_CONCURRENCY = int(os.getenv("SHEETS_WRITE_CONCURRENCY", 4))
+
+# Rate limit and transient server errors are retried with exponential backoff
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+MAX_WRITE_RETRIES = 6
+BACKOFF_BASE = 1  # seconds
+BACKOFF_CAP = 64  # seconds
+
+SOCKET_TIMEOUT = 120  # seconds
+
+# Writes that could not be confirmed are kept here so the next attempt can finish them
+JOURNAL_DIR = os.getenv(
+    "SHEETS_JOURNAL_DIR",
+    config.DATA_DIR,
+)
+
+
+class SheetsWriteError(Exception):
+    """Raised when some ranges could not be written after all retries"""
+
+    def __init__(self, message, failed_ranges):
+        super().__init__(message)
+        self.failed_ranges = failed_ranges
+
+
+class WriteQuota:
+    """Sliding one-minute window that paces requests to the Sheets write quota"""
+
+    def __init__(self, per_minute=WRITE_REQUESTS_PER_MINUTE, clock=time.monotonic, sleep=time.sleep):
+        self.per_minute = per_minute
+        self._clock = clock
+        self.sleep = sleep
+        self._sent = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until one more write request fits in the current minute"""
+        while True:
+            with self._lock:
+                now = self._clock()
+                while self._sent and self._sent[0] + 60 <= now:
+                    self._sent.popleft()
+                if len(self._sent) < self.per_minute:
+                    self._sent.append(now)
+                    return
+                wait = self._sent[0] + 60 - now
+            # Never sleep for less than a millisecond so the window always moves on
+            self.sleep(max(wait, 0.001))
+
+
+# Shared by every Sheets write in the process so the quota is counted once
+write_quota = WriteQuota()
+
+_local = threading.local()
+_refresh_lock = threading.Lock()
+
+
+def thread_http(service):
+    """
+    Authorized HTTP connection for the current thread.
+    httplib2 connections are not thread-safe, so each worker gets its own.
+    """
+    credentials = getattr(getattr(service, "_http", None), "credentials", None)
+    if credentials is None:
+        return None
+    # Refresh the shared token here, under a lock, rather than racing inside each connection
+    with _refresh_lock:
+        if not credentials.valid:
+            credentials.refresh(Request())
+    http = getattr(_local, "http", None)
+    if http is None or http.credentials is not credentials:
+        http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=SOCKET_TIMEOUT))
+        _local.http = http
+    return http
+
+
+def execute_with_backoff(request, quota=None, http=None, max_retries=MAX_WRITE_RETRIES, sleep=None):
+    """Execute a write request under the quota, retrying 429 and 5xx with exponential backoff"""
+    quota = quota or write_quota
+    # Backoff waits run on the same clock as quota pacing
+    sleep = sleep or quota.sleep
+    for attempt in range(max_retries + 1):
+        quota.acquire()
+        try:
+            if http is not None:
+                return request.execute(http=http)
+            return request.execute()
+        except HttpError as e:
+            status = int(getattr(e.resp, "status", 0))
+            if status not in RETRYABLE_STATUSES or attempt == max_retries:
+                raise
+            delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt) + random.uniform(0, 1)
+            print(
+                f"⚠️ Sheets API returned {status}, retrying in {delay:.1f}s "
+                f"(attempt {attempt + 1}/{max_retries})"
+            )
+            sleep(delay)
+
+
+def estimate_row_bytes(row):
+    """Approximate JSON size of one row of string cells"""
+    # Two quotes and a comma per cell, brackets and a comma per row
+    return sum(len(val) for val in row) + 3 * len(row) + 2
+
+
+def pack_value_ranges(sheet_title, blocks, max_bytes=MAX_BATCH_BYTES):
+    """
+    Pack row blocks into values.batchUpdate payloads of at most max_bytes each.
+
+    blocks is a list of (start_row, rows) with 1-based sheet row numbers. Blocks are
+    split on row boundaries when they do not fit, and several small blocks share one
+    request. Returns a list of batches, each a list of {"range", "values"} dicts.
+    """
+    batches = []
+    batch = []
+    batch_bytes = 0
+
+    for start_row, rows in blocks:
+        range_start = 0
+        for i, row in enumerate(rows):
+            row_bytes = estimate_row_bytes(row)
+            if batch_bytes + row_bytes > max_bytes and (batch or i > range_start):
+                # Close the open range and start a new request
+                if i > range_start:
+                    batch.append({
+                        "range": f"{sheet_title}!A{start_row + range_start}",
+                        "values": rows[range_start:i],
+                    })
+                batches.append(batch)
+                batch = []
+                batch_bytes = 0
+                range_start = i
+            batch_bytes += row_bytes
+        if len(rows) > range_start:
+            batch.append({
+                "range": f"{sheet_title}!A{start_row + range_start}",
+                "values": rows[range_start:],
+            })
+
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def journal_path(spreadsheet_id, sheet_title):
+    """Path of the pending-writes journal for one tab of a spreadsheet"""
+    safe_title = "".join(c if c.isalnum() else "_" for c in sheet_title)
+    return os.path.join(JOURNAL_DIR, f".sheets_pending_{spreadsheet_id}_{safe_title}.pickle")
+
+
+def write_batches(sheets_service, spreadsheet_id, batches, quota=None, concurrency=WRITE_CONCURRENCY):
+    """
+    Write packed batches concurrently under the shared quota.
+    Returns the batches that could not be confirmed after all retries.
+    """
+    quota = quota or write_quota
+    failed = []
+    lock = threading.Lock()
+    done = [0]
+
+    def _write(batch):
+        request = sheets_service.spreadsheets().values().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={"valueInputOption": "RAW", "data": batch},
+        )
+        try:
+            execute_with_backoff(request, quota=quota, http=thread_http(sheets_service))
+        except Exception as e:
+            print(f"❌ Failed to write {batch[0]['range']} ({len(batch)} ranges): {e}")
+            with lock:
+                failed.append(batch)
+            return
+        rows = sum(len(value_range["values"]) for value_range in batch)
+        with lock:
+            done[0] += 1
+            print(f"✅ Uploaded batch {done[0]} of {len(batches)} ({len(batch)} ranges, {rows} rows)")
+
+    if concurrency <= 1 or len(batches) <= 1:
+        for batch in batches:
+            _write(batch)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(_write, batches))
+
+    return failed
+
+
+def write_value_ranges(
+    sheets_service,
+    spreadsheet_id,
+    sheet_title,
+    blocks,
+    quota=None,
+    max_bytes=MAX_BATCH_BYTES,
+    concurrency=WRITE_CONCURRENCY,
+):
+    """
+    Write row blocks with as few values.batchUpdate requests as the byte budget allows.
+
+    Batches cover disjoint ranges, so they go out concurrently. Batches that still fail
+    after backoff are saved to a local journal and SheetsWriteError is raised; calling
+    resume_pending_writes later finishes exactly those ranges.
+    """
+    with metrics.stage("sheets.write"):
+        batches = pack_value_ranges(sheet_title, blocks, max_bytes)
+        failed = write_batches(sheets_service, spreadsheet_id, batches, quota, concurrency)
+
+    if failed:
+        save_pending_writes(spreadsheet_id, sheet_title, failed)
+        failed_ranges = [value_range["range"] for batch in failed for value_range in batch]
+        raise SheetsWriteError(
+            f"{len(failed)} of {len(batches)} batches could not be written: {failed_ranges}",
+            failed_ranges,
+        )
+
+    return len(batches)
+
+
+def save_pending_writes(spreadsheet_id, sheet_title, batches):
+    """Keep unconfirmed batches on disk so a later attempt can finish them"""
+    os.makedirs(JOURNAL_DIR, exist_ok=True)
+    path = journal_path(spreadsheet_id, sheet_title)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"spreadsheet_id": spreadsheet_id, "sheet_title": sheet_title, "batches": batches}, f)
+    os.replace(tmp_path, path)
+    print(f"ℹ️ Saved {len(batches)} unconfirmed batches to {path}")
+
+
+def resume_pending_writes(sheets_service, spreadsheet_id, sheet_title, quota=None):
+    """
+    Finish the writes left over by a failed upload before anything else touches the sheet.
+    Returns True when nothing is pending any more.
+    """
+    path = journal_path(spreadsheet_id, sheet_title)
+    if not os.path.exists(path):
+        return True
+
+    with open(path, "rb") as f:
+        pending = pickle.load(f)["batches"]
+    print(f"ℹ️ Resuming {len(pending)} unconfirmed batches from a previous upload")
+
+    failed = write_batches(sheets_service, spreadsheet_id, pending, quota)
+    if failed:
+        save_pending_writes(spreadsheet_id, sheet_title, failed)
+        return False
+
+    os.remove(path)
+    print("✅ Previous upload completed")
+    return True
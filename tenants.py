@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import config  # Load environment variables
+
+# Accounts to run, each with its own PubPlus credentials, network codes, spreadsheet and
+# local data directory. See README "Multiple accounts" for the format.
+TENANTS_FILE = os.getenv("TENANTS_FILE", os.path.join(os.path.dirname(os.path.realpath(__file__)), "tenants.json"))
+
+# Tenants run side by side, each in a fresh process (0 = one process per tenant)
+TENANT_WORKERS = int(os.getenv("TENANT_WORKERS", 0))
+
+# Requests in flight at once across all tenants
+PUBPLUS_MAX_CONCURRENCY = int(os.getenv("PUBPLUS_MAX_CONCURRENCY", 4))
+GOOGLE_MAX_CONCURRENCY = int(os.getenv("GOOGLE_MAX_CONCURRENCY", 8))
+
+# Per-run file locations that must not be shared between tenants; they are derived
+# from the tenant's data directory unless the tenant's "env" sets them
+PER_TENANT_PATHS = [
+    "DRIVE_METADATA_CACHE",
+    "SHEET_SNAPSHOT_DIR",
+    "SHEETS_JOURNAL_DIR",
+    "SHEETS_SHARD_MANIFEST",
+    "RUN_LOG_PATH",
+    "METRICS_DIR",
+    "METRICS_REPORT_PATH",
+    "RAW_DATA_DIR",
+    "ROLLUP_STORE_PATH",
+]
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+
+
+def load_tenants(path=TENANTS_FILE):
+    """Tenant definitions from the tenants file; raises ValueError when one is unusable"""
+    with open(path) as f:
+        tenants = json.load(f)["tenants"]
+    names = set()
+    for tenant in tenants:
+        name = tenant.get("name")
+        if not name or not all(c.isalnum() or c in "-_" for c in name):
+            raise ValueError(f"Tenant name {name!r} must be letters, digits, '-' or '_'")
+        if name in names:
+            raise ValueError(f"Tenant {name!r} is defined twice")
+        names.add(name)
+    return tenants
+
+
+def tenant_env(tenant):
+    """Environment variables that point a pipeline run at one tenant"""
+    name = tenant["name"]
+    data_dir = os.path.abspath(tenant.get("data_dir") or os.path.join(config.DATA_DIR, name))
+    env = {"PUBPLUS_TENANT": name, "PUBPLUS_DATA_DIR": data_dir}
+
+    token = tenant.get("auth_token") or os.getenv(tenant.get("auth_token_env", ""), "")
+    if token:
+        env["PUBPLUS_AUTH_TOKEN"] = token
+    if tenant.get("client_id"):
+        env["PUBPLUS_CLIENT_ID"] = tenant["client_id"]
+    if tenant.get("network_codes"):
+        env["PUBPLUS_NETWORK_CODE"] = ",".join(tenant["network_codes"])
+    if tenant.get("spreadsheet_id"):
+        env["PUBPLUS_SPREADSHEET_ID"] = tenant["spreadsheet_id"]
+    if tenant.get("drive_folder"):
+        env["DRIVE_FOLDER_NAME"] = tenant["drive_folder"]
+    if tenant.get("google_token"):
+        env["GOOGLE_TOKEN_PATH"] = os.path.abspath(tenant["google_token"])
+    if tenant.get("google_credentials"):
+        env["GOOGLE_CREDENTIALS_PATH"] = os.path.abspath(tenant["google_credentials"])
+
+    # A shared Prometheus textfile directory gets one file per tenant
+    prom_path = os.getenv("METRICS_PROM_PATH")
+    if prom_path:
+        env["METRICS_PROM_PATH"] = os.path.join(os.path.dirname(prom_path), f"pubplus_{name}.prom")
+
+    env.update({key: str(value) for key, value in tenant.get("env", {}).items()})
+    return env
+
+
+class PrefixedStream(io.TextIOBase):
+    """Console stream that tags every line with the tenant name"""
+
+    def __init__(self, stream, prefix):
+        self.stream = stream
+        self.prefix = prefix
+        self._partial = ""
+
+    def writable(self):
+        return True
+
+    def fileno(self):
+        # faulthandler writes straight to the descriptor
+        return self.stream.fileno()
+
+    def write(self, text):
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self.stream.write(f"[{self.prefix}] {line}\n")
+        self.stream.flush()
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def _init_worker(slots):
+    import api_limits
+    api_limits.install(slots)
+
+
+def run_tenant(tenant, dates=None):
+    """
+    Run the pipeline for one tenant. Called in a fresh worker process, so every module
+    reads the tenant's settings when it is first imported.
+    """
+    os.environ.update(tenant_env(tenant))
+    # config was loaded with the parent's settings when this module was imported
+    importlib.reload(config)
+    # Locations set for the parent (or in .env) would be shared by every tenant
+    for key in PER_TENANT_PATHS:
+        if key not in tenant.get("env", {}):
+            os.environ.pop(key, None)
+
+    import metrics
+    from runner import run
+
+    name = tenant["name"]
+    sys.stdout = PrefixedStream(sys.__stdout__, name)
+    sys.stderr = PrefixedStream(sys.__stderr__, name)
+
+    def _pipeline():
+        import main
+        return main.main(dates)
+
+    started = time.monotonic()
+    exit_code = run(_pipeline)
+    report = metrics.run_report(exit_code)
+    return {
+        "tenant": name,
+        "exit_code": exit_code,
+        "seconds": round(time.monotonic() - started, 3),
+        "api_calls": sum(call["count"] for call in report["api_calls"]),
+        "stages": {stage: round(stats["seconds"], 3) for stage, stats in report["stages"].items()},
+    }
+
+
+def run_all(tenants, dates=None, workers=TENANT_WORKERS):
+    """Run every tenant on a process pool; returns the aggregated summary"""
+    context = multiprocessing.get_context("spawn")
+    slots = {
+        "pubplus": context.BoundedSemaphore(PUBPLUS_MAX_CONCURRENCY),
+        "google": context.BoundedSemaphore(GOOGLE_MAX_CONCURRENCY),
+    }
+    workers = workers or len(tenants)
+    print(f"🔄 Running {len(tenants)} tenant(s) on {min(workers, len(tenants))} process(es)")
+
+    started = time.monotonic()
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        max_tasks_per_child=1,  # no state carries over from one tenant to the next
+        initializer=_init_worker,
+        initargs=(slots,),
+    ) as pool:
+        futures = {pool.submit(run_tenant, tenant, dates): tenant["name"] for tenant in tenants}
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"❌ Tenant {futures[future]} crashed: {e}")
+                results.append({"tenant": futures[future], "exit_code": EXIT_FAILED, "error": str(e)})
+
+    results.sort(key=lambda result: result["tenant"])
+    return {
+        "finished_at": time.time(),
+        "wall_seconds": round(time.monotonic() - started, 3),
+        "tenant_seconds": round(sum(result.get("seconds", 0) for result in results), 3),
+        "exit_code": next((r["exit_code"] for r in results if r["exit_code"] != EXIT_OK), EXIT_OK),
+        "tenants": results,
+    }
+
+
+def print_summary(summary):
+    print(
+        f"\n📊 Tenant summary: {summary['wall_seconds']:.1f}s wall for "
+        f"{summary['tenant_seconds']:.1f}s of tenant runs"
+    )
+    for result in summary["tenants"]:
+        icon = "✅" if result["exit_code"] == EXIT_OK else "❌"
+        detail = result.get("error") or f"{result['seconds']:.1f}s, {result['api_calls']} API calls"
+        print(f"  {icon} {result['tenant']}: exit code {result['exit_code']} ({detail})")
+
+
+def run_configured(path=TENANTS_FILE, only=None, dates=None):
+    """Run the tenants in the tenants file (or just those named in only); returns an exit code"""
+    try:
+        tenants = load_tenants(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ Could not load tenants from {path}: {e}")
+        return EXIT_FAILED
+    if only:
+        tenants = [tenant for tenant in tenants if tenant["name"] in only]
+    if not tenants:
+        print("⚠️ No tenants to run")
+        return EXIT_OK
+
+    summary = run_all(tenants, dates)
+    print_summary(summary)
+
+    os.makedirs(config.DATA_DIR, exist_ok=True)
+    summary_path = os.path.join(config.DATA_DIR, "tenant_summary.json")
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=2)
+    print(f"ℹ️ Summary written to {summary_path}")
+    return summary["exit_code"]
+
+
+def add_arguments(parser):
+    parser.add_argument("--tenants-file", default=TENANTS_FILE)
+    parser.add_argument("--only", nargs="+", help="run just these tenants")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline for every configured tenant")
+    add_arguments(parser)
+    args = parser.parse_args()
+    sys.exit(run_configured(args.tenants_file, args.only))
@@ -1,29 +1,103 @@
 import os
-from twilio.rest import Client
-from dotenv import load_dotenv
-import requests
+import time
+import queue
+import atexit
+import threading
+from collections import Counter
+import config  # Load environment variables
+import metrics
+from log_utils import get_logger, debug_enabled
 
-# Load environment variables
-load_dotenv()
+log = get_logger("twilio_utils")
 
+# Alerts are queued and sent by a background thread so they never block the pipeline.
+# Messages arriving within NOTIFY_COALESCE_SECONDS of the first one go out as one digest SMS.
+NOTIFY_ASYNC = os.getenv("NOTIFY_ASYNC", "on").lower() != "off"
+NOTIFY_COALESCE_SECONDS = float(os.getenv("NOTIFY_COALESCE_SECONDS", 30))
+NOTIFY_FLUSH_TIMEOUT = float(os.getenv("NOTIFY_FLUSH_TIMEOUT", 30))  # seconds to wait at exit
 
-def test_twilio_credentials():
-    """Test if Twilio credentials are valid"""
+# Set by tenants.py so alerts say which account they are about
+TENANT = os.getenv("PUBPLUS_TENANT")
+
+# Twilio splits long bodies into segments and rejects anything over 1600 characters
+MAX_SMS_CHARS = 1600
+
+# After a credential check that got no answer (network error, Twilio outage), check again
+# this many seconds later; only a 401 from Twilio is remembered for the life of the process
+TWILIO_RECHECK_SECONDS = float(os.getenv("TWILIO_RECHECK_SECONDS", 300))
+
+# One validated client per process
+_client = None
+_client_rejected = False
+_client_retry_at = 0.0
+_client_lock = threading.Lock()
+
+
+def check_twilio_credentials():
+    """
+    Check the Twilio credentials with one account request: "valid", "rejected" (Twilio
+    answered 401) or "unknown" (no answer, missing credentials or any other status)
+    """
     account_sid = os.getenv("TWILIO_ACCOUNT_SID")
     auth_token = os.getenv("TWILIO_AUTH_TOKEN")
 
     if not account_sid or not auth_token:
-        return False
+        return "unknown"
 
     # Try a simple account info request to test credentials
     try:
+        import requests
+
         response = requests.get(
             f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}.json",
             auth=(account_sid, auth_token),
+            timeout=30,
         )
-        return response.status_code == 200
-    except:
-        return False
+    except Exception:
+        return "unknown"
+    if response.status_code == 200:
+        return "valid"
+    if response.status_code == 401:
+        return "rejected"
+    return "unknown"
+
+
+def test_twilio_credentials():
+    """Test if Twilio credentials are valid"""
+    return check_twilio_credentials() == "valid"
+
+
+def get_client(account_sid, auth_token):
+    """
+    Twilio client shared by the whole process, or None when there is none yet.
+    Credentials Twilio rejected are not checked again (see reset_client); a check that
+    got no answer is retried after TWILIO_RECHECK_SECONDS.
+    """
+    global _client, _client_rejected, _client_retry_at
+
+    with _client_lock:
+        if _client is None and not _client_rejected and time.monotonic() >= _client_retry_at:
+            status = check_twilio_credentials()
+            if status == "valid":
+                # The Twilio SDK is only loaded once there is something to send
+                from twilio.rest import Client
+
+                _client = Client(account_sid, auth_token)
+            elif status == "rejected":
+                _client_rejected = True
+            else:
+                _client_retry_at = time.monotonic() + TWILIO_RECHECK_SECONDS
+        return _client
+
+
+def reset_client():
+    """Forget the cached client so the credentials are checked again"""
+    global _client, _client_rejected, _client_retry_at
+
+    with _client_lock:
+        _client = None
+        _client_rejected = False
+        _client_retry_at = 0.0
 
 
 def send_notification(message):
@@ -36,21 +110,26 @@ def send_notification(message):
     from_number = os.getenv("TWILIO_FROM_NUMBER")
     to_number = os.getenv("TWILIO_TO_NUMBER")
 
-    # Debug credentials (masked for security)
-    print(
-        f"Twilio SID: {account_sid[:5]}...{account_sid[-5:] if account_sid else 'None'}" if account_sid else "Twilio SID: None"
-    )
-    print(f"Auth Token Set: {'Yes' if auth_token else 'No'}")
-    print(f"From Number: {from_number if from_number else 'None'}")
-    print(f"To Number: {to_number[:3]}...{to_number[-3:] if to_number else 'None'}" if to_number else "To Number: None")
+    if debug_enabled(log):
+        log.debug(
+            "🔍 Twilio SID: %s, Auth Token Set: %s, From Number: %s, To Number: %s",
+            f"{account_sid[:5]}...{account_sid[-5:]}" if account_sid else "None",
+            "Yes" if auth_token else "No",
+            from_number or "None",
+            f"{to_number[:3]}...{to_number[-3:]}" if to_number else "None",
+        )
 
     # Check if credentials exist
     if not account_sid or not auth_token or not from_number or not to_number:
         print("Twilio notification SKIPPED: Missing credentials in .env file")
         return False
 
-    # Verify credentials before attempting to send
-    if not test_twilio_credentials():
+    # Verify credentials before attempting to send (once per process)
+    client = get_client(account_sid, auth_token)
+    if client is None and not _client_rejected:
+        print("Twilio notification SKIPPED: Could not verify the credentials with Twilio, will check again later")
+        return False
+    if client is None:
         print(
             "Twilio notification SKIPPED: Invalid credentials - Please check your account_sid and auth_token"
         )
@@ -58,8 +137,7 @@ def send_notification(message):
         return False
 
     try:
-        client = Client(account_sid, auth_token)
-
+        metrics.count_call("twilio", "messages.create")
         twilio_message = client.messages.create(
             body=message, from_=from_number, to=to_number
         )
@@ -74,6 +152,7 @@ def send_notification(message):
             print(
                 "Authentication failed. Please regenerate your Auth Token in the Twilio console."
             )
+            reset_client()
         elif hasattr(e, "code") and e.code == 21608:
             print("This number is not verified with your Twilio trial account.")
             print(
@@ -89,9 +168,101 @@ def send_notification(message):
         return False
 
 
-def send_notification_with_fallback(message):
-    """Attempt to send with Twilio, fall back to console only if it fails"""
+def send_now_with_fallback(message):
+    """Attempt to send with Twilio right away, fall back to console only if it fails"""
     if not send_notification(message):
         print(f"NOTIFICATION (Console only): {message}")
         return False
     return True
+
+
+def build_digest(counts, max_chars=MAX_SMS_CHARS):
+    """One SMS body for the messages collected in a window, duplicates counted once"""
+    lines = [message if n == 1 else f"{message} (x{n})" for message, n in counts.items()]
+    if len(lines) == 1:
+        return lines[0][:max_chars]
+
+    digest = f"{sum(counts.values())} alerts:"
+    for i, line in enumerate(lines):
+        more = f"\n... and {len(lines) - i} more"
+        if len(digest) + 3 + len(line) > max_chars - len(more):
+            return digest + more
+        digest += f"\n- {line}"
+    return digest
+
+
+class NotificationDispatcher:
+    """Background thread that coalesces queued alerts into digest SMS"""
+
+    def __init__(self, window=NOTIFY_COALESCE_SECONDS, send=send_now_with_fallback):
+        self.window = window
+        self.send = send
+        self._queue = queue.Queue()
+        self._flush = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, message):
+        """Queue a message; the worker starts on first use"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="notifications", daemon=True)
+                self._thread.start()
+        self._queue.put(message)
+
+    def _run(self):
+        while True:
+            counts = Counter([self._queue.get()])
+            deadline = time.monotonic() + self.window
+            # Collect everything else that arrives within the window, or until a flush
+            while not self._flush.is_set():
+                try:
+                    counts[self._queue.get(timeout=min(0.25, max(deadline - time.monotonic(), 0)))] += 1
+                except queue.Empty:
+                    if time.monotonic() >= deadline:
+                        break
+            while True:
+                try:
+                    counts[self._queue.get_nowait()] += 1
+                except queue.Empty:
+                    break
+            try:
+                self.send(build_digest(counts))
+            except Exception as e:
+                print(f"Failed to send notification digest: {e}")
+            for _ in range(sum(counts.values())):
+                self._queue.task_done()
+
+    def flush(self, timeout=NOTIFY_FLUSH_TIMEOUT):
+        """Send whatever is queued now and wait for it, at most timeout seconds"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._flush.set()
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self._flush.clear()
+        if self._queue.unfinished_tasks:
+            print(f"⚠️ {self._queue.unfinished_tasks} notification(s) still unsent at exit")
+
+
+dispatcher = NotificationDispatcher()
+atexit.register(dispatcher.flush)
+
+
+def send_notification_with_fallback(message):
+    """
+    Queue a notification for the background dispatcher (or send it inline when
+    NOTIFY_ASYNC=off). Returns True once the message is queued or sent.
+    """
+    if TENANT:
+        message = f"[{TENANT}] {message}"
+    if not NOTIFY_ASYNC:
+        return send_now_with_fallback(message)
+    dispatcher.submit(message)
+    return True
+
+
+def flush_notifications(timeout=NOTIFY_FLUSH_TIMEOUT):
+    """Send queued notifications now, e.g. before a long sleep or a hard exit"""
+    dispatcher.flush(timeout)